@@ -1,35 +1,136 @@
-from datetime import datetime
-from collections import defaultdict
-
-def update_activity_monitor(users_collection, activity_collection):
-    all_users = users_collection.find()
-
-    daily_counts = defaultdict(int)
-    for user in all_users:
-        # Extract the date portion directly from the "createdAt" field
-        created_date = user["createdAt"].date()
-        daily_counts[created_date] += 1
-
-
-    # Update the "activity" collection with daily user counts
-    for date, count in daily_counts.items():
-        try:
-            # Convert date object to datetime for MongoDB storage
-            date_datetime = datetime.combine(date, datetime.min.time())
-            
-            # Update or insert the document for this date
-            activity_collection.update_one(
-                {"date": date_datetime},  # Filter by date
-                {
-                    "$set": {
-                        "date": date_datetime,
-                        "userCount": count,
-                        "lastUpdated": datetime.utcnow()
-                    }
-                },
-                upsert=True  # Create new document if it doesn't exist
-            )
-            print(f"Successfully updated count for {date}: {count} users")
-            
-        except Exception as e:
-            print(f"Error updating count for {date}: {str(e)}")
+import uuid
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+import metrics
+
+GRANULARITIES = ("hour", "day", "week")
+BUCKET_SPANS = {"hour": timedelta(hours=1), "day": timedelta(days=1), "week": timedelta(weeks=1)}
+# A refresh that dies mid-way holds its window at most this long
+LEASE = timedelta(seconds=300)
+
+def _bucket_expression(granularity):
+    # Truncate createdAt to the start of its hour/day/week on the server
+    date_trunc = {"date": "$createdAt", "unit": granularity}
+    if granularity == "week":
+        date_trunc["startOfWeek"] = "monday"
+    return {"$dateTrunc": date_trunc}
+
+def _claim(watermarks, granularity, lease_id, now, min_interval):
+    """
+    Take the refresh lease for granularity in one atomic step. Returns the
+    watermark state before the claim ({} on the first run), or None when
+    another refresh holds the lease or the last one is under min_interval old.
+    """
+    claimable = {
+        "_id": granularity,
+        "$and": [
+            {"$or": [{"leaseUntil": {"$exists": False}}, {"leaseUntil": {"$lte": now}}]},
+            {"$or": [{"refreshedAt": {"$exists": False}}, {"refreshedAt": {"$lte": now - timedelta(seconds=min_interval)}}]},
+        ],
+    }
+    try:
+        state = watermarks.find_one_and_update(
+            claimable,
+            {"$set": {"leaseId": lease_id, "leaseUntil": now + LEASE}},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        # The document exists but is leased or fresh, so the upsert collided with it
+        return None
+    return state or {}
+
+def _release(watermarks, granularity, lease_id):
+    # Give the window back without moving the watermark; recounting makes the retry safe
+    watermarks.update_one({"_id": granularity, "leaseId": lease_id}, {"$unset": {"leaseId": "", "leaseUntil": ""}})
+
+@metrics.timed_function("function_seconds", function="update_activity_monitor")
+def update_activity_monitor(users_collection, activity_collection, granularity="day", min_interval=0):
+    """
+    Refresh the precomputed activity counts for the buckets that gained users
+    since the last stored watermark. The first run for a granularity counts
+    every user. Each touched bucket is recounted and $set, so a retried or
+    overlapping window never double counts; concurrent callers are kept apart
+    by a lease on the watermark document.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+
+    watermarks = activity_collection.database["activity_watermarks"]
+    now = datetime.utcnow()
+    lease_id = uuid.uuid4().hex
+    state = _claim(watermarks, granularity, lease_id, now, min_interval)
+    if state is None:
+        return 0
+
+    watermark = state.get("watermark")
+    try:
+        if watermark is None:
+            activity_collection.create_index([("granularity", 1), ("date", 1)], unique=True)
+            users_collection.create_index("createdAt")
+            # Daily counts written before granularities existed have no granularity field
+            activity_collection.delete_many({"granularity": {"$exists": False}})
+            activity_collection.delete_many({"granularity": granularity})
+
+        # $gte: users sharing the watermark's createdAt but written later are still picked up
+        touched = list(users_collection.aggregate([
+            {"$match": {"createdAt": {"$gte": watermark}} if watermark else {"createdAt": {"$type": "date"}}},
+            {"$group": {"_id": _bucket_expression(granularity), "count": {"$sum": 1}, "latest": {"$max": "$createdAt"}}},
+        ]))
+        if touched:
+            if watermark is None:
+                # The first run saw every user, so its counts are already whole buckets
+                buckets = touched
+            else:
+                # Only part of each touched bucket matched; recount them in full
+                span = BUCKET_SPANS[granularity]
+                buckets = list(users_collection.aggregate([
+                    {"$match": {"$or": [{"createdAt": {"$gte": bucket["_id"], "$lt": bucket["_id"] + span}} for bucket in touched]}},
+                    {"$group": {"_id": _bucket_expression(granularity), "count": {"$sum": 1}}},
+                ]))
+            try:
+                activity_collection.bulk_write([
+                    UpdateOne(
+                        {"granularity": granularity, "date": bucket["_id"]},
+                        {"$set": {"userCount": bucket["count"], "lastUpdated": now}},
+                        upsert=True
+                    )
+                    for bucket in buckets
+                ], ordered=False)
+            except Exception as e:
+                print(f"Error updating activity counts: {str(e)}")
+                _release(watermarks, granularity, lease_id)
+                return 0
+            watermark = max(bucket["latest"] for bucket in touched)
+            print(f"Updated {len(buckets)} {granularity} buckets")
+    except Exception:
+        _release(watermarks, granularity, lease_id)
+        raise
+
+    watermarks.update_one(
+        {"_id": granularity, "leaseId": lease_id},
+        {"$set": {"watermark": watermark, "refreshedAt": now}, "$unset": {"leaseId": "", "leaseUntil": ""}}
+    )
+    return len(touched)
+
+@metrics.timed_function("function_seconds", function="get_activity_series")
+def get_activity_series(activity_collection, granularity="day", start=None, end=None):
+    # Read the precomputed counts, optionally limited to [start, end)
+    query = {"granularity": granularity}
+    date_range = {}
+    if start is not None:
+        date_range["$gte"] = start
+    if end is not None:
+        date_range["$lt"] = end
+    if date_range:
+        query["date"] = date_range
+
+    series = []
+    for activity in activity_collection.find(query, {"date": 1, "userCount": 1, "_id": 0}).sort("date", 1):
+        if granularity == "hour":
+            label = activity["date"].strftime("%Y-%m-%dT%H:00")
+        else:
+            label = str(activity["date"].date())
+        series.append({label: activity["userCount"]})
+    return series
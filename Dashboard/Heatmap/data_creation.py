@@ -1,7 +1,7 @@
 import os
 from dotenv import load_dotenv
 from pymongo import MongoClient
-import pandas as pd
+import numpy as np
 
 load_dotenv()
 
@@ -10,16 +10,13 @@ load_dotenv()
 # db = client['test']  # Database name
 # users_collection = db['user']  # Collection name
 
-def make_csv(datafile_path, users_collection):
+def fetch_coordinates(users_collection):
+    # Only pull the location field, as an (n, 2) float array of [latitude, longitude]
     coordinates = []
-    for user in users_collection.find():
-        coordinates.append([user["lastLoginLocation"]["latitude"], user["lastLoginLocation"]["longitude"]])
-
-    # Sample 2D array
-    data = coordinates
-
-    # Convert to DataFrame
-    df = pd.DataFrame(data, columns=['latitude', 'longitude'])
-
-    # Save to CSV
-    df.to_csv(datafile_path, index=False)
+    for user in users_collection.find({}, {"lastLoginLocation.latitude": 1, "lastLoginLocation.longitude": 1, "_id": 0}):
+        location = user.get("lastLoginLocation") or {}
+        try:
+            coordinates.append((float(location["latitude"]), float(location["longitude"])))
+        except (KeyError, TypeError, ValueError):
+            continue  # Skip users without usable coordinates
+    return np.array(coordinates, dtype=float).reshape(-1, 2)
@@ -1,18 +1,96 @@
-import pandas as pd
-import folium
-from folium.plugins import HeatMap
-from Dashboard.Heatmap.data_creation import make_csv
+import os
+import threading
+import time
+import numpy as np
+from Dashboard.Heatmap.data_creation import fetch_coordinates
+import metrics
 
-# Load the CSV file
-def heatmap_generation(datafile_path, users_collection):
-    make_csv(datafile_path, users_collection)
-    df = pd.read_csv(datafile_path)
+def bin_coordinates(coordinates, cell_size_deg=0.01):
+    # Collapse points into a sparse weighted grid: one [lat, lon, weight] per occupied cell
+    if not len(coordinates):
+        return np.empty((0, 3))
+    cells = np.floor(coordinates / cell_size_deg).astype(np.int64)
+    unique_cells, counts = np.unique(cells, axis=0, return_counts=True)
+    centers = (unique_cells + 0.5) * cell_size_deg
+    return np.column_stack([centers, counts / counts.max()])
 
-    map_center = [df['latitude'].mean(), df['longitude'].mean()]  # Center around the mean lat/lon
-    heatmap_map = folium.Map(location=map_center, zoom_start=6)
+class HeatmapCache:
+    """
+    Keeps the rendered heatmap until the users collection or the hotspots
+    change. They are checked at most once every max_staleness seconds, using
+    the user count, the newest updatedAt and the hotspot engine's version as
+    a watermark.
+    """
 
-    heat_data = [[row['latitude'], row['longitude']] for index, row in df.iterrows()]
+    def __init__(self, output_path='templates/heatmap.html', max_staleness=60, cell_size_deg=0.01):
+        self.output_path = output_path
+        self.max_staleness = max_staleness
+        self.cell_size_deg = cell_size_deg
+        self.watermark = None
+        self.checked_at = 0.0
+        self.renders = 0
+        self._lock = threading.Lock()
+        self._indexed = False
 
-    HeatMap(heat_data).add_to(heatmap_map)
+    def current_watermark(self, users_collection):
+        from ML_Models.Profile_Score.hotspot_engine import get_hotspot_engine
 
-    heatmap_map.save('templates/heatmap.html')
+        if not self._indexed:
+            users_collection.create_index("updatedAt")
+            self._indexed = True
+        latest = users_collection.find_one({}, {"updatedAt": 1}, sort=[("updatedAt", -1)])
+        return (
+            users_collection.estimated_document_count(),
+            latest.get("updatedAt") if latest else None,
+            get_hotspot_engine().version,
+        )
+
+    def render(self, users_collection):
+        # folium is only needed here; importing it lazily keeps service start-up fast
+        import folium
+        from folium.plugins import HeatMap
+
+        from ML_Models.Profile_Score.hotspot_engine import get_hotspot_engine
+
+        coordinates = fetch_coordinates(users_collection)
+        points = bin_coordinates(coordinates, self.cell_size_deg)
+        map_center = coordinates.mean(axis=0).tolist() if len(coordinates) else [0, 0]  # Center around the mean lat/lon
+        heatmap_map = folium.Map(location=map_center, zoom_start=6)
+        HeatMap(points.tolist()).add_to(heatmap_map)
+        for hotspot in get_hotspot_engine().hotspots:
+            folium.Circle(
+                location=[hotspot["latitude"], hotspot["longitude"]],
+                radius=hotspot["radius_km"] * 1000,
+                color="crimson",
+                fill=False,
+                tooltip=f"weight {hotspot['weight']:.0f}, {hotspot['points']} users",
+            ).add_to(heatmap_map)
+        heatmap_map.save(self.output_path)
+        self.renders += 1
+
+    def ensure_fresh(self, users_collection):
+        # Returns True when the heatmap had to be re-rendered
+        from ML_Models.Profile_Score.hotspot_engine import REFRESH_INTERVAL, refresh_hotspots
+
+        with self._lock:
+            now = time.time()
+            rendered = os.path.exists(self.output_path) and self.watermark is not None
+            if rendered and now - self.checked_at < self.max_staleness:
+                return False
+
+            # Hotspots are shared with the risk scorer, so they refresh on its schedule, not per render
+            refresh_hotspots(users_collection, min_interval=REFRESH_INTERVAL)
+            watermark = self.current_watermark(users_collection)
+            self.checked_at = now
+            if rendered and watermark == self.watermark:
+                return False
+
+            self.render(users_collection)
+            self.watermark = watermark
+            return True
+
+_default_cache = HeatmapCache(max_staleness=float(os.getenv("HEATMAP_MAX_STALENESS", "60")))
+
+@metrics.timed_function("function_seconds", function="heatmap_generation")
+def heatmap_generation(users_collection, cache=None):
+    return (cache or _default_cache).ensure_fresh(users_collection)
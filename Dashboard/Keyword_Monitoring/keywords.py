@@ -1,12 +1,196 @@
+import threading
+import time
+import uuid
 from collections import Counter
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+import metrics
+
+WINDOWS = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
 
 # Count occurrences of flagged words
-def get_flagged_words_count(flags_collection):
-    flagged_words = []
-    for flag_detail in flags_collection.find():
-        flagged_words.extend(flag_detail['flaggedWords'])
+@metrics.timed_function("function_seconds", function="get_flagged_words_count")
+def get_flagged_words_count(flags_collection, k=5):
+    # Let Mongo unwind, count and rank the words instead of shipping every flag document
+    pipeline = [
+        {"$unwind": "$flaggedWords"},
+        {"$group": {"_id": "$flaggedWords", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {"$limit": k},
+    ]
+    return {doc["_id"]: doc["count"] for doc in flags_collection.aggregate(pipeline, allowDiskUse=True)}
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitters sketch: tracks at most `capacity` words, so
+    memory stays bounded however many distinct words are seen. Counts of the
+    frequent words are over-estimated by at most their recorded error. Safe to
+    share between request threads.
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def add(self, item, count=1):
+        with self._lock:
+            self._add(item, count)
+
+    def _add(self, item, count):
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+        else:
+            # Replace the current minimum and inherit its count as error
+            victim = min(self.counts, key=self.counts.get)
+            floor = self.counts.pop(victim)
+            self.errors.pop(victim)
+            self.counts[item] = floor + count
+            self.errors[item] = floor
+
+    def top(self, k):
+        with self._lock:
+            return Counter(self.counts).most_common(k)
+
+class KeywordMonitor:
+    """
+    Incrementally maintained keyword counts. Every recorded word increments an
+    all-time counter (bucket None) and an hourly bucket, so top-k queries read
+    a small counter collection instead of the whole flag history. Windowed
+    counts resolve to whole hours and only cover words recorded since
+    incremental tracking began, because flag documents carry no timestamps.
+
+    Flag writes that bypass record() (bulk relabels, resets, direct edits)
+    make the all-time counters drift; reseed() rebuilds them from the flags
+    collection, and top() does so on its own every reseed_interval seconds
+    when one is set.
+    """
+
+    def __init__(self, flags_collection, counts_collection, sketch_capacity=None, bucket_ttl=timedelta(days=8), reseed_interval=None):
+        self.flags_collection = flags_collection
+        self.counts_collection = counts_collection
+        self.bucket_ttl = bucket_ttl
+        self.sketch_capacity = sketch_capacity
+        self.sketch = SpaceSaving(sketch_capacity) if sketch_capacity else None
+        self.reseed_interval = reseed_interval
+        self.seeded_at = 0.0
+        self._seeded = False
+        self._seed_lock = threading.Lock()
+
+    def _flag_word_counts(self):
+        pipeline = [
+            {"$unwind": "$flaggedWords"},
+            {"$group": {"_id": "$flaggedWords", "count": {"$sum": 1}}},
+        ]
+        return self.flags_collection.aggregate(pipeline, allowDiskUse=True)
+
+    def _write_all_time(self, update):
+        # update(count) -> the update document for that word's all-time counter
+        operations = []
+        for doc in self._flag_word_counts():
+            operations.append(UpdateOne({"word": doc["_id"], "bucket": None}, update(doc["count"]), upsert=True))
+            if len(operations) >= 1000:
+                self.counts_collection.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            self.counts_collection.bulk_write(operations, ordered=False)
+
+    def _load_sketch(self):
+        if self.sketch_capacity:
+            sketch = SpaceSaving(self.sketch_capacity)
+            for doc in self.counts_collection.find({"bucket": None}, {"word": 1, "count": 1}):
+                sketch.add(doc["word"], doc["count"])
+            self.sketch = sketch
+
+    def ensure_seeded(self):
+        # Cold start: build the all-time counters from the flags collection once
+        if self._seeded:
+            return
+        with self._seed_lock:
+            if self._seeded:
+                return
+            self.counts_collection.create_index([("bucket", 1), ("count", -1)])
+            self.counts_collection.create_index([("word", 1), ("bucket", 1)], unique=True)
+            # Hourly buckets expire on their own; all-time counters have no date and stay
+            self.counts_collection.create_index("bucket", name="bucket_ttl", expireAfterSeconds=int(self.bucket_ttl.total_seconds()))
+
+            if self.counts_collection.find_one({"bucket": None}) is None:
+                # $setOnInsert: a counter another process already created and $inc'd is left alone
+                self._write_all_time(lambda count: {"$setOnInsert": {"count": count}})
+
+            self._load_sketch()
+            self.seeded_at = time.time()
+            self._seeded = True
+
+    @metrics.timed_function("function_seconds", function="keyword_reseed")
+    def reseed(self):
+        """
+        Rebuild the all-time counters from the flags collection, dropping words
+        no flag holds any more. Hourly buckets are left as recorded.
+        """
+        self.ensure_seeded()
+        with self._seed_lock:
+            # Mark and sweep: counters this pass did not write, and record() did not touch since, are stale
+            generation = uuid.uuid4().hex
+            now = datetime.utcnow()
+            started = now.replace(microsecond=now.microsecond // 1000 * 1000)  # BSON dates keep milliseconds
+            self._write_all_time(lambda count: {"$set": {"count": count, "reseedGeneration": generation}})
+            self.counts_collection.delete_many({
+                "bucket": None,
+                "reseedGeneration": {"$ne": generation},
+                "$or": [{"recordedAt": {"$exists": False}}, {"recordedAt": {"$lt": started}}],
+            })
+            self._load_sketch()
+            self.seeded_at = time.time()
+
+    @metrics.timed_function("function_seconds", function="keyword_record")
+    def record(self, words, at=None):
+        # Call whenever words are appended to a flags document
+        words = [word for word in words if word]
+        if not words:
+            return
+        # Seed first, otherwise these counters would look like an already seeded collection
+        self.ensure_seeded()
+        recorded_at = datetime.utcnow()
+        at = at or recorded_at
+        bucket = at.replace(minute=0, second=0, microsecond=0)
+        counts = Counter(words)
+        operations = []
+        for word, count in counts.items():
+            operations.append(UpdateOne({"word": word, "bucket": None}, {"$inc": {"count": count}, "$set": {"recordedAt": recorded_at}}, upsert=True))
+            operations.append(UpdateOne({"word": word, "bucket": bucket}, {"$inc": {"count": count}}, upsert=True))
+        self.counts_collection.bulk_write(operations, ordered=False)
+        # Only after the counters took the words, so the sketch never runs ahead of Mongo
+        sketch = self.sketch
+        if sketch is not None:
+            for word, count in counts.items():
+                sketch.add(word, count)
+
+    @metrics.timed_function("function_seconds", function="keyword_top")
+    def top(self, k=5, window=None, approximate=False):
+        self.ensure_seeded()
+        if self.reseed_interval is not None and time.time() - self.seeded_at >= self.reseed_interval:
+            self.reseed()
+        if approximate and self.sketch is not None and window is None:
+            return dict(self.sketch.top(k))
 
-    # Convert list to a dictionary with word counts
-    flagged_words_count = dict(Counter(flagged_words).most_common(5))
+        if window is None:
+            cursor = self.counts_collection.find({"bucket": None}, {"word": 1, "count": 1}).sort([("count", -1), ("word", 1)]).limit(k)
+            return {doc["word"]: doc["count"] for doc in cursor}
 
-    return flagged_words_count
+        since = (datetime.utcnow() - WINDOWS[window]).replace(minute=0, second=0, microsecond=0)
+        pipeline = [
+            {"$match": {"bucket": {"$gte": since}}},
+            {"$group": {"_id": "$word", "count": {"$sum": "$count"}}},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$limit": k},
+        ]
+        return {doc["_id"]: doc["count"] for doc in self.counts_collection.aggregate(pipeline)}
@@ -0,0 +1,381 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from bson.objectid import ObjectId
+
+import metrics
+
+# Messages whose ids are this much older than the refresh are re-read, so inserts that commit late are not missed
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+class MessageGraph:
+    """
+    Directed, weighted sender -> receiver graph kept as CSR arrays.
+
+    New edges are buffered and merged into the CSR arrays on the next read,
+    so updates cost O(new edges) until a metric is needed. Metrics are cached
+    per graph version and recomputed only after the graph changes.
+
+    analyze() computes the metrics on a copy of the graph, outside the lock,
+    and publishes that copy as `analysis`, so readers of the published
+    metrics never wait for a betweenness pass.
+    """
+
+    def __init__(self):
+        self.node_ids = []
+        self._index = {}
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int64)
+        self.weights = np.zeros(0, dtype=np.float64)
+        self.version = 0
+        self.window_start = None
+        self.refreshed_at = 0.0
+        self.analysis = None
+
+        self._pending_src = []
+        self._pending_dst = []
+        self._pending_weight = []
+        self._built_version = 0
+        self._cache = {}
+        self._recent = set()
+        self._lock = threading.RLock()
+        self._analyze_lock = threading.Lock()
+
+    @property
+    def node_count(self):
+        return len(self.node_ids)
+
+    @property
+    def edge_count(self):
+        self._build()
+        return len(self.indices)
+
+    def _node(self, node_id):
+        index = self._index.get(node_id)
+        if index is None:
+            index = len(self.node_ids)
+            self._index[node_id] = index
+            self.node_ids.append(node_id)
+        return index
+
+    def add_edges(self, senders, receivers, weights=None):
+        """Add (or add weight to) sender -> receiver edges."""
+        with self._lock:
+            if weights is None:
+                weights = [1] * len(senders)
+            for sender, receiver, weight in zip(senders, receivers, weights):
+                self._pending_src.append(self._node(sender))
+                self._pending_dst.append(self._node(receiver))
+                self._pending_weight.append(weight)
+            if len(senders):
+                self.version += 1
+
+    def add_edge_arrays(self, src, dst, weights=None):
+        """Fast path for integer node ids 0..n-1, used by benchmarks and bulk loads."""
+        with self._lock:
+            src = np.asarray(src, dtype=np.int64)
+            dst = np.asarray(dst, dtype=np.int64)
+            highest = int(max(src.max(initial=-1), dst.max(initial=-1)))
+            for node in range(self.node_count, highest + 1):
+                self._node(node)
+            self._pending_src.extend(src.tolist())
+            self._pending_dst.extend(dst.tolist())
+            self._pending_weight.extend((np.ones(len(src)) if weights is None else np.asarray(weights, dtype=float)).tolist())
+            if len(src):
+                self.version += 1
+
+    @metrics.timed_function("function_seconds", function="message_graph_refresh")
+    def refresh(self, messages_collection, batch_size=10000, min_interval=0):
+        """
+        Fold new messages into the graph. Messages older than the overlap
+        window are grouped into edges on the server; the ones inside it are
+        read one by one and remembered, so the next refresh can re-read the
+        window for late inserts without counting any message twice. Skipped
+        if the last refresh was less than min_interval seconds ago. Returns
+        the number of edges merged.
+        """
+        with self._lock:
+            if time.time() - self.refreshed_at < min_interval:
+                return 0
+            self.refreshed_at = time.time()
+            window_start = ObjectId.from_datetime(datetime.now(timezone.utc) - REFRESH_OVERLAP)
+            if self.window_start is not None:
+                window_start = max(window_start, self.window_start)
+
+            # The window first: anything inserted into it after this read is picked up next time
+            recent = list(messages_collection.find({"_id": {"$gte": window_start}}, {"senderId": 1, "receiverId": 1}))
+
+            match = {"_id": {"$lt": window_start}}
+            if self.window_start is not None:
+                match["_id"]["$gte"] = self.window_start
+                match["_id"]["$nin"] = [message_id for message_id in self._recent if message_id < window_start]
+            pipeline = [
+                {"$match": match},
+                {"$group": {
+                    "_id": {"sender": "$senderId", "receiver": "$receiverId"},
+                    "weight": {"$sum": 1},
+                }},
+            ]
+            senders, receivers, weights = [], [], []
+            for doc in messages_collection.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size):
+                senders.append(doc["_id"]["sender"])
+                receivers.append(doc["_id"]["receiver"])
+                weights.append(doc["weight"])
+            for message in recent:
+                if message["_id"] not in self._recent:
+                    senders.append(message["senderId"])
+                    receivers.append(message["receiverId"])
+                    weights.append(1)
+
+            if senders:
+                self.add_edges(senders, receivers, weights)
+            self.window_start = window_start
+            self._recent = {message["_id"] for message in recent}
+            return len(senders)
+
+    def snapshot(self):
+        """A copy of the built graph that later edges do not touch."""
+        with self._lock:
+            self._build()
+            copy = MessageGraph()
+            copy.node_ids = list(self.node_ids)
+            copy._index = dict(self._index)
+            copy.indptr, copy.indices, copy.weights = self.indptr.copy(), self.indices.copy(), self.weights.copy()
+            copy.version = copy._built_version = self.version
+            copy.refreshed_at = self.refreshed_at
+            return copy
+
+    @metrics.timed_function("function_seconds", function="message_graph_analyze")
+    def analyze(self):
+        """
+        Compute the summary and per-node metrics on a snapshot and publish it
+        as `analysis`. Does nothing if the published snapshot is current.
+        """
+        with self._analyze_lock:
+            if self.analysis is not None and self.analysis.version == self.version:
+                return self.analysis
+            graph = self.snapshot()
+            graph.degrees()
+            graph.pagerank()
+            graph.betweenness()
+            graph.communities()
+            self.analysis = graph
+            return graph
+
+    def run(self, messages_collection, stop, interval=60.0):
+        """Refresh and re-analyze every interval seconds until stop is set."""
+        while not stop.is_set():
+            try:
+                self.refresh(messages_collection)
+                self.analyze()
+            except Exception as e:
+                print(f"Error refreshing message graph: {str(e)}")
+            stop.wait(interval)
+
+    def _build(self):
+        """Merge buffered edges into the CSR arrays, summing duplicate edges."""
+        with self._lock:
+            if self._built_version == self.version:
+                return
+            n = self.node_count
+            old_src = np.repeat(np.arange(len(self.indptr) - 1, dtype=np.int64), np.diff(self.indptr))
+            src = np.concatenate([old_src, np.asarray(self._pending_src, dtype=np.int64)])
+            dst = np.concatenate([self.indices, np.asarray(self._pending_dst, dtype=np.int64)])
+            weight = np.concatenate([self.weights, np.asarray(self._pending_weight, dtype=np.float64)])
+
+            keys, inverse = np.unique(src * n + dst, return_inverse=True)
+            self.weights = np.bincount(inverse, weights=weight, minlength=len(keys))
+            self.indices = keys % n
+            self.indptr = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(keys // n, minlength=n), out=self.indptr[1:])
+
+            self._pending_src, self._pending_dst, self._pending_weight = [], [], []
+            self._built_version = self.version
+            self._cache = {}
+
+    def edges(self, min_weight=1, touching=None):
+        """
+        Edges weighing at least min_weight as sender/receiver/weight dicts,
+        the shape networkX.aggregate_edges returns. touching limits them to
+        edges with an end among the given node ids.
+        """
+        with self._lock:
+            self._build()
+            src, dst, weights = self._sources(), self.indices, self.weights
+            keep = weights >= min_weight
+            if touching is not None:
+                nodes = [self._index[node_id] for node_id in touching if node_id in self._index]
+                keep &= np.isin(src, nodes) | np.isin(dst, nodes)
+            return [
+                {"sender": self.node_ids[s], "receiver": self.node_ids[d], "weight": int(w)}
+                for s, d, w in zip(src[keep].tolist(), dst[keep].tolist(), weights[keep].tolist())
+            ]
+
+    def _cached(self, name, compute):
+        with self._lock:
+            self._build()
+            if name not in self._cache:
+                self._cache[name] = compute()
+            return self._cache[name]
+
+    def _sources(self):
+        return np.repeat(np.arange(self.node_count, dtype=np.int64), np.diff(self.indptr))
+
+    def degrees(self):
+        """Weighted in/out degree (message counts) and distinct-contact degree per node."""
+        def compute():
+            n = self.node_count
+            src = self._sources()
+            return {
+                "out_messages": np.bincount(src, weights=self.weights, minlength=n),
+                "in_messages": np.bincount(self.indices, weights=self.weights, minlength=n),
+                "out_contacts": np.diff(self.indptr),
+                "in_contacts": np.bincount(self.indices, minlength=n),
+            }
+        return self._cached("degrees", compute)
+
+    def pagerank(self, damping=0.85, tol=1e-8, max_iter=100):
+        """Weighted PageRank by power iteration over the CSR arrays."""
+        def compute():
+            n = self.node_count
+            if n == 0:
+                return np.zeros(0)
+            src = self._sources()
+            out_weight = np.bincount(src, weights=self.weights, minlength=n)
+            dangling = out_weight == 0
+            share = self.weights / np.where(out_weight[src] > 0, out_weight[src], 1)
+            rank = np.full(n, 1.0 / n)
+            for _ in range(max_iter):
+                spread = np.bincount(self.indices, weights=rank[src] * share, minlength=n)
+                new_rank = (1 - damping) / n + damping * (spread + rank[dangling].sum() / n)
+                converged = np.abs(new_rank - rank).sum() < tol
+                rank = new_rank
+                if converged:
+                    break
+            return rank
+        return self._cached(("pagerank", damping), compute)
+
+    def betweenness(self, samples=32, seed=0):
+        """
+        Approximate betweenness (unweighted shortest paths) from `samples`
+        random source nodes with Brandes' algorithm, scaled to the full graph.
+        Exact when samples >= node count.
+        """
+        def compute():
+            n = self.node_count
+            scores = np.zeros(n)
+            if n == 0:
+                return scores
+            rng = np.random.default_rng(seed)
+            pivots = np.arange(n) if samples >= n else rng.choice(n, size=samples, replace=False)
+            indptr, indices = self.indptr.tolist(), self.indices.tolist()
+
+            for source in pivots.tolist():
+                stack = []
+                predecessors = {}
+                sigma = {source: 1}
+                distance = {source: 0}
+                queue = deque([source])
+                while queue:
+                    node = queue.popleft()
+                    stack.append(node)
+                    for neighbour in indices[indptr[node]:indptr[node + 1]]:
+                        if neighbour not in distance:
+                            distance[neighbour] = distance[node] + 1
+                            queue.append(neighbour)
+                        if distance[neighbour] == distance[node] + 1:
+                            sigma[neighbour] = sigma.get(neighbour, 0) + sigma[node]
+                            predecessors.setdefault(neighbour, []).append(node)
+                delta = {}
+                while stack:
+                    node = stack.pop()
+                    for predecessor in predecessors.get(node, ()):
+                        delta[predecessor] = delta.get(predecessor, 0.0) + sigma[predecessor] / sigma[node] * (1 + delta.get(node, 0.0))
+                    if node != source:
+                        scores[node] += delta.get(node, 0.0)
+            return scores * (n / len(pivots))
+        return self._cached(("betweenness", samples, seed), compute)
+
+    def communities(self, max_iter=30, seed=0):
+        """
+        Community label per node by weighted label propagation on the
+        undirected graph. Each round updates a random half of the nodes, which
+        keeps two-node cliques from swapping labels forever.
+        """
+        def compute():
+            n = self.node_count
+            labels = np.arange(n, dtype=np.int64)
+            if n == 0:
+                return labels
+            rng = np.random.default_rng(seed)
+            src = self._sources()
+            # Undirected edges plus a unit self-loop
+            a = np.concatenate([src, self.indices, np.arange(n)])
+            b = np.concatenate([self.indices, src, np.arange(n)])
+            w = np.concatenate([self.weights, self.weights, np.ones(n)])
+            for _ in range(max_iter):
+                keys, inverse = np.unique(a * n + labels[b], return_inverse=True)
+                totals = np.bincount(inverse, weights=w)
+                nodes, candidates = keys // n, keys % n
+                # For each node pick the label with the highest total weight
+                order = np.lexsort((candidates, totals, nodes))
+                last = np.r_[nodes[order][1:] != nodes[order][:-1], True]
+                best = labels.copy()
+                best[nodes[order][last]] = candidates[order][last]
+                if np.array_equal(best, labels):
+                    break
+                update = rng.random(n) < 0.5
+                labels = np.where(update, best, labels)
+            return np.unique(labels, return_inverse=True)[1]
+        return self._cached(("communities", max_iter, seed), compute)
+
+    def percentile(self, values, node_id):
+        """Share of nodes whose value is below this node's (0.0 - 1.0), or None if unknown."""
+        index = self._index.get(node_id)
+        if index is None or not len(values):
+            return None
+        return float((values < values[index]).sum() / len(values))
+
+    def node_metrics(self, node_id):
+        index = self._index.get(node_id)
+        if index is None:
+            return None
+        degrees = self.degrees()
+        pagerank = self.pagerank()
+        return {
+            "id": str(node_id),
+            "out_messages": float(degrees["out_messages"][index]),
+            "in_messages": float(degrees["in_messages"][index]),
+            "out_contacts": int(degrees["out_contacts"][index]),
+            "in_contacts": int(degrees["in_contacts"][index]),
+            "pagerank": float(pagerank[index]),
+            "pagerank_percentile": self.percentile(pagerank, node_id),
+            "betweenness": float(self.betweenness()[index]),
+            "community": int(self.communities()[index]),
+        }
+
+    def summary(self, k=10):
+        """Top-k hubs (PageRank) and brokers (betweenness), plus community sizes."""
+        pagerank = self.pagerank()
+        betweenness = self.betweenness()
+        communities = self.communities()
+        sizes = np.bincount(communities) if len(communities) else np.zeros(0, dtype=np.int64)
+        return {
+            "version": self.version,
+            "nodes": self.node_count,
+            "edges": self.edge_count,
+            "hubs": [
+                {"id": str(self.node_ids[i]), "pagerank": float(pagerank[i])}
+                for i in np.argsort(-pagerank)[:k].tolist()
+            ],
+            "brokers": [
+                {"id": str(self.node_ids[i]), "betweenness": float(betweenness[i])}
+                for i in np.argsort(-betweenness)[:k].tolist()
+            ],
+            "communities": len(sizes),
+            "largest_communities": np.sort(sizes)[::-1][:k].tolist(),
+        }
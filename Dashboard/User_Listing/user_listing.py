@@ -0,0 +1,70 @@
+import base64
+from bson import json_util
+from pymongo import ASCENDING, DESCENDING
+
+SORT_FIELDS = ("riskScore", "lastActive")
+
+# Only the fields the dashboard shows; posts and other arrays stay on the server
+USER_PROJECTION = {
+    "name": 1,
+    "username": 1,
+    "email": 1,
+    "riskScore": 1,
+    "lastActive": 1,
+    "location": 1,
+    "behaviors": 1,
+    "riskFactors": 1,
+}
+
+def ensure_user_indexes(users_collection):
+    # Each index serves the isFlag filter plus one keyset sort order
+    for field in SORT_FIELDS:
+        users_collection.create_index([("isFlag", ASCENDING), (field, DESCENDING), ("_id", DESCENDING)])
+
+def encode_cursor(user, sort_field):
+    payload = json_util.dumps({"v": user.get(sort_field), "id": user["_id"]})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor):
+    payload = json_util.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+    return payload["v"], payload["id"]
+
+def keyset_filter(sort_field, descending, cursor):
+    # Documents strictly after (value, _id) in the (sort_field, _id) order; missing values sort last when descending
+    value, last_id = decode_cursor(cursor)
+    if descending:
+        if value is None:
+            return {sort_field: None, "_id": {"$lt": last_id}}
+        return {"$or": [
+            {sort_field: {"$lt": value}},
+            {sort_field: value, "_id": {"$lt": last_id}},
+            {sort_field: None},
+        ]}
+    if value is None:
+        return {"$or": [{sort_field: {"$ne": None}}, {sort_field: None, "_id": {"$gt": last_id}}]}
+    return {"$or": [{sort_field: {"$gt": value}}, {sort_field: value, "_id": {"$gt": last_id}}]}
+
+def find_flagged_users(users_collection, sort_field="riskScore", descending=True, limit=None, cursor=None):
+    """Cursor over flagged users in (sort_field, _id) order, starting after `cursor`."""
+    query = {"isFlag": True}
+    if cursor:
+        query = {"$and": [query, keyset_filter(sort_field, descending, cursor)]}
+    direction = DESCENDING if descending else ASCENDING
+    # A copy per query, as some drivers (mongomock) rewrite the projection they are given
+    result = users_collection.find(query, dict(USER_PROJECTION)).sort([(sort_field, direction), ("_id", direction)])
+    if limit is not None:
+        result = result.limit(limit)
+    return result.batch_size(500)
+
+def to_listing(user):
+    return {
+        "id": str(user["_id"]),  # Convert MongoDB ObjectId to string
+        "name": user.get("name", ""),
+        "username": user.get("username", ""),
+        "email": user.get("email", ""),
+        "riskScore": user.get("riskScore", 0),
+        "lastActive": user.get("lastActive"),
+        "location": user.get("location", "Unknown"),
+        "behaviors": user.get("behaviors", []),
+        "riskFactors": user.get("riskFactors", []),
+    }
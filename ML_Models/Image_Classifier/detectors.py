@@ -0,0 +1,316 @@
+"""
+Pluggable object detectors for the classes in classes.txt.
+
+Every backend returns, per frame, a list of prediction dicts shaped like the
+Roboflow API's: x and y (box centre), width, height, confidence, class,
+class_id and detection_id, all in the frame's pixel coordinates.
+
+- OnnxDetector runs a YOLO (v5 or v8 layout) ONNX export with ONNX Runtime on CPU.
+- OpenCVDnnDetector runs the same export with OpenCV's DNN module, which needs
+  no extra dependency.
+- RoboflowDetector calls the hosted model one frame at a time.
+- StubDetector produces deterministic fake outputs through the same
+  pre/post-processing path, for benchmarks and tests without a model file.
+
+Class ids are the model's, not line numbers in classes.txt: Roboflow numbers
+a project's classes alphabetically (Cash is 0, Liquid 1, ...). The local
+backends take names from the export's "names" metadata when it has any,
+otherwise from an explicit id -> name map covering every class of the model
+(classes=, or a JSON file named by DETECTOR_CLASSES), otherwise classes.txt
+in alphabetical order.
+
+create_detector() picks a backend by name; DETECTOR_BACKEND and
+DETECTOR_MODEL_PATH set the defaults.
+"""
+import ast
+import json
+import os
+import uuid
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Union
+
+import cv2
+import numpy as np
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CLASSES_PATH = os.path.join(MODULE_DIR, "classes.txt")
+DEFAULT_MODEL_PATH = os.path.join(MODULE_DIR, "Models", "drug-detection.onnx")
+
+
+# Backends that run a local export and take a model_path
+MODEL_BACKENDS = ("onnx", "opencv")
+
+
+def load_classes(path: str = DEFAULT_CLASSES_PATH) -> List[str]:
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def default_model_classes(path: str = DEFAULT_CLASSES_PATH) -> List[str]:
+    """Class names by id for a Roboflow export without metadata: alphabetical."""
+    return sorted(load_classes(path))
+
+
+def class_list(classes: Union[Sequence[str], Mapping[Any, str]]) -> List[str]:
+    """Names indexed by class id, from a list or an {id: name} map (ids may be strings, as in JSON)."""
+    if isinstance(classes, Mapping):
+        by_id = {int(class_id): str(name) for class_id, name in classes.items()}
+        return [by_id.get(class_id, f"class_{class_id}") for class_id in range(max(by_id, default=-1) + 1)]
+    return [str(name) for name in classes]
+
+
+def load_class_map(path: str) -> List[str]:
+    """An id -> name map from a JSON file holding either {"0": "Cash", ...} or a list."""
+    with open(path) as f:
+        return class_list(json.load(f))
+
+
+def parse_class_names(value: Optional[str]) -> Optional[List[str]]:
+    """The "names" metadata of a YOLO export (the repr of an {id: name} dict), or None."""
+    if not value:
+        return None
+    try:
+        names = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return None
+    return class_list(names) if isinstance(names, (dict, list, tuple)) and names else None
+
+
+def _check_model_path(model_path: str) -> None:
+    if not os.path.isfile(model_path):
+        raise FileNotFoundError(
+            f"No detector model at {model_path}. Export the model to ONNX there, point --model-path or "
+            f"DETECTOR_MODEL_PATH at an export, or use the stub or roboflow backend."
+        )
+
+
+def letterbox(frame: np.ndarray, size: int):
+    """Resize keeping the aspect ratio and pad to size x size. Returns (image, scale, pad_x, pad_y)."""
+    height, width = frame.shape[:2]
+    scale = min(size / width, size / height)
+    new_width, new_height = round(width * scale), round(height * scale)
+    pad_x, pad_y = (size - new_width) // 2, (size - new_height) // 2
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    canvas[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    return canvas, scale, pad_x, pad_y
+
+
+class Detector:
+    """
+    Base class for the local backends: letterboxes and batches frames, calls
+    _forward() and decodes YOLO outputs into prediction dicts. Subclasses only
+    implement _forward(batch) for an (N, 3, size, size) float32 RGB batch.
+    """
+
+    def __init__(
+        self,
+        classes: Optional[Union[Sequence[str], Mapping[Any, str]]] = None,
+        input_size: int = 640,
+        conf_threshold: float = 0.4,
+        iou_threshold: float = 0.5,
+        batch_size: int = 8
+    ):
+        # Names indexed by the model's class ids; backends may replace the default with export metadata
+        self.explicit_classes = classes is not None
+        self.classes = class_list(classes) if classes is not None else default_model_classes()
+        self.input_size = input_size
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.batch_size = max(1, batch_size)
+
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def detect(self, frame: np.ndarray) -> List[Dict[str, Any]]:
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames: Sequence[np.ndarray]) -> List[List[Dict[str, Any]]]:
+        """Run detection on BGR frames, batch_size at a time."""
+        results = []
+        for offset in range(0, len(frames), self.batch_size):
+            chunk = frames[offset:offset + self.batch_size]
+            letterboxed = [letterbox(frame, self.input_size) for frame in chunk]
+            batch = cv2.dnn.blobFromImages([item[0] for item in letterboxed], 1 / 255.0, swapRB=True)
+            outputs = self._forward(batch)
+            for output, (_, scale, pad_x, pad_y) in zip(outputs, letterboxed):
+                results.append(self._decode(output, scale, pad_x, pad_y))
+        return results
+
+    def _decode(self, output: np.ndarray, scale: float, pad_x: int, pad_y: int) -> List[Dict[str, Any]]:
+        """Turn one image's raw YOLO output into predictions in frame coordinates."""
+        num_classes = len(self.classes)
+        if output.shape[0] == 4 + num_classes and output.shape[1] != 4 + num_classes:
+            # YOLOv8 layout: (4 + classes, candidates), no objectness
+            output = output.T
+            class_scores = output[:, 4:]
+        else:
+            # YOLOv5 layout: (candidates, 5 + classes), objectness in column 4
+            class_scores = output[:, 5:] * output[:, 4:5]
+        class_ids = class_scores.argmax(axis=1)
+        confidences = class_scores[np.arange(len(class_ids)), class_ids]
+        keep = confidences >= self.conf_threshold
+        if not keep.any():
+            return []
+
+        boxes = output[keep, :4].astype(np.float32)
+        class_ids, confidences = class_ids[keep], confidences[keep]
+        boxes[:, 0] = (boxes[:, 0] - pad_x) / scale
+        boxes[:, 1] = (boxes[:, 1] - pad_y) / scale
+        boxes[:, 2:] /= scale
+
+        # Class-aware NMS: shift each class to its own region so boxes of different classes never overlap
+        corners = np.column_stack([boxes[:, 0] - boxes[:, 2] / 2, boxes[:, 1] - boxes[:, 3] / 2, boxes[:, 2], boxes[:, 3]])
+        shifted = corners.copy()
+        shifted[:, :2] += class_ids[:, None] * 10000.0
+        indices = cv2.dnn.NMSBoxes(shifted.tolist(), confidences.tolist(), self.conf_threshold, self.iou_threshold)
+
+        predictions = []
+        for index in np.array(indices).flatten():
+            class_id = int(class_ids[index])
+            predictions.append({
+                "x": float(boxes[index, 0]),
+                "y": float(boxes[index, 1]),
+                "width": float(boxes[index, 2]),
+                "height": float(boxes[index, 3]),
+                "confidence": float(confidences[index]),
+                "class": self.classes[class_id],
+                "class_id": class_id,
+                "detection_id": str(uuid.uuid4()),
+            })
+        return predictions
+
+
+class OnnxDetector(Detector):
+    """YOLO ONNX export on ONNX Runtime's CPU provider. Class names come from the export's metadata if present."""
+
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH, threads: Optional[int] = None, **kwargs):
+        import onnxruntime as ort
+
+        _check_model_path(model_path)
+        super().__init__(**kwargs)
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        names = parse_class_names(self.session.get_modelmeta().custom_metadata_map.get("names"))
+        if names and not self.explicit_classes:
+            self.classes = names
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Exports with a fixed batch dimension are fed one frame at a time
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+        if isinstance(model_input.shape[2], int):
+            self.input_size = model_input.shape[2]
+
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        if self.dynamic_batch:
+            return self.session.run(None, {self.input_name: batch})[0]
+        return np.concatenate([self.session.run(None, {self.input_name: image[None]})[0] for image in batch])
+
+
+class OpenCVDnnDetector(Detector):
+    """
+    YOLO ONNX export on OpenCV's DNN module. input_size must match the export.
+    OpenCV does not expose the export's metadata, so class names are read with
+    the onnx package when it is installed.
+    """
+
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH, **kwargs):
+        _check_model_path(model_path)
+        super().__init__(**kwargs)
+        if not self.explicit_classes:
+            try:
+                import onnx
+            except ImportError:
+                onnx = None
+            if onnx is not None:
+                model = onnx.load(model_path, load_external_data=False)
+                names = parse_class_names({prop.key: prop.value for prop in model.metadata_props}.get("names"))
+                if names:
+                    self.classes = names
+        self.net = cv2.dnn.readNetFromONNX(model_path)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        try:
+            self.net.setInput(batch)
+            return self.net.forward()
+        except cv2.error:
+            # Fixed-batch exports reject a multi-frame blob
+            outputs = []
+            for image in batch:
+                self.net.setInput(image[None])
+                outputs.append(self.net.forward())
+            return np.concatenate(outputs)
+
+
+class StubDetector(Detector):
+    """
+    Model-free detector for benchmarks and tests. Scores a grid of candidate
+    boxes from the letterboxed image's brightest channel, in the YOLOv8
+    output layout, so the decode and NMS path is the one the real backends use.
+    """
+
+    def __init__(self, grid: int = 8, **kwargs):
+        kwargs.setdefault("input_size", 320)
+        super().__init__(**kwargs)
+        self.grid = grid
+
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        size, grid, num_classes = self.input_size, self.grid, len(self.classes)
+        cell = size / grid
+        centres = (np.arange(grid) + 0.5) * cell
+        cx, cy = np.meshgrid(centres, centres)
+        outputs = np.zeros((len(batch), 4 + num_classes, grid * grid), dtype=np.float32)
+        for i, image in enumerate(batch):
+            brightness = cv2.resize(image.max(axis=0), (grid, grid), interpolation=cv2.INTER_AREA).flatten()
+            outputs[i, 0] = cx.flatten()
+            outputs[i, 1] = cy.flatten()
+            outputs[i, 2:4] = cell
+            class_ids = (brightness * num_classes * 7).astype(int) % num_classes
+            # Only bright cells clear a typical confidence threshold
+            outputs[i, 4 + class_ids, np.arange(grid * grid)] = brightness ** 4
+        return outputs
+
+
+class RoboflowDetector:
+    """Hosted Roboflow model, called once per frame. Needs network access and an API key."""
+
+    def __init__(self, api_key: Optional[str] = None, project: str = "drug-detection-z6yhe", version: int = 1, confidence: int = 40):
+        from roboflow import Roboflow
+
+        rf = Roboflow(api_key=api_key or os.getenv("ROBOFLOW_API_KEY"))
+        self.model = rf.workspace().project(project).version(str(version)).model
+        self.confidence = confidence
+        self.classes = default_model_classes()
+
+    def detect(self, frame: np.ndarray) -> List[Dict[str, Any]]:
+        return self.model.predict(frame, confidence=self.confidence).json()["predictions"]
+
+    def detect_batch(self, frames: Sequence[np.ndarray]) -> List[List[Dict[str, Any]]]:
+        return [self.detect(frame) for frame in frames]
+
+
+BACKENDS = {
+    "onnx": OnnxDetector,
+    "opencv": OpenCVDnnDetector,
+    "roboflow": RoboflowDetector,
+    "stub": StubDetector,
+}
+
+
+def create_detector(backend: Optional[str] = None, **kwargs):
+    """Build a detector by backend name (onnx, opencv, roboflow, stub)."""
+    backend = backend or os.getenv("DETECTOR_BACKEND", "onnx")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown detector backend {backend!r}, expected one of {sorted(BACKENDS)}")
+    if backend in MODEL_BACKENDS:
+        if "model_path" not in kwargs:
+            kwargs["model_path"] = os.getenv("DETECTOR_MODEL_PATH", DEFAULT_MODEL_PATH)
+    elif kwargs.get("model_path") is not None:
+        raise ValueError(f"The {backend} backend takes no model_path; only {' and '.join(MODEL_BACKENDS)} do")
+    else:
+        kwargs.pop("model_path", None)
+    if backend != "roboflow" and "classes" not in kwargs and os.getenv("DETECTOR_CLASSES"):
+        kwargs["classes"] = load_class_map(os.getenv("DETECTOR_CLASSES"))
+    return BACKENDS[backend](**kwargs)
@@ -0,0 +1,250 @@
+"""
+Sharded frame dataset: extracted JPEG frames packed into fixed-size uint8
+NumPy shards, so training and evaluation passes read memory-mapped pixels
+instead of reopening and decoding thousands of small files.
+
+Layout of a dataset directory:
+
+    index.json            image size, shard size, per-video info and one record per sample
+    shard_00000.npy       (shard_size, height, width, 3) uint8, BGR like cv2.imread
+    shard_00001.npy       ...
+
+Shards are allocated at full size and filled in order. Packing new videos
+only writes into the free rows of the last shard and into new shards, and
+index.json is replaced atomically afterwards. Existing samples are never
+rewritten, and readers only see samples listed in the index.
+
+    python -m ML_Models.Image_Classifier.frame_dataset pack --output Data/frame_dataset
+"""
+import argparse
+import json
+import os
+import re
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FRAMES_FOLDER = os.path.join(MODULE_DIR, "Data", "Video Frames")
+INDEX_NAME = "index.json"
+FORMAT_VERSION = 1
+_FRAME_NUMBER = re.compile(r"(\d+)")
+
+
+def _shard_name(number: int) -> str:
+    return f"shard_{number:05d}.npy"
+
+
+def _list_frames(video_dir: str) -> Optional[List[Tuple[str, int]]]:
+    """
+    (file, frame_index) pairs for one video folder, from its manifest when
+    there is one. None while frame_extraction is still rewriting the folder.
+    """
+    manifest_path = os.path.join(video_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if not manifest.get("complete", True):
+            return None
+        return [(frame["file"], frame["frame_index"]) for frame in manifest["frames"]]
+    frames = []
+    for name in os.listdir(video_dir):
+        if name.lower().endswith((".jpg", ".jpeg", ".png")):
+            match = _FRAME_NUMBER.search(name)
+            frames.append((name, int(match.group(1)) if match else -1))
+    return sorted(frames, key=lambda frame: frame[1])
+
+
+def _video_signature(video_dir: str, frames: List[Tuple[str, int]]) -> List[Any]:
+    newest = max((os.path.getmtime(os.path.join(video_dir, name)) for name, _ in frames), default=0)
+    return [len(frames), int(newest)]
+
+
+def _write_index(root: str, index: Dict[str, Any]) -> None:
+    tmp_path = os.path.join(root, INDEX_NAME + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, os.path.join(root, INDEX_NAME))
+
+
+def pack_frames(
+    frames_folder: str,
+    output_dir: str,
+    image_size: Tuple[int, int] = (224, 224),
+    shard_size: int = 1024,
+    label_for: Optional[Callable[[str], int]] = None
+) -> Dict[str, Any]:
+    """
+    Append every video folder under frames_folder that is not in the dataset
+    yet. Each frame is resized to image_size (height, width). label_for maps a
+    video name to an integer label (default -1). Returns counts of what was added.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    index_path = os.path.join(output_dir, INDEX_NAME)
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+        image_size = tuple(index["image_size"])
+        shard_size = index["shard_size"]
+    else:
+        index = {"version": FORMAT_VERSION, "image_size": list(image_size), "shard_size": shard_size, "videos": {}, "samples": []}
+
+    height, width = image_size
+    shard, shard_number = None, None
+    added_videos, added_frames, skipped, incomplete = 0, 0, [], []
+
+    for video in sorted(os.listdir(frames_folder)):
+        video_dir = os.path.join(frames_folder, video)
+        if not os.path.isdir(video_dir):
+            continue
+        frames = _list_frames(video_dir)
+        if frames is None:
+            incomplete.append(video)
+            continue
+        signature = _video_signature(video_dir, frames)
+        if video in index["videos"]:
+            if index["videos"][video]["signature"] != signature:
+                # Samples are append-only; a re-extracted video needs a fresh dataset
+                skipped.append(video)
+            continue
+
+        label = label_for(video) if label_for else -1
+        first = len(index["samples"])
+        for name, frame_index in frames:
+            image = cv2.imread(os.path.join(video_dir, name))
+            if image is None:
+                continue
+            position = len(index["samples"])
+            number, row = divmod(position, shard_size)
+            if number != shard_number:
+                if shard is not None:
+                    shard.flush()
+                shard_path = os.path.join(output_dir, _shard_name(number))
+                mode = "r+" if os.path.exists(shard_path) else "w+"
+                shard = np.lib.format.open_memmap(shard_path, mode=mode, dtype=np.uint8, shape=(shard_size, height, width, 3))
+                shard_number = number
+            shard[row] = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+            index["samples"].append([video, frame_index, label])
+            added_frames += 1
+        index["videos"][video] = {"signature": signature, "label": label, "first": first, "count": len(index["samples"]) - first}
+        added_videos += 1
+
+    if shard is not None:
+        shard.flush()
+        del shard
+    _write_index(output_dir, index)
+    return {"videos_added": added_videos, "frames_added": added_frames, "total_frames": len(index["samples"]),
+            "changed_videos_skipped": skipped, "incomplete_videos_skipped": incomplete}
+
+
+class FrameDataset:
+    """
+    Read-only view of a packed dataset. Shards are memory-mapped on first
+    use. dataset[i] returns an (image, sample) pair, where the image is a view
+    into the shard (zero copy) and the sample is {"video", "frame_index", "label"}.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        with open(os.path.join(root, INDEX_NAME)) as f:
+            index = json.load(f)
+        self.image_size = tuple(index["image_size"])
+        self.shard_size = index["shard_size"]
+        self.videos = index["videos"]
+        self.samples = index["samples"]
+        self.labels = np.array([sample[2] for sample in self.samples], dtype=np.int64)
+        self._shards: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def _shard(self, number: int) -> np.ndarray:
+        shard = self._shards.get(number)
+        if shard is None:
+            shard = np.load(os.path.join(self.root, _shard_name(number)), mmap_mode="r")
+            self._shards[number] = shard
+        return shard
+
+    def image(self, position: int) -> np.ndarray:
+        if not 0 <= position < len(self.samples):
+            raise IndexError(position)
+        number, row = divmod(position, self.shard_size)
+        return self._shard(number)[row]
+
+    def __getitem__(self, position: int) -> Tuple[np.ndarray, Dict[str, Any]]:
+        video, frame_index, label = self.samples[position]
+        return self.image(position), {"video": video, "frame_index": frame_index, "label": label}
+
+    def video_range(self, video: str) -> range:
+        info = self.videos[video]
+        return range(info["first"], info["first"] + info["count"])
+
+    def batches(self, batch_size: int = 64, shuffle: bool = False, seed: Optional[int] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Yield (images, labels) batches. In order, a batch that falls inside
+        one shard is a view of the memory map; one spanning two shards is
+        copied. Shuffled batches are gathered into a new array, sorted by
+        position so each shard is read front to back.
+        """
+        if not shuffle:
+            for start in range(0, len(self.samples), batch_size):
+                stop = min(start + batch_size, len(self.samples))
+                first, last = start // self.shard_size, (stop - 1) // self.shard_size
+                if first == last:
+                    row = start % self.shard_size
+                    images = self._shard(first)[row:row + stop - start]
+                else:
+                    images = np.concatenate([
+                        self._shard(number)[max(start, number * self.shard_size) - number * self.shard_size:
+                                            min(stop, (number + 1) * self.shard_size) - number * self.shard_size]
+                        for number in range(first, last + 1)
+                    ])
+                yield images, self.labels[start:stop]
+            return
+
+        order = np.random.default_rng(seed).permutation(len(self.samples))
+        for offset in range(0, len(order), batch_size):
+            positions = np.sort(order[offset:offset + batch_size])
+            images = np.empty((len(positions), *self.image_size, 3), dtype=np.uint8)
+            for number in np.unique(positions // self.shard_size):
+                mask = positions // self.shard_size == number
+                images[mask] = self._shard(int(number))[positions[mask] % self.shard_size]
+            yield images, self.labels[positions]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack extracted frames into memory-mappable shards.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    pack = subparsers.add_parser("pack", help="append new video folders to a dataset")
+    pack.add_argument("--frames-folder", default=DEFAULT_FRAMES_FOLDER)
+    pack.add_argument("--output", required=True)
+    pack.add_argument("--height", type=int, default=224)
+    pack.add_argument("--width", type=int, default=224)
+    pack.add_argument("--shard-size", type=int, default=1024)
+    pack.add_argument("--labels", default=None, help="JSON file mapping video folder names to integer labels")
+    info = subparsers.add_parser("info", help="summarize a dataset")
+    info.add_argument("dataset")
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        labels = {}
+        if args.labels:
+            with open(args.labels) as f:
+                labels = json.load(f)
+        stats = pack_frames(args.frames_folder, args.output, (args.height, args.width), args.shard_size,
+                            label_for=lambda video: int(labels.get(video, -1)))
+        print(f"Added {stats['frames_added']} frames from {stats['videos_added']} videos "
+              f"({stats['total_frames']} frames in the dataset)")
+        for video in stats["changed_videos_skipped"]:
+            print(f"Skipped {video}: its frames changed since it was packed; repack into a new dataset")
+        for video in stats["incomplete_videos_skipped"]:
+            print(f"Skipped {video}: frame extraction has not finished for it")
+    else:
+        dataset = FrameDataset(args.dataset)
+        print(f"{len(dataset)} frames from {len(dataset.videos)} videos, "
+              f"{dataset.image_size[0]}x{dataset.image_size[1]}, {dataset.shard_size} frames per shard")
+
+
+if __name__ == "__main__":
+    main()
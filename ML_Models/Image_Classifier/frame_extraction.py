@@ -0,0 +1,288 @@
+"""
+Frame extraction for the image classifier's training data.
+
+Samples every `interval`-th frame from each video without decoding the frames
+in between. Short gaps are skipped with grab(), which demuxes without colour
+conversion, and long gaps with a seek. Videos are processed in parallel on a
+process pool. A sampled frame is written only when its perceptual hash (dHash)
+differs from the last kept frame by more than `hash_threshold` bits, so
+near-identical stock-footage frames are not saved twice.
+
+Each video folder gets a manifest.json listing the kept frames and the
+parameters used. A rerun skips videos whose manifest matches the source file
+and the parameters, and only ever deletes frames a previous manifest lists.
+A folder that holds images but no manifest (hand-curated sets, or frames from
+older versions of this script) is left alone, even with --force; extract
+those videos into another --output-folder instead. frame_dataset reads the
+frame list from the manifest, so stray files from an interrupted run are
+never used.
+
+    python -m ML_Models.Image_Classifier.frame_extraction --interval 15 --workers 4
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_VIDEO_FOLDER = os.path.join(MODULE_DIR, "Data", "Raw Videos")
+DEFAULT_OUTPUT_FOLDER = os.path.join(MODULE_DIR, "Data", "Video Frames")
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.flv', '.wmv')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+MANIFEST_NAME = "manifest.json"
+
+# Gaps of at least this many frames are skipped with a seek instead of grab()
+SEEK_MIN_GAP = 48
+
+
+def dhash(frame, hash_size=8):
+    """64-bit difference hash of a BGR or grayscale frame."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def _source_signature(video_path):
+    stat = os.stat(video_path)
+    return {"size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+
+def _load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(path, manifest):
+    # Write then rename, so an interrupted run never leaves a half-written manifest
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _has_images(output_dir):
+    try:
+        names = os.listdir(output_dir)
+    except FileNotFoundError:
+        return False
+    return any(name.lower().endswith(IMAGE_EXTENSIONS) for name in names)
+
+
+def _read_sampled(cap, interval, seek_min_gap):
+    """Yield (frame_index, frame) for every interval-th frame, skipping the rest cheaply."""
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+    frame_index = 0
+    while total is None or frame_index < total:
+        ret, frame = cap.read()
+        if not ret:
+            return
+        yield frame_index, frame
+
+        next_index = frame_index + interval
+        gap = interval - 1
+        if gap >= seek_min_gap and total is not None:
+            if next_index >= total or not cap.set(cv2.CAP_PROP_POS_FRAMES, next_index):
+                return
+        else:
+            for _ in range(gap):
+                if not cap.grab():
+                    return
+        frame_index = next_index
+
+
+def extract_frames(video_path, output_dir, interval=15, hash_threshold=5, jpeg_quality=90, seek_min_gap=SEEK_MIN_GAP, force=False):
+    """
+    Extract the sampled, deduplicated frames of one video into output_dir.
+    Returns a stats dict; "skipped" is True when the manifest was already up to
+    date, or when the folder holds frames this module did not write
+    ("unmanaged"), which are never touched.
+    """
+    params = {"interval": interval, "hash_threshold": hash_threshold, "jpeg_quality": jpeg_quality}
+    source = _source_signature(video_path)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = _load_manifest(manifest_path)
+    if not force and manifest and manifest.get("complete") and manifest.get("source") == source and manifest.get("params") == params:
+        return {"video": os.path.basename(video_path), "skipped": True, "unmanaged": False, "sampled": 0,
+                "written": len(manifest["frames"]), "duplicates": 0, "frames_traversed": 0, "elapsed_seconds": 0.0}
+    # Without a manifest nothing says which of these images are ours
+    if manifest is None and _has_images(output_dir):
+        return {"video": os.path.basename(video_path), "skipped": True, "unmanaged": True, "sampled": 0,
+                "written": 0, "duplicates": 0, "frames_traversed": 0, "elapsed_seconds": 0.0}
+
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video {video_path}")
+
+    # Marks the folder as being rewritten until the final manifest replaces it; an interrupted
+    # run's manifest still carries the frames of the last complete one, so they can be cleaned up
+    _write_manifest(manifest_path, {
+        "video": os.path.basename(video_path),
+        "source": source,
+        "params": params,
+        "frames": manifest["frames"] if manifest else [],
+        "complete": False,
+    })
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    frames, sampled, duplicates = [], 0, 0
+    last_hash, last_index = None, 0
+    try:
+        for frame_index, frame in _read_sampled(cap, interval, seek_min_gap):
+            sampled += 1
+            last_index = frame_index
+            frame_hash = dhash(frame)
+            if last_hash is not None and hamming(frame_hash, last_hash) <= hash_threshold:
+                duplicates += 1
+                continue
+            last_hash = frame_hash
+            filename = f"frame_{frame_index}.jpg"
+            cv2.imwrite(os.path.join(output_dir, filename), frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+            frames.append({
+                "file": filename,
+                "frame_index": frame_index,
+                "timestamp": frame_index / fps if fps else None,
+                "dhash": f"{frame_hash:016x}",
+            })
+    finally:
+        cap.release()
+
+    # Drop frames a previous run listed but this one did not keep
+    if manifest:
+        kept = {frame["file"] for frame in frames}
+        for frame in manifest.get("frames", []):
+            if frame["file"] not in kept:
+                try:
+                    os.remove(os.path.join(output_dir, frame["file"]))
+                except OSError:
+                    pass
+
+    _write_manifest(manifest_path, {
+        "video": os.path.basename(video_path),
+        "source": source,
+        "params": params,
+        "fps": fps,
+        "frames": frames,
+        "complete": True,
+    })
+    return {
+        "video": os.path.basename(video_path),
+        "skipped": False,
+        "unmanaged": False,
+        "sampled": sampled,
+        "written": len(frames),
+        "duplicates": duplicates,
+        "frames_traversed": last_index + 1 if sampled else 0,
+        "elapsed_seconds": time.perf_counter() - start,
+    }
+
+
+def list_videos(video_folder):
+    return sorted(
+        os.path.join(video_folder, name) for name in os.listdir(video_folder)
+        if name.lower().endswith(VIDEO_EXTENSIONS)
+    )
+
+
+def extract_all(video_folder=DEFAULT_VIDEO_FOLDER, output_folder=DEFAULT_OUTPUT_FOLDER, workers=None, interval=15,
+                hash_threshold=5, jpeg_quality=90, force=False):
+    """
+    Extract frames from every video in video_folder on a pool of worker
+    processes, one subfolder per video. Returns per-video stats plus
+    throughput totals.
+    """
+    workers = workers or os.cpu_count() or 1
+    videos = list_videos(video_folder)
+    start = time.perf_counter()
+    results, errors = [], []
+
+    # One OpenCV thread per process; the parallelism comes from the pool
+    with ProcessPoolExecutor(max_workers=workers, initializer=cv2.setNumThreads, initargs=(1,)) as pool:
+        futures = {
+            pool.submit(
+                extract_frames,
+                video_path,
+                os.path.join(output_folder, os.path.splitext(os.path.basename(video_path))[0]),
+                interval,
+                hash_threshold,
+                jpeg_quality,
+                SEEK_MIN_GAP,
+                force,
+            ): video_path
+            for video_path in videos
+        }
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors.append({"video": os.path.basename(futures[future]), "error": str(e)})
+
+    elapsed = time.perf_counter() - start
+    traversed = sum(result["frames_traversed"] for result in results)
+    cores = min(workers, len(videos)) or 1
+    return {
+        "videos": sorted(results, key=lambda result: result["video"]),
+        "errors": errors,
+        "workers": workers,
+        "sampled": sum(result["sampled"] for result in results),
+        "written": sum(result["written"] for result in results if not result["skipped"]),
+        "duplicates": sum(result["duplicates"] for result in results),
+        "skipped_videos": sum(result["skipped"] and not result["unmanaged"] for result in results),
+        "unmanaged_videos": sum(result["unmanaged"] for result in results),
+        "elapsed_seconds": elapsed,
+        "frames_per_second": traversed / elapsed if elapsed else 0.0,
+        "frames_per_second_per_core": traversed / elapsed / cores if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract deduplicated frames from every video in a folder.")
+    parser.add_argument("--video-folder", default=DEFAULT_VIDEO_FOLDER)
+    parser.add_argument("--output-folder", default=DEFAULT_OUTPUT_FOLDER)
+    parser.add_argument("--interval", type=int, default=15, help="keep every nth frame")
+    parser.add_argument("--hash-threshold", type=int, default=5, help="max dHash bit difference treated as a duplicate")
+    parser.add_argument("--jpeg-quality", type=int, default=90)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--force", action="store_true", help="re-extract videos whose manifest is up to date (folders without one are still left alone)")
+    args = parser.parse_args()
+
+    stats = extract_all(
+        args.video_folder,
+        args.output_folder,
+        workers=args.workers,
+        interval=args.interval,
+        hash_threshold=args.hash_threshold,
+        jpeg_quality=args.jpeg_quality,
+        force=args.force
+    )
+    for video in stats["videos"]:
+        if video["unmanaged"]:
+            print(f"Left alone: {video['video']} (folder holds frames without a manifest; use another --output-folder)")
+        elif video["skipped"]:
+            print(f"Up to date: {video['video']} ({video['written']} frames)")
+        else:
+            print(f"Extracted {video['written']} frames from {video['video']} "
+                  f"({video['duplicates']} near-duplicates dropped)")
+    for error in stats["errors"]:
+        print(f"Error: {error['video']}: {error['error']}")
+    print(f"{stats['written']} frames written, {stats['duplicates']} duplicates dropped, "
+          f"{stats['skipped_videos']} videos up to date, {stats['unmanaged_videos']} left alone in {stats['elapsed_seconds']:.2f}s: "
+          f"{stats['frames_per_second']:.0f} frames/sec, {stats['frames_per_second_per_core']:.0f} frames/sec per core "
+          f"({stats['workers']} workers)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,97 @@
-from roboflow import Roboflow
-
-rf = Roboflow(api_key="W6DgvDUjwI7kvKIKjVmr")
-project = rf.workspace().project("drug-detection-z6yhe")
-model = project.version("1").model
-
-job_id, signed_url, expire_time = model.predict_video(
-    "test_video.mp4",
-    fps=5,
-    prediction_type="batch-video",
-)
-
-results = model.poll_until_video_results(job_id)
-
-print(results)
-
-
-# 'predictions': [
-#     {
-#         'x': 334.0, 
-#         'y': 165.0, 
-#         'width': 122.0, 
-#         'height': 26.0, 
-#         'confidence': 0.9198073148727417, 
-#         'class': 'Liquid', 
-#         'class_id': 1, 
-#         'detection_id': '82ad6dc9-2c98-4f4c-b7ff-1a141cf751a1'
-#     }
\ No newline at end of file
+"""
+Run drug-paraphernalia detection over a video, sampled at `fps` frames per
+second. Detection runs locally by default (see detectors.py), so the video is
+never uploaded and nothing waits in a remote queue. Pass --backend roboflow
+to use the hosted model instead.
+
+    python -m ML_Models.Image_Classifier.video_detection ML_Models/Image_Classifier/test_video.mp4 --fps 5
+"""
+import argparse
+import json
+import os
+import time
+
+import cv2
+
+from ML_Models.Image_Classifier.detectors import MODEL_BACKENDS, create_detector, load_class_map
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def sample_frames(video_path, fps=5):
+    """Yield (frame_index, timestamp, frame) at roughly fps frames per second, grabbing past the rest."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video {video_path}")
+    source_fps = cap.get(cv2.CAP_PROP_FPS) or fps
+    step = max(1, round(source_fps / fps))
+    frame_index = 0
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield frame_index, frame_index / source_fps, frame
+            for _ in range(step - 1):
+                if not cap.grab():
+                    return
+            frame_index += step
+    finally:
+        cap.release()
+
+
+def detect_video(video_path, detector, fps=5, batch_size=8):
+    """
+    Detect objects in the sampled frames of a video. Returns one
+    {"frame_index", "time", "predictions"} entry per sampled frame, with
+    predictions in the same shape as the Roboflow API's.
+    """
+    results, pending = [], []
+
+    def flush():
+        predictions = detector.detect_batch([frame for _, _, frame in pending])
+        for (frame_index, timestamp, _), frame_predictions in zip(pending, predictions):
+            results.append({"frame_index": frame_index, "time": timestamp, "predictions": frame_predictions})
+        pending.clear()
+
+    for item in sample_frames(video_path, fps):
+        pending.append(item)
+        if len(pending) >= batch_size:
+            flush()
+    if pending:
+        flush()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect objects in a video with a local or hosted detector.")
+    parser.add_argument("video", nargs="?", default=os.path.join(MODULE_DIR, "test_video.mp4"))
+    parser.add_argument("--backend", default=None, help="onnx, opencv, roboflow or stub (default: $DETECTOR_BACKEND or onnx)")
+    parser.add_argument("--model-path", default=None, help="ONNX export for the onnx and opencv backends")
+    parser.add_argument("--classes", default=None, help="JSON id -> name map for exports without class metadata")
+    parser.add_argument("--fps", type=float, default=5)
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    backend = args.backend or os.getenv("DETECTOR_BACKEND", "onnx")
+    if args.model_path and backend not in MODEL_BACKENDS:
+        parser.error(f"--model-path only applies to the {' and '.join(MODEL_BACKENDS)} backends, not {backend}")
+    options = {"model_path": args.model_path} if args.model_path else {}
+    if backend != "roboflow":
+        options["batch_size"] = args.batch_size
+        if args.classes:
+            options["classes"] = load_class_map(args.classes)
+    try:
+        detector = create_detector(backend, **options)
+    except (FileNotFoundError, ValueError) as e:
+        parser.error(str(e))
+
+    start = time.perf_counter()
+    results = detect_video(args.video, detector, fps=args.fps, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - start
+    print(json.dumps(results, indent=2))
+    print(f"{len(results)} frames in {elapsed:.2f}s ({len(results) / elapsed if elapsed else 0:.1f} frames/sec)")
+
+
+if __name__ == "__main__":
+    main()
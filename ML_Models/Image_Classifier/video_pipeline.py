@@ -0,0 +1,283 @@
+"""
+Streaming video annotation: decode -> detect -> annotate -> encode.
+
+Each stage runs in its own thread, connected to the next by a bounded queue.
+Only about queue_size frames per stage are in memory, whatever the video
+length. Detection runs on every `step`-th source frame, where step comes from
+the source fps and the requested detection fps. The boxes of the last
+detection are drawn on the frames in between, up to max_carry frames later.
+Output is written at the source frame rate, so it stays in sync with the input.
+
+    python -m ML_Models.Image_Classifier.video_pipeline ML_Models/Image_Classifier/test_video.mp4 annotated_video.mp4 --backend stub
+"""
+import argparse
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import cv2
+
+from ML_Models.Image_Classifier.detectors import create_detector
+
+_END = object()
+
+
+def detection_step(source_fps: float, detect_fps: float) -> int:
+    """Source frames per detection when detecting at detect_fps."""
+    if not source_fps or not detect_fps or detect_fps >= source_fps:
+        return 1
+    return max(1, round(source_fps / detect_fps))
+
+
+def map_detections_to_frames(results: List[Dict[str, Any]], source_fps: float, detect_fps: float) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Key per-sample detection results (e.g. a Roboflow batch-video response)
+    by the source frame each sample was taken from. The i-th result belongs
+    to frame i * step, not to frame i.
+    """
+    step = detection_step(source_fps, detect_fps)
+    return {index * step: result.get("predictions", []) for index, result in enumerate(results)}
+
+
+def draw_predictions(frame, predictions, color=(0, 255, 0)):
+    """Draw boxes and labels in place. x and y are box centres, as the detectors return them."""
+    for prediction in predictions:
+        left = int(prediction["x"] - prediction["width"] / 2)
+        top = int(prediction["y"] - prediction["height"] / 2)
+        right = int(prediction["x"] + prediction["width"] / 2)
+        bottom = int(prediction["y"] + prediction["height"] / 2)
+        label = f"{prediction['class']} ({prediction['confidence']:.2f})"
+        cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+        cv2.putText(frame, label, (left, max(top - 10, 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    return frame
+
+
+class StageStats:
+    """Items handled and time spent working (not waiting on queues) by one stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy_seconds = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "items": self.items,
+            "busy_seconds": self.busy_seconds,
+            "items_per_second": self.items / self.busy_seconds if self.busy_seconds else 0.0,
+        }
+
+
+class MonitoredQueue(queue.Queue):
+    """Bounded queue that samples its depth on every put."""
+
+    def __init__(self, name: str, maxsize: int):
+        super().__init__(maxsize)
+        self.name = name
+        self.samples = 0
+        self.depth_total = 0
+        self.depth_max = 0
+
+    def put(self, item, block=True, timeout=None):
+        depth = self.qsize()
+        self.samples += 1
+        self.depth_total += depth
+        self.depth_max = max(self.depth_max, depth)
+        super().put(item, block, timeout)
+
+    def occupancy(self) -> Dict[str, Any]:
+        return {
+            "maxsize": self.maxsize,
+            "avg_depth": self.depth_total / self.samples if self.samples else 0.0,
+            "max_depth": self.depth_max,
+        }
+
+
+class VideoPipeline:
+    """
+    Annotates a video with a detector from detectors.py. run() returns
+    per-stage throughput and queue occupancy. A full queue between two stages
+    means the downstream stage is the bottleneck.
+    """
+
+    def __init__(self, detector, detect_fps: float = 5, queue_size: int = 32, batch_size: int = 8,
+                 max_carry: Optional[int] = None, fourcc: str = "mp4v"):
+        self.detector = detector
+        self.detect_fps = detect_fps
+        self.queue_size = queue_size
+        self.batch_size = max(1, batch_size)
+        self.max_carry = max_carry
+        self.fourcc = fourcc
+
+    def run(self, input_path: str, output_path: str) -> Dict[str, Any]:
+        cap = cv2.VideoCapture(input_path)
+        if not cap.isOpened():
+            raise IOError(f"Could not open video {input_path}")
+        source_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*self.fourcc), source_fps, size)
+        if not writer.isOpened():
+            cap.release()
+            raise IOError(f"Could not open {output_path} for writing")
+
+        step = detection_step(source_fps, self.detect_fps)
+        max_carry = self.max_carry if self.max_carry is not None else step
+        queues = [MonitoredQueue(name, self.queue_size) for name in ("decoded", "detected", "annotated")]
+        stats = {name: StageStats(name) for name in ("decode", "detect", "annotate", "encode")}
+        errors = []
+
+        class Aborted(Exception):
+            pass
+
+        # Blocking queue calls give up once any stage has failed, so no thread waits forever
+        def put(q, item):
+            while True:
+                if errors:
+                    raise Aborted()
+                try:
+                    return q.put(item, timeout=0.1)
+                except queue.Full:
+                    pass
+
+        def get(q):
+            while True:
+                if errors:
+                    raise Aborted()
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+        def stage(name, target):
+            def runner():
+                try:
+                    target()
+                except Aborted:
+                    pass
+                except Exception as e:
+                    errors.append(f"{name}: {e}")
+            return threading.Thread(target=runner, name=f"video-{name}", daemon=True)
+
+        def decode():
+            out, stat = queues[0], stats["decode"]
+            index = 0
+            while True:
+                start = time.perf_counter()
+                ret, frame = cap.read()
+                stat.busy_seconds += time.perf_counter() - start
+                if not ret:
+                    break
+                stat.items += 1
+                put(out, (index, frame))
+                index += 1
+            put(out, _END)
+
+        def detect():
+            source, out, stat = queues[0], queues[1], stats["detect"]
+            pending = []  # frames waiting for the next detection batch, in order
+            last_boxes, last_index = [], None
+
+            def flush():
+                nonlocal last_boxes, last_index
+                sampled = [frame for index, frame in pending if index % step == 0]
+                start = time.perf_counter()
+                detections = iter(self.detector.detect_batch(sampled) if sampled else [])
+                stat.busy_seconds += time.perf_counter() - start
+                stat.items += len(sampled)
+                for index, frame in pending:
+                    if index % step == 0:
+                        last_boxes, last_index = next(detections), index
+                    carried = last_index is not None and index - last_index <= max_carry
+                    put(out, (index, frame, last_boxes if carried else []))
+                pending.clear()
+
+            while True:
+                item = get(source)
+                if item is _END:
+                    break
+                pending.append(item)
+                if sum(1 for index, _ in pending if index % step == 0) >= self.batch_size:
+                    flush()
+            flush()
+            put(out, _END)
+
+        def annotate():
+            source, out, stat = queues[1], queues[2], stats["annotate"]
+            while True:
+                item = get(source)
+                if item is _END:
+                    break
+                index, frame, predictions = item
+                start = time.perf_counter()
+                draw_predictions(frame, predictions)
+                stat.busy_seconds += time.perf_counter() - start
+                stat.items += 1
+                put(out, (index, frame))
+            put(out, _END)
+
+        def encode():
+            source, stat = queues[2], stats["encode"]
+            while True:
+                item = get(source)
+                if item is _END:
+                    break
+                start = time.perf_counter()
+                writer.write(item[1])
+                stat.busy_seconds += time.perf_counter() - start
+                stat.items += 1
+
+        started = time.perf_counter()
+        threads = [stage(name, target) for name, target in
+                   (("decode", decode), ("detect", detect), ("annotate", annotate), ("encode", encode))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        cap.release()
+        writer.release()
+        elapsed = time.perf_counter() - started
+        if errors:
+            raise RuntimeError("Video pipeline failed: " + "; ".join(errors))
+
+        frames = stats["encode"].items
+        return {
+            "frames": frames,
+            "detections_run": stats["detect"].items,
+            "detection_step": step,
+            "source_fps": source_fps,
+            "elapsed_seconds": elapsed,
+            "frames_per_second": frames / elapsed if elapsed else 0.0,
+            "stages": {name: stat.to_dict() for name, stat in stats.items()},
+            "queues": {q.name: q.occupancy() for q in queues},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Annotate a video with detections, streaming frame by frame.")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--backend", default=None, help="onnx, opencv, roboflow or stub (default: $DETECTOR_BACKEND or onnx)")
+    parser.add_argument("--model-path", default=None)
+    parser.add_argument("--fps", type=float, default=5, help="detections per second of video")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--queue-size", type=int, default=32)
+    args = parser.parse_args()
+
+    options = {"model_path": args.model_path} if args.model_path else {}
+    if args.backend != "roboflow":
+        options["batch_size"] = args.batch_size
+    pipeline = VideoPipeline(create_detector(args.backend, **options), detect_fps=args.fps,
+                             queue_size=args.queue_size, batch_size=args.batch_size)
+    report = pipeline.run(args.input, args.output)
+
+    print(f"Wrote {report['frames']} frames to {args.output} in {report['elapsed_seconds']:.2f}s "
+          f"({report['frames_per_second']:.1f} frames/sec, detection every {report['detection_step']} frames)")
+    for name, stage in report["stages"].items():
+        print(f"  {name:<9} {stage['items']:>6} items  {stage['items_per_second']:9.1f} items/sec busy")
+    for name, occupancy in report["queues"].items():
+        print(f"  queue {name:<9} avg {occupancy['avg_depth']:5.1f} / max {occupancy['max_depth']} of {occupancy['maxsize']}")
+
+
+if __name__ == "__main__":
+    main()
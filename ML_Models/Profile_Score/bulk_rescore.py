@@ -0,0 +1,130 @@
+import argparse
+import time
+from datetime import datetime
+
+import numpy as np
+from pymongo import UpdateOne
+
+from ML_Models.Profile_Score.user_profile_score import UserProfileScore, FLAG_THRESHOLD, COMPONENTS
+from ML_Models.Profile_Score.hotspot_index import HOTSPOTS_CSV_PATH, hotspot_version
+from database import get_collection
+
+DEFAULT_CSV_PATH = HOTSPOTS_CSV_PATH
+
+def scoring_pipeline(match=None, keep=()):
+    """
+    Joins each user with its flags document server-side and ships only the
+    numbers the scorer needs, not the posts or flaggedWords arrays themselves.
+    match limits the users; keep lists extra user fields to pass through.
+    """
+    stages = [{"$match": match}] if match else []
+    return stages + [
+        {"$project": {"posts": 1, "flagged": 1, "lastLoginLocation": 1, **{field: 1 for field in keep}}},
+        {"$lookup": {"from": "flags", "localField": "flagged", "foreignField": "_id", "as": "flag"}},
+        {"$project": {
+            "postCount": {"$size": {"$ifNull": ["$posts", []]}},
+            "flaggedWordCount": {"$size": {"$ifNull": [{"$arrayElemAt": ["$flag.flaggedWords", 0]}, []]}},
+            "positiveCount": {"$ifNull": [{"$arrayElemAt": ["$flag.positiveCount", 0]}, 0]},
+            "negativeCount": {"$ifNull": [{"$arrayElemAt": ["$flag.negativeCount", 0]}, 0]},
+            "latitude": "$lastLoginLocation.latitude",
+            "longitude": "$lastLoginLocation.longitude",
+            **{field: 1 for field in keep},
+        }},
+    ]
+
+
+SCORING_PIPELINE = scoring_pipeline()
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def iter_scoring_batches(users_collection, batch_size=1000):
+    """Stream users joined with their flags as lists of at most batch_size documents."""
+    cursor = users_collection.aggregate(SCORING_PIPELINE, allowDiskUse=True, batchSize=batch_size)
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def score_batch(ps, batch, csv_path):
+    """Compute each sub-score for one batch with NumPy column operations."""
+    return ps.component_scores(
+        post_counts=[doc.get("postCount", 0) for doc in batch],
+        flagged_word_counts=[doc.get("flaggedWordCount", 0) for doc in batch],
+        user_locations=[(_to_float(doc.get("latitude")), _to_float(doc.get("longitude"))) for doc in batch],
+        csv_path=csv_path,
+        total_positives=[doc.get("positiveCount", 0) for doc in batch],
+        total_coded=[doc.get("negativeCount", 0) for doc in batch],
+    )
+
+
+def bulk_rescore(users_collection, csv_path=DEFAULT_CSV_PATH, batch_size=1000, threshold=FLAG_THRESHOLD, dry_run=False):
+    """
+    Rescore every user and write riskScore/isFlag/riskComponents back with unordered bulk writes,
+    stamped like risk_events' own writes. Returns counts, elapsed time and users/sec.
+    """
+    ps = UserProfileScore()
+    start = time.perf_counter()
+    scored = flagged = modified = 0
+
+    for batch in iter_scoring_batches(users_collection, batch_size):
+        components = score_batch(ps, batch, csv_path)
+        scores = ps.score_from_components(components)
+        is_flag = scores >= threshold
+        scored += len(batch)
+        flagged += int(is_flag.sum())
+        if dry_run:
+            continue
+        columns = {name: components[name].tolist() for name in COMPONENTS}
+        version, updated_at = hotspot_version(csv_path), datetime.utcnow()
+        result = users_collection.bulk_write([
+            UpdateOne({"_id": doc["_id"]}, {"$set": {
+                "riskScore": float(score),
+                "isFlag": bool(flag),
+                # Stored so the event-driven scorer can update one sub-score at a time
+                "riskComponents": {name: columns[name][i] for name in COMPONENTS},
+                "riskUpdatedAt": updated_at,
+                "hotspotVersion": version,
+            }})
+            for i, (doc, score, flag) in enumerate(zip(batch, scores.tolist(), is_flag.tolist()))
+        ], ordered=False)
+        modified += result.modified_count
+
+    elapsed = time.perf_counter() - start
+    return {
+        "scored": scored,
+        "flagged": flagged,
+        "modified": modified,
+        "elapsed_seconds": elapsed,
+        "users_per_second": scored / elapsed if elapsed else 0.0,
+        "dry_run": dry_run,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute riskScore/isFlag for every user.")
+    parser.add_argument("--csv-path", default=DEFAULT_CSV_PATH)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--threshold", type=float, default=FLAG_THRESHOLD)
+    parser.add_argument("--dry-run", action="store_true", help="score without writing back")
+    args = parser.parse_args()
+
+    stats = bulk_rescore(
+        get_collection('users'),
+        csv_path=args.csv_path,
+        batch_size=args.batch_size,
+        threshold=args.threshold,
+        dry_run=args.dry_run
+    )
+    print(f"Scored {stats['scored']} users ({stats['flagged']} flagged, {stats['modified']} updated) "
+          f"in {stats['elapsed_seconds']:.2f}s, {stats['users_per_second']:.0f} users/sec")
@@ -0,0 +1,362 @@
+"""
+Hotspot derivation: weighted DBSCAN over the locations of flagged activity,
+producing a small set of hotspots (centroid, radius, weight) for the risk
+scorers and the heatmap.
+
+Each user contributes one point at their lastLoginLocation, weighted by the
+flagged messages behind it: positiveCount plus half of negativeCount (coded
+messages), the weighting the message score uses. Messages carry no location
+of their own, so flagged messages count at their sender's location. Users
+with no flagged messages are left out. isFlag is not used: it follows
+riskScore, whose location sub-score comes from these hotspots, so counting
+it would let a hotspot keep its own users flagged.
+
+Clustering runs on grid cells, not points. Points are binned into cells of
+eps_km / 2 on a side, keeping each cell's weight, weighted coordinate sums
+and point count, so adding or removing points only touches their cells.
+DBSCAN then treats every cell as a weighted point at its centroid:
+neighbours are looked up among the 5x5 surrounding cells with vectorized
+haversine, a cell is a core when the weight within eps_km reaches
+min_weight from at least min_points users (so one heavily flagged account
+is not a hotspot on its own), core cells within eps_km of each other form
+one hotspot, and border cells join their nearest core. A hotspot's radius
+covers 90% of its weight plus half a cell diagonal.
+
+Refreshes pull users whose updatedAt moved since the last one. Flag writers
+bump the user's updatedAt, but flags edited directly do not, so every
+full_refresh_interval seconds a refresh rebuilds from all users instead.
+
+Results are written to HOTSPOTS_CSV_PATH, which load_hotspot_index reloads
+whenever it changes. Location sub-scores pick up new hotspots on the next
+rescore; pass --rescore to run bulk_rescore when the hotspots change.
+
+    python -m ML_Models.Profile_Score.hotspot_engine --eps-km 1 --min-weight 10
+    python -m ML_Models.Profile_Score.hotspot_engine --watch --interval 60 --rescore
+"""
+import argparse
+import csv
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from ML_Models.Profile_Score.bulk_rescore import scoring_pipeline
+from ML_Models.Profile_Score.hotspot_index import HOTSPOTS_CSV_PATH, KM_PER_DEGREE, haversine_km
+import metrics
+
+CSV_FIELDS = ("latitude", "longitude", "radius_km", "weight", "points")
+
+# Shortest gap between refreshes triggered by requests, in seconds
+REFRESH_INTERVAL = float(os.getenv("HOTSPOT_REFRESH_INTERVAL", "300"))
+
+# Cell keys pack (row, column) into one int64
+_KEY_OFFSET = 1 << 24
+_KEY_STRIDE = 1 << 26
+
+
+def _connected_components(count, edges_a, edges_b):
+    """Component label per node, by min-label propagation with pointer jumping."""
+    labels = np.arange(count)
+    while True:
+        previous = labels.copy()
+        smallest = np.minimum(labels[edges_a], labels[edges_b])
+        np.minimum.at(labels, edges_a, smallest)
+        np.minimum.at(labels, edges_b, smallest)
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def _weighted_quantile(values, weights, q):
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    return values[order][min(len(values) - 1, int(np.searchsorted(cumulative, q * cumulative[-1])))]
+
+
+class HotspotEngine:
+    """
+    Incrementally maintained cell aggregates plus the hotspots derived from
+    them. update_points() replaces the contribution of the given ids, so a
+    user who moves, gains flags or is cleared is handled the same way.
+    """
+
+    def __init__(self, eps_km=1.0, min_weight=10.0, min_points=3, max_hotspots=200, full_refresh_interval=None):
+        self.eps_km = eps_km
+        self.min_weight = min_weight
+        self.min_points = min_points
+        self.max_hotspots = max_hotspots
+        self.full_refresh_interval = full_refresh_interval
+        self.cell_km = eps_km / 2
+        self._cell_deg = self.cell_km / KM_PER_DEGREE
+
+        self.hotspots = []
+        self.refreshed_at = 0.0
+        self.full_refreshed_at = 0.0
+        self.version = 0
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        # Sorted cell keys with per-cell weight, weighted latitude/longitude sums and point counts
+        self.keys = np.empty(0, dtype=np.int64)
+        self.weights = np.empty(0)
+        self.lat_sums = np.empty(0)
+        self.lon_sums = np.empty(0)
+        self.counts = np.empty(0, dtype=np.int64)
+        self._points = {}  # id -> (latitude, longitude, weight) currently counted
+        self.watermark = None
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cell_keys(self, latitudes, longitudes):
+        # Rows follow latitude; columns follow east-west distance at the point's own latitude
+        rows = np.floor(latitudes / self._cell_deg).astype(np.int64)
+        cols = np.floor(longitudes * np.cos(np.radians(latitudes)) / self._cell_deg).astype(np.int64)
+        return (rows + _KEY_OFFSET) * _KEY_STRIDE + (cols + _KEY_OFFSET)
+
+    def add(self, latitudes, longitudes, weights, counts=None):
+        """Fold points into the cell aggregates; negative weights and counts take them out again."""
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        weights = np.asarray(weights, dtype=float)
+        counts = np.ones(len(latitudes), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        if not len(latitudes):
+            return
+        with self._lock:
+            keys = np.concatenate([self.keys, self._cell_keys(latitudes, longitudes)])
+            unique, inverse = np.unique(keys, return_inverse=True)
+            columns = [
+                np.bincount(inverse, weights=np.concatenate([old, new]), minlength=len(unique))
+                for old, new in ((self.weights, weights), (self.lat_sums, weights * latitudes),
+                                 (self.lon_sums, weights * longitudes), (self.counts, counts))
+            ]
+            keep = columns[3] > 0
+            self.keys = unique[keep]
+            self.weights, self.lat_sums, self.lon_sums = (column[keep] for column in columns[:3])
+            self.counts = np.rint(columns[3][keep]).astype(np.int64)
+
+    def update_points(self, ids, latitudes, longitudes, weights):
+        """
+        Set the points for ids, replacing what they contributed before. A
+        weight of zero or less, or a missing coordinate, removes the id.
+        """
+        with self._lock:
+            old = [self._points.pop(point_id) for point_id in ids if point_id in self._points]
+            if old:
+                old_lat, old_lon, old_weight = (np.array(column) for column in zip(*old))
+                self.add(old_lat, old_lon, -old_weight, -np.ones(len(old), dtype=np.int64))
+
+            latitudes = np.asarray(latitudes, dtype=float)
+            longitudes = np.asarray(longitudes, dtype=float)
+            weights = np.asarray(weights, dtype=float)
+            keep = (weights > 0) & np.isfinite(latitudes) & np.isfinite(longitudes)
+            kept_ids = [point_id for point_id, kept in zip(ids, keep.tolist()) if kept]
+            self._points.update(zip(kept_ids, zip(latitudes[keep].tolist(), longitudes[keep].tolist(), weights[keep].tolist())))
+            self.add(latitudes[keep], longitudes[keep], weights[keep])
+
+    def _publish(self, hotspots):
+        # version moves only when the hotspots do, so caches keyed on it survive no-op refreshes
+        if hotspots != self.hotspots:
+            self.hotspots = hotspots
+            self.version += 1
+        return self.hotspots
+
+    def cluster(self):
+        """Run DBSCAN over the cells and store the resulting hotspots, heaviest first."""
+        with self._lock, metrics.timed("function_seconds", function="hotspot_cluster"):
+            keys, weights, counts = self.keys, self.weights, self.counts
+            if not len(keys):
+                return self._publish([])
+            latitudes = self.lat_sums / weights
+            longitudes = self.lon_sums / weights
+
+            # Close cell pairs (including each cell with itself) among the 5x5 block around each cell
+            pairs_a, pairs_b, distances = [], [], []
+            cells = np.arange(len(keys))
+            for d_row in range(-2, 3):
+                for d_col in range(-2, 3):
+                    neighbour_keys = keys + d_row * _KEY_STRIDE + d_col
+                    positions = np.minimum(np.searchsorted(keys, neighbour_keys), len(keys) - 1)
+                    found = keys[positions] == neighbour_keys
+                    a, b = cells[found], positions[found]
+                    distance = haversine_km(latitudes[a], longitudes[a], latitudes[b], longitudes[b])
+                    close = distance <= self.eps_km
+                    pairs_a.append(a[close])
+                    pairs_b.append(b[close])
+                    distances.append(distance[close])
+            pairs_a, pairs_b, distances = np.concatenate(pairs_a), np.concatenate(pairs_b), np.concatenate(distances)
+
+            density = np.bincount(pairs_a, weights=weights[pairs_b], minlength=len(keys))
+            neighbours = np.bincount(pairs_a, weights=counts[pairs_b], minlength=len(keys))
+            core = (density >= self.min_weight) & (neighbours >= self.min_points)
+            if not core.any():
+                return self._publish([])
+
+            labels = np.full(len(keys), -1)
+            core_edges = core[pairs_a] & core[pairs_b]
+            labels[core] = _connected_components(len(keys), pairs_a[core_edges], pairs_b[core_edges])[core]
+
+            # Border cells join the nearest core cell within eps
+            border = ~core[pairs_a] & core[pairs_b]
+            order = np.lexsort((distances[border], pairs_a[border]))
+            border_cells, border_cores = pairs_a[border][order], pairs_b[border][order]
+            first = np.unique(border_cells, return_index=True)[1]
+            labels[border_cells[first]] = labels[border_cores[first]]
+
+            member = labels >= 0
+            cluster_ids, cluster_of = np.unique(labels[member], return_inverse=True)
+            member_weights = weights[member]
+            totals = np.bincount(cluster_of, weights=member_weights)
+            centre_lat = np.bincount(cluster_of, weights=self.lat_sums[member]) / totals
+            centre_lon = np.bincount(cluster_of, weights=self.lon_sums[member]) / totals
+            points = np.bincount(cluster_of, weights=counts[member])
+            spread = haversine_km(latitudes[member], longitudes[member], centre_lat[cluster_of], centre_lon[cluster_of])
+
+            half_diagonal = self.cell_km / np.sqrt(2)
+            hotspots = []
+            for cluster in np.argsort(-totals)[:self.max_hotspots].tolist():
+                in_cluster = cluster_of == cluster
+                hotspots.append({
+                    "latitude": float(centre_lat[cluster]),
+                    "longitude": float(centre_lon[cluster]),
+                    "radius_km": float(_weighted_quantile(spread[in_cluster], member_weights[in_cluster], 0.9) + half_diagonal),
+                    "weight": float(totals[cluster]),
+                    "points": int(points[cluster]),
+                })
+            return self._publish(hotspots)
+
+    def refresh(self, users_collection, full=False, min_interval=0, batch_size=10000):
+        """
+        Pull users changed since the last refresh (all users the first time,
+        with full=True, or once full_refresh_interval has passed), update their
+        points and recluster. Skipped if the last refresh was less than
+        min_interval seconds ago. Returns True when the hotspots changed.
+        """
+        with self._lock:
+            now = time.time()
+            if now - self.refreshed_at < min_interval:
+                return False
+            self.refreshed_at = now
+            started = datetime.utcnow()
+            if self.full_refresh_interval is not None and now - self.full_refreshed_at >= self.full_refresh_interval:
+                full = True
+            if full or self.watermark is None:
+                self._reset()
+                self.full_refreshed_at = now
+                match = None
+            else:
+                match = {"updatedAt": {"$gt": self.watermark}}
+
+            pipeline = scoring_pipeline(match)
+            batch = []
+            for doc in users_collection.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size):
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    self._update_from_docs(batch)
+                    batch = []
+            if batch:
+                self._update_from_docs(batch)
+            self.watermark = started
+
+            version = self.version
+            self.cluster()
+            return self.version != version
+
+    def _update_from_docs(self, docs):
+        def coordinate(value):
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return np.nan
+
+        weights = [doc.get("positiveCount", 0) + 0.5 * doc.get("negativeCount", 0) for doc in docs]
+        self.update_points(
+            [doc["_id"] for doc in docs],
+            [coordinate(doc.get("latitude")) for doc in docs],
+            [coordinate(doc.get("longitude")) for doc in docs],
+            weights,
+        )
+
+    def save_csv(self, path=HOTSPOTS_CSV_PATH):
+        """Write the hotspots for load_hotspot_index; replaced atomically so readers never see half a file."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.hotspots)
+        os.replace(tmp_path, path)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_hotspot_engine():
+    """
+    The process-wide engine, configured by HOTSPOT_EPS_KM, HOTSPOT_MIN_WEIGHT,
+    HOTSPOT_MIN_POINTS, HOTSPOT_MAX and HOTSPOT_FULL_REFRESH_INTERVAL (0 turns
+    periodic full refreshes off).
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = HotspotEngine(
+                    eps_km=float(os.getenv("HOTSPOT_EPS_KM", "1.0")),
+                    min_weight=float(os.getenv("HOTSPOT_MIN_WEIGHT", "10")),
+                    min_points=int(os.getenv("HOTSPOT_MIN_POINTS", "3")),
+                    max_hotspots=int(os.getenv("HOTSPOT_MAX", "200")),
+                    full_refresh_interval=float(os.getenv("HOTSPOT_FULL_REFRESH_INTERVAL", "3600")) or None,
+                )
+    return _engine
+
+
+def refresh_hotspots(users_collection, path=HOTSPOTS_CSV_PATH, min_interval=0):
+    """Incrementally refresh the shared engine and rewrite path when the hotspots changed."""
+    engine = get_hotspot_engine()
+    changed = engine.refresh(users_collection, min_interval=min_interval)
+    if changed or not os.path.exists(path):
+        engine.save_csv(path)
+    return changed
+
+
+def main():
+    from database import get_collection
+    from ML_Models.Profile_Score.bulk_rescore import bulk_rescore
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--eps-km", type=float, default=1.0, help="neighbourhood radius")
+    parser.add_argument("--min-weight", type=float, default=10.0, help="flagged weight within eps that makes a core")
+    parser.add_argument("--min-points", type=int, default=3, help="users within eps that make a core")
+    parser.add_argument("--max-hotspots", type=int, default=200)
+    parser.add_argument("--output", default=HOTSPOTS_CSV_PATH)
+    parser.add_argument("--watch", action="store_true", help="keep refreshing incrementally")
+    parser.add_argument("--interval", type=float, default=60.0)
+    parser.add_argument("--full-interval", type=float, default=3600.0, help="seconds between full rebuilds when watching")
+    parser.add_argument("--rescore", action="store_true", help="run bulk_rescore whenever the hotspots change")
+    args = parser.parse_args()
+
+    users = get_collection("users")
+    engine = HotspotEngine(args.eps_km, args.min_weight, args.min_points, args.max_hotspots, args.full_interval or None)
+    while True:
+        start = time.perf_counter()
+        changed = engine.refresh(users)
+        engine.save_csv(args.output)
+        print(f"{len(engine.hotspots)} hotspots from {len(engine)} weighted points, {len(engine.keys)} cells "
+              f"in {time.perf_counter() - start:.2f}s{'' if changed else ' (unchanged)'}")
+        if changed and args.rescore:
+            stats = bulk_rescore(users, csv_path=args.output)
+            print(f"Rescored {stats['scored']} users ({stats['flagged']} flagged)")
+        if not args.watch:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
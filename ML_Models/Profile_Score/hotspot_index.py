@@ -0,0 +1,160 @@
+import csv
+import hashlib
+import math
+import os
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+# Derived hotspots (see hotspot_engine), read by the risk scorers
+HOTSPOTS_CSV_PATH = "Dashboard/Heatmap/Data/hotspots.csv"
+
+# Up to this many hotspots, batch queries compare against all of them at once
+BRUTE_FORCE_MAX = 2048
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Vectorized haversine distance in kilometers; accepts scalars or NumPy arrays."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class HotspotIndex:
+    """
+    Grid bucket index over hotspot coordinates. A proximity query only looks
+    at the handful of cells around the point, so its cost does not grow with
+    the number of hotspots.
+
+    Hotspots may carry a radius (radius_km in the CSV): a point is near one
+    when it lies within the query distance or within that hotspot's radius,
+    whichever is larger.
+    """
+
+    def __init__(self, latitudes, longitudes, cell_size_deg=0.01, radii=None):
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.radii = np.zeros(len(self.latitudes)) if radii is None else np.asarray(radii, dtype=float)
+        self.max_radius = float(self.radii.max()) if len(self.radii) else 0.0
+        self.cell_size_deg = cell_size_deg
+
+        buckets = defaultdict(list)
+        cells_lat = np.floor(self.latitudes / cell_size_deg).astype(np.int64)
+        cells_lon = np.floor(self.longitudes / cell_size_deg).astype(np.int64)
+        for i, cell in enumerate(zip(cells_lat.tolist(), cells_lon.tolist())):
+            buckets[cell].append(i)
+        self._buckets = {cell: np.array(indices) for cell, indices in buckets.items()}
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    @classmethod
+    def from_csv(cls, csv_path, **kwargs):
+        latitudes, longitudes, radii = [], [], []
+        with open(csv_path, newline='') as csvfile:
+            for row in csv.DictReader(csvfile):
+                try:
+                    latitude, longitude = float(row['latitude']), float(row['longitude'])
+                    radius = float(row.get('radius_km') or 0)
+                except (TypeError, ValueError):
+                    continue  # Skip rows without usable coordinates
+                latitudes.append(latitude)
+                longitudes.append(longitude)
+                radii.append(radius)
+        return cls(latitudes, longitudes, radii=radii, **kwargs)
+
+    def _candidates(self, lat, lon, radius_km):
+        """Indices of hotspots in the grid cells that could lie within radius_km."""
+        lat_span = math.ceil(radius_km / KM_PER_DEGREE / self.cell_size_deg)
+        cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+        lon_span = min(math.ceil(radius_km / (KM_PER_DEGREE * cos_lat) / self.cell_size_deg), int(360 / self.cell_size_deg))
+        cell_lat = math.floor(lat / self.cell_size_deg)
+        cell_lon = math.floor(lon / self.cell_size_deg)
+
+        # Wrap longitude cells so queries near the antimeridian see both sides
+        lon_cells = round(360 / self.cell_size_deg)
+        half = lon_cells // 2
+        neighbours = {
+            (cell_lat + d_lat, (cell_lon + d_lon + half) % lon_cells - half)
+            for d_lat in range(-lat_span, lat_span + 1)
+            for d_lon in range(-lon_span, lon_span + 1)
+        }
+        found = [self._buckets[cell] for cell in neighbours if cell in self._buckets]
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def nearest_distance(self, lat, lon, radius_km):
+        """Distance in km to the closest hotspot within reach (radius_km or its own radius), or None."""
+        if len(self) <= BRUTE_FORCE_MAX:
+            candidates = np.arange(len(self))
+        else:
+            candidates = self._candidates(lat, lon, radius_km + self.max_radius)
+        if not len(candidates):
+            return None
+        distances = haversine_km(lat, lon, self.latitudes[candidates], self.longitudes[candidates])
+        reached = distances[distances <= np.maximum(radius_km, self.radii[candidates])]
+        return float(reached.min()) if len(reached) else None
+
+    def within(self, latitudes, longitudes, radius_km, chunk_size=4096):
+        """Boolean array: whether each query point lies within reach of a hotspot."""
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        if not len(self):
+            return np.zeros(len(latitudes), dtype=bool)
+        if len(self) <= BRUTE_FORCE_MAX:
+            # A small hotspot set: one (chunk x hotspots) distance matrix per chunk of points
+            reach = np.maximum(radius_km, self.radii)
+            result = np.empty(len(latitudes), dtype=bool)
+            for start in range(0, len(latitudes), chunk_size):
+                stop = start + chunk_size
+                distances = haversine_km(latitudes[start:stop, None], longitudes[start:stop, None], self.latitudes, self.longitudes)
+                result[start:stop] = (distances <= reach).any(axis=1)
+            return result
+        return np.array([
+            self.nearest_distance(lat, lon, radius_km) is not None
+            for lat, lon in zip(latitudes.tolist(), longitudes.tolist())
+        ], dtype=bool)
+
+
+_index_lock = threading.Lock()
+_index_cache = {}
+_version_cache = {}
+
+
+def hotspot_version(csv_path):
+    """
+    Short digest of the hotspots in csv_path ("" when there are none yet),
+    recomputed only when the file's mtime changes. Stored next to scores
+    whose location sub-score was computed against those hotspots.
+    """
+    mtime = os.path.getmtime(csv_path) if os.path.exists(csv_path) else None
+    with _index_lock:
+        cached = _version_cache.get(csv_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    version = ""
+    if mtime is not None:
+        with open(csv_path, "rb") as f:
+            version = hashlib.sha1(f.read()).hexdigest()[:16]
+    with _index_lock:
+        _version_cache[csv_path] = (mtime, version)
+    return version
+
+
+def load_hotspot_index(csv_path):
+    """
+    Return the index for csv_path, rebuilding it only when the file's mtime
+    changes. A missing file means no hotspots yet.
+    """
+    mtime = os.path.getmtime(csv_path) if os.path.exists(csv_path) else None
+    with _index_lock:
+        cached = _index_cache.get(csv_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    index = HotspotIndex.from_csv(csv_path) if mtime is not None else HotspotIndex([], [])
+    with _index_lock:
+        _index_cache[csv_path] = (mtime, index)
+    return index
@@ -0,0 +1,455 @@
+"""
+Event-driven risk scoring. New posts and messages, flag updates and user
+changes mark the affected sub-scores of the users involved as dirty. Dirty
+users are rescored in batches and riskScore/isFlag/riskComponents are written
+straight back, so /profile-score and /database/users read fresh values with
+a single lookup.
+
+Events come from a MongoDB change stream when the server supports one
+(replica sets and sharded clusters). Otherwise, on a standalone mongod or
+mongomock, the scorer polls behind watermarks kept in risk_watermarks:
+messages and posts by _id, users by updatedAt. Each poll re-reads a short
+overlap before the watermark and skips documents it has already seen, since
+client-generated ObjectIds and updatedAt stamps can commit out of order.
+Flags have no timestamps, so in polling mode flag changes are seen through
+the user updatedAt that every flag writer bumps with them (the message
+controller through Mongoose timestamps, backlog_classifier explicitly).
+Fresh watermarks start after the newest existing documents; run
+bulk_rescore once to score the backlog.
+
+Every score is written with the hotspotVersion its location sub-score was
+computed against. When the hotspots change, users scored against older ones
+get their location sub-score recomputed; those whose location score moved
+are rescored, the rest only have their hotspotVersion advanced.
+
+    python -m ML_Models.Profile_Score.risk_events --mode auto --report-interval 10
+
+Which events reach which sub-score:
+
+    posts insert                  -> post (author)
+    messages insert               -> keyword, message (sender)
+    flags insert/update           -> keyword, message (users linked to the flag)
+    users update of posts / lastLoginLocation / flagged -> post / location / keyword, message
+    users update of isFlag / updatedAt, not by the scorer -> keyword, message
+    hotspots change               -> location (users near added or removed hotspots)
+"""
+import argparse
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import OperationFailure
+
+from ML_Models.Profile_Score.bulk_rescore import DEFAULT_CSV_PATH, scoring_pipeline, _to_float
+from ML_Models.Profile_Score.hotspot_index import hotspot_version
+from ML_Models.Profile_Score.user_profile_score import UserProfileScore, FLAG_THRESHOLD, COMPONENTS
+from database import get_db
+import metrics
+
+WATCHED_COLLECTIONS = ("users", "flags", "messages", "posts")
+
+# Polling re-reads this much before each watermark, for writes that commit behind newer ones
+POLL_OVERLAP = timedelta(seconds=5)
+
+# Top-level user fields that feed each sub-score. Updates touching none of
+# them are ignored. isFlag and updatedAt are there because the message
+# controller writes both next to the flags, overwriting the scorer's isFlag;
+# the scorer's own writes carry riskUpdatedAt and are ignored whole.
+USER_FIELD_COMPONENTS = {
+    "posts": ("post",),
+    "lastLoginLocation": ("location",),
+    "flagged": ("keyword", "message"),
+    "isFlag": ("keyword", "message"),
+    "updatedAt": ("keyword", "message"),
+}
+
+# Inputs of each sub-score, as produced by scoring_pipeline()
+_COMPONENT_INPUTS = {
+    "post": lambda ps, docs, csv_path: ps.component_scores(post_counts=[doc.get("postCount", 0) for doc in docs]),
+    "keyword": lambda ps, docs, csv_path: ps.component_scores(flagged_word_counts=[doc.get("flaggedWordCount", 0) for doc in docs]),
+    "location": lambda ps, docs, csv_path: ps.component_scores(
+        user_locations=[(_to_float(doc.get("latitude")), _to_float(doc.get("longitude"))) for doc in docs], csv_path=csv_path),
+    "message": lambda ps, docs, csv_path: ps.component_scores(
+        total_positives=[doc.get("positiveCount", 0) for doc in docs], total_coded=[doc.get("negativeCount", 0) for doc in docs]),
+}
+
+
+def _epoch(value):
+    """Seconds since the epoch for a naive-UTC or aware datetime."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _poll_start(field, watermark):
+    """Lower bound of the next poll: the watermark less POLL_OVERLAP, where that is representable."""
+    if field == "_id":
+        start = watermark.generation_time - POLL_OVERLAP
+        return ObjectId.from_datetime(start) if start.timestamp() > 0 else watermark
+    return watermark - POLL_OVERLAP if watermark > datetime.min + POLL_OVERLAP else watermark
+
+
+class RiskEventScorer:
+    """
+    Collects scoring events and applies them in batches. Events for the same
+    user are merged, so a burst of messages from one sender costs one rescore.
+    flush() reads the dirty users (joined with their flags) in one aggregate,
+    recomputes only their dirty sub-scores, takes the rest from the stored
+    riskComponents, and writes every user back with one bulk_write.
+    """
+
+    def __init__(self, db, csv_path=DEFAULT_CSV_PATH, threshold=FLAG_THRESHOLD, batch_size=500, max_delay=0.5):
+        self.db = db
+        self.users_collection = db["users"]
+        self.watermarks = db["risk_watermarks"]
+        self.csv_path = csv_path
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.ps = UserProfileScore()
+        self.mode = None
+        self.hotspot_version = None
+
+        self._lock = threading.Lock()
+        self._dirty = {}        # user _id -> set of dirty sub-scores
+        self._dirty_flags = set()
+        self._event_times = []  # event timestamps waiting for the next flush
+        self._first_pending = None
+
+        self.events = 0
+        self.users_rescored = 0
+        self.started_at = time.time()
+        self._recent_lags = deque(maxlen=1000)
+        self._polled = {}       # collection -> {document key: event time} inside the overlap window
+
+    def ensure_indexes(self):
+        # Flag events are resolved to users by flagged; polling walks users by updatedAt
+        self.users_collection.create_index([("flagged", ASCENDING)])
+        self.users_collection.create_index([("updatedAt", ASCENDING)])
+
+    # Events
+
+    def add_user_event(self, user_id, components, event_time, source):
+        if user_id is None or not components:
+            return
+        with self._lock:
+            self._dirty.setdefault(user_id, set()).update(components)
+            self._note_event(event_time, source)
+
+    def add_flag_event(self, flag_id, event_time):
+        if flag_id is None:
+            return
+        with self._lock:
+            self._dirty_flags.add(flag_id)
+            self._note_event(event_time, "flags")
+
+    def _note_event(self, event_time, source):
+        self._event_times.append(event_time)
+        if self._first_pending is None:
+            self._first_pending = time.monotonic()
+        self.events += 1
+        metrics.inc("risk_events_total", source=source)
+
+    def pending(self):
+        return len(self._event_times)
+
+    def should_flush(self):
+        return self.pending() >= self.batch_size or (
+            self._first_pending is not None and time.monotonic() - self._first_pending >= self.max_delay
+        )
+
+    # Scoring
+
+    def flush(self):
+        """Rescore every user with pending events. Returns the number of users written."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            dirty_flags, self._dirty_flags = self._dirty_flags, set()
+            event_times, self._event_times = self._event_times, []
+            self._first_pending = None
+        if not event_times:
+            return 0
+
+        with metrics.timed("function_seconds", function="risk_events_flush"):
+            if dirty_flags:
+                for user in self.users_collection.find({"flagged": {"$in": list(dirty_flags)}}, {"_id": 1}):
+                    dirty.setdefault(user["_id"], set()).update(("keyword", "message"))
+
+            written = self._rescore(dirty) if dirty else 0
+
+        now = time.time()
+        for event_time in event_times:
+            lag = max(0.0, now - event_time)
+            metrics.observe("risk_event_lag_seconds", lag)
+            self._recent_lags.append(lag)
+        self.users_rescored += written
+        metrics.inc("risk_users_rescored_total", written)
+        return written
+
+    def _rescore(self, dirty):
+        docs = list(self.users_collection.aggregate(
+            scoring_pipeline({"_id": {"$in": list(dirty)}}, keep=("riskComponents", "hotspotVersion"))
+        ))
+        if not docs:
+            return 0
+
+        # A user without stored sub-scores gets all of them computed once, and one
+        # scored against other hotspots gets a new location sub-score
+        version = hotspot_version(self.csv_path)
+        needs = []
+        for doc in docs:
+            stored = doc.get("riskComponents") or {}
+            missing = {name for name in COMPONENTS if name not in stored}
+            if doc.get("hotspotVersion") != version:
+                missing.add("location")
+            needs.append(dirty[doc["_id"]] | missing)
+            doc["components"] = dict(stored)
+
+        for name in COMPONENTS:
+            subset = [doc for doc, need in zip(docs, needs) if name in need]
+            if subset:
+                column = _COMPONENT_INPUTS[name](self.ps, subset, self.csv_path)[name]
+                for doc, value in zip(subset, column.tolist()):
+                    doc["components"][name] = value
+
+        updated_at = datetime.utcnow()
+        requests = []
+        for doc in docs:
+            components = {name: float(doc["components"][name]) for name in COMPONENTS}
+            score = float(self.ps.score_from_components(components))
+            requests.append(UpdateOne({"_id": doc["_id"]}, {"$set": {
+                "riskComponents": components,
+                "riskScore": score,
+                "isFlag": score >= self.threshold,
+                "riskUpdatedAt": updated_at,
+                "hotspotVersion": version,
+            }}))
+        self.users_collection.bulk_write(requests, ordered=False)
+        return len(requests)
+
+    def check_hotspots(self):
+        """
+        After the hotspots change, recompute the location sub-score of every
+        scored user whose hotspotVersion is older. Users whose location score
+        moved are rescored; the others only get the new hotspotVersion.
+        Returns the number of users rescored.
+        """
+        version = hotspot_version(self.csv_path)
+        if version == self.hotspot_version:
+            return 0
+        query = {"riskComponents": {"$exists": True}, "hotspotVersion": {"$ne": version}}
+        cursor = self.users_collection.find(query, {"lastLoginLocation": 1, "riskComponents.location": 1}).batch_size(self.batch_size)
+        moved = 0
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= self.batch_size:
+                moved += self._check_locations(batch, version)
+                batch = []
+        if batch:
+            moved += self._check_locations(batch, version)
+        if self.pending():
+            self.flush()
+        self.hotspot_version = version
+        return moved
+
+    def _check_locations(self, docs, version):
+        locations = []
+        for doc in docs:
+            location = doc.get("lastLoginLocation") or {}
+            locations.append((_to_float(location.get("latitude")), _to_float(location.get("longitude"))))
+        scores = self.ps.component_scores(user_locations=locations, csv_path=self.csv_path)["location"].tolist()
+        now = time.time()
+        unchanged = []
+        moved = 0
+        for doc, score in zip(docs, scores):
+            if float(score) != doc["riskComponents"].get("location"):
+                self.add_user_event(doc["_id"], ("location",), now, "hotspots")
+                moved += 1
+            else:
+                unchanged.append(doc["_id"])
+        if unchanged:
+            # Guarded on the old version, so a rescore that already wrote the new one is left alone
+            self.users_collection.update_many(
+                {"_id": {"$in": unchanged}, "hotspotVersion": {"$ne": version}},
+                {"$set": {"hotspotVersion": version}}
+            )
+        if self.pending() >= self.batch_size:
+            self.flush()
+        return moved
+
+    # Change streams
+
+    def _on_change(self, change):
+        collection = change["ns"]["coll"]
+        operation = change["operationType"]
+        document = change.get("fullDocument") or {}
+        if "wallTime" in change:
+            event_time = _epoch(change["wallTime"])
+        else:
+            event_time = float(change["clusterTime"].time)
+
+        if collection == "messages" and operation == "insert":
+            self.add_user_event(document.get("senderId"), ("keyword", "message"), event_time, "messages")
+        elif collection == "posts" and operation == "insert":
+            self.add_user_event(document.get("author"), ("post",), event_time, "posts")
+        elif collection == "flags":
+            self.add_flag_event(change["documentKey"]["_id"], event_time)
+        elif collection == "users":
+            if operation == "update":
+                description = change.get("updateDescription") or {}
+                fields = {field.split(".")[0] for field in description.get("updatedFields", {})}
+                fields.update(field.split(".")[0] for field in description.get("removedFields", []))
+                if "riskUpdatedAt" in fields:
+                    fields = set()  # the scorer's own write
+                components = {name for field in fields for name in USER_FIELD_COMPONENTS.get(field, ())}
+            else:
+                components = set(COMPONENTS)
+            self.add_user_event(change["documentKey"]["_id"], components, event_time, "users")
+
+    def watch(self, stop):
+        """
+        Consume the database change stream until stop is set. The resume token
+        is saved after each flush, so a restart picks up where it left off.
+        Raises OperationFailure or NotImplementedError when change streams are unavailable.
+        """
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": list(WATCHED_COLLECTIONS)},
+            "operationType": {"$in": ["insert", "update", "replace"]},
+        }}]
+        if not callable(getattr(type(self.db), "watch", None)):
+            raise NotImplementedError("this client has no change streams")  # e.g. mongomock
+        state = self.watermarks.find_one({"_id": "change_stream"}) or {}
+        with self.db.watch(pipeline, full_document="updateLookup", resume_after=state.get("token"),
+                           max_await_time_ms=int(self.max_delay * 1000)) as stream:
+            self.mode = "change_stream"
+            while not stop.is_set():
+                change = stream.try_next()
+                if change is not None:
+                    self._on_change(change)
+                else:
+                    self.check_hotspots()
+                if self.pending() and (change is None or self.should_flush()):
+                    self.flush()
+                    self.watermarks.update_one({"_id": "change_stream"}, {"$set": {"token": stream.resume_token}}, upsert=True)
+
+    # Polling
+
+    def poll_once(self):
+        """
+        Turn writes newer than the stored watermarks, less POLL_OVERLAP, into
+        events and flush them. Documents already turned into events within the
+        overlap are skipped; after a restart they are rescored once more,
+        which is harmless. Hotspot changes are checked first. Returns the
+        number of events seen.
+        """
+        self.check_hotspots()
+        sources = (
+            ("messages", "_id", {"senderId": 1}, lambda doc: (doc.get("senderId"), ("keyword", "message"))),
+            ("posts", "_id", {"author": 1}, lambda doc: (doc.get("author"), ("post",))),
+            ("users", "updatedAt", {"updatedAt": 1}, lambda doc: (doc["_id"], COMPONENTS)),
+        )
+        state = self.watermarks.find_one({"_id": "poll"})
+        if state is None:
+            # Start after the newest existing document; the backlog is bulk_rescore's job
+            state = {"_id": "poll"}
+            for name, field, _, _ in sources:
+                newest = self.db[name].find_one({field: {"$exists": True}}, {field: 1}, sort=[(field, -1)])
+                state[name] = newest[field] if newest else (datetime.min if field == "updatedAt" else ObjectId("0" * 24))
+            self.watermarks.replace_one({"_id": "poll"}, state, upsert=True)
+
+        seen = 0
+        for name, field, projection, to_event in sources:
+            watermark = state[name]
+            polled = self._polled.setdefault(name, {})
+            query = {field: {"$gte": _poll_start(field, watermark)}}
+            cursor = self.db[name].find(query, projection).sort(field, ASCENDING).batch_size(self.batch_size)
+            for doc in cursor:
+                watermark = max(watermark, doc[field])
+                # A user is seen again whenever updatedAt moves; inserts only once
+                key = doc["_id"] if field == "_id" else (doc["_id"], doc[field])
+                if key in polled:
+                    continue
+                user_id, components = to_event(doc)
+                event_time = doc["_id"].generation_time.timestamp() if field == "_id" else _epoch(doc[field])
+                polled[key] = event_time
+                self.add_user_event(user_id, components, event_time, name)
+                seen += 1
+                if self.pending() >= self.batch_size:
+                    self.flush()
+                    self.watermarks.update_one({"_id": "poll"}, {"$set": {name: watermark}})
+            if self.pending():
+                self.flush()
+            if watermark != state[name]:
+                self.watermarks.update_one({"_id": "poll"}, {"$set": {name: watermark}})
+            horizon = (watermark.generation_time.timestamp() if field == "_id" else _epoch(watermark)) - POLL_OVERLAP.total_seconds()
+            self._polled[name] = {key: event_time for key, event_time in polled.items() if event_time >= horizon}
+        return seen
+
+    def poll(self, stop, interval=1.0):
+        self.mode = "poll"
+        while not stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"Error polling for risk events: {str(e)}")
+            stop.wait(interval)
+
+    def run(self, stop=None, mode="auto", interval=1.0):
+        """Score events until stop is set: from a change stream, by polling, or ("auto") whichever works."""
+        stop = stop or threading.Event()
+        self.ensure_indexes()
+        if mode in ("auto", "stream"):
+            try:
+                self.watch(stop)
+                return
+            except (OperationFailure, NotImplementedError) as e:
+                if mode == "stream":
+                    raise
+                print(f"Change streams unavailable ({str(e).splitlines()[0]}), polling every {interval}s instead")
+        self.poll(stop, interval)
+
+    def stats(self):
+        elapsed = time.time() - self.started_at
+        lags = sorted(self._recent_lags)
+        return {
+            "mode": self.mode,
+            "events": self.events,
+            "users_rescored": self.users_rescored,
+            "events_per_second": self.events / elapsed if elapsed else 0.0,
+            "lag_p50_seconds": lags[len(lags) // 2] if lags else None,
+            "lag_max_seconds": lags[-1] if lags else None,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep riskScore/isFlag up to date from database writes.")
+    parser.add_argument("--mode", choices=("auto", "stream", "poll"), default="auto")
+    parser.add_argument("--csv-path", default=DEFAULT_CSV_PATH)
+    parser.add_argument("--threshold", type=float, default=FLAG_THRESHOLD)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between polls in polling mode")
+    parser.add_argument("--report-interval", type=float, default=10.0)
+    args = parser.parse_args()
+
+    scorer = RiskEventScorer(get_db(), args.csv_path, args.threshold, args.batch_size)
+    stop = threading.Event()
+    worker = threading.Thread(target=scorer.run, args=(stop, args.mode, args.interval), name="risk-events", daemon=True)
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(args.report_interval)
+            stats = scorer.stats()
+            lag = f"{stats['lag_p50_seconds']:.2f}s" if stats["lag_p50_seconds"] is not None else "-"
+            print(f"[{stats['mode']}] {stats['events']} events ({stats['events_per_second']:.1f}/s), "
+                  f"{stats['users_rescored']} users rescored, p50 lag {lag}")
+    except KeyboardInterrupt:
+        stop.set()
+        worker.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,23 @@
-from pymongo import MongoClient
-import nltk
 from datetime import datetime
 from dotenv import load_dotenv
 import os
-import csv
-from math import radians, sin, cos, sqrt, atan2
+import numpy as np
+from ML_Models.Profile_Score.hotspot_index import load_hotspot_index
+from database import collection
+import metrics
 
 load_dotenv()
 
-mongo_uri = os.getenv("MONGO_URI")
-client = MongoClient(mongo_uri)
-db = client['test']  # Database name
-users_collection = db['users'] 
-user_collection = db['user'] 
-activity_collection = db['activity'] 
+# Shared, lazily connected collections
+users_collection = collection('users')
+user_collection = collection('user')
+activity_collection = collection('activity')
+
+# Users scoring at or above this are flagged
+FLAG_THRESHOLD = 30
+
+# Sub-scores that add up to the risk score, stored per user as riskComponents
+COMPONENTS = ("post", "keyword", "location", "message")
 
 class UserProfileScore:
     # Helper Functions for Risk Scoring
@@ -28,41 +32,27 @@ class UserProfileScore:
     def calculate_location_score(self, user_location, csv_path):
         distance_threshold = 0.1
 
-        def load_hotspots_from_csv(csv_path):
-            hotspots = []
-            with open(csv_path, newline='') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    lat = float(row['latitude'])  # Ensure latitude is a float
-                    lon = float(row['longitude'])  # Ensure longitude is a float
-                    hotspots.append((lat, lon))
-            return hotspots
-
-        hotspots = load_hotspots_from_csv(csv_path)
-
-        def haversine_distance(lat1, lon1, lat2, lon2):
-            R = 6371.0  # Earth radius in kilometers
-            lat1, lon1, lat2, lon2 = map(float, [lat1, lon1, lat2, lon2])  # Convert all to floats
-            lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-            
-            dlat = lat2 - lat1
-            dlon = lon2 - lon1
-            a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
-            c = 2 * atan2(sqrt(a), sqrt(1 - a))
-            
-            return R * c  # Distance in kilometers
+        # The index is loaded once and rebuilt only when the CSV changes
+        hotspots = load_hotspot_index(csv_path)
 
         user_lat, user_lon = map(float, user_location)  # Ensure user_location is a tuple of floats
-        risk_score = 0
-        
-        for hotspot_lat, hotspot_lon in hotspots:
-            distance = haversine_distance(user_lat, user_lon, hotspot_lat, hotspot_lon)
-            
-            if distance <= distance_threshold:
-                risk_score = 5  # High risk if within the threshold
-                break  # Exit once a hotspot within range is found
 
-        return risk_score
+        # High risk if within the threshold of any hotspot
+        if hotspots.nearest_distance(user_lat, user_lon, distance_threshold) is not None:
+            return 5
+        return 0
+
+    def calculate_location_scores(self, user_locations, csv_path):
+        # Batch variant: one score per (latitude, longitude) pair
+        distance_threshold = 0.1
+        if not len(user_locations):
+            return np.zeros(0)
+        hotspots = load_hotspot_index(csv_path)
+        locations = np.asarray(user_locations, dtype=float)
+        scores = np.zeros(len(locations))
+        valid = np.isfinite(locations).all(axis=1)  # Missing coordinates score 0
+        scores[valid] = np.where(hotspots.within(locations[valid, 0], locations[valid, 1], distance_threshold), 5, 0)
+        return scores
 
 
     def calculate_message_score(self, total_positives, total_coded):
@@ -70,6 +60,45 @@ class UserProfileScore:
         total_coded=0.5*total_coded
         return min(10, total_coded+total_positive)
     
-    def total_score(self, post_count, flagged_words, user_location, csv_path, total_positives, total_coded):
-        return ((self.calculate_post_frequency_score(post_count)+self.calculate_keyword_score(flagged_words)+self.calculate_location_score(user_location, csv_path)+self.calculate_message_score(total_positives, total_coded)) * 100) / 20
+    def calculate_network_score(self, centrality_percentile):
+        # Hubs of the messaging network (by PageRank percentile) score higher
+        if centrality_percentile is None:
+            return 0
+        if centrality_percentile >= 0.99:
+            return 5
+        if centrality_percentile >= 0.9:
+            return 3
+        return 0
+
+    @metrics.timed_function("function_seconds", function="total_score")
+    def total_score(self, post_count, flagged_words, user_location, csv_path, total_positives, total_coded, centrality_percentile=None):
+        score = self.calculate_post_frequency_score(post_count)+self.calculate_keyword_score(flagged_words)+self.calculate_location_score(user_location, csv_path)+self.calculate_message_score(total_positives, total_coded)
+        if centrality_percentile is None:
+            return (score * 100) / 20
+        # With a network signal the maximum grows from 20 to 25 points
+        return ((score + self.calculate_network_score(centrality_percentile)) * 100) / 25
+
+    def component_scores(self, post_counts=None, flagged_word_counts=None, user_locations=None, csv_path=None,
+                         total_positives=None, total_coded=None):
+        # Vectorized sub-scores, one column per component whose inputs are given
+        components = {}
+        if post_counts is not None:
+            components["post"] = np.minimum(5, np.asarray(post_counts, dtype=float))
+        if flagged_word_counts is not None:
+            components["keyword"] = np.minimum(10, np.asarray(flagged_word_counts, dtype=float))
+        if user_locations is not None:
+            components["location"] = self.calculate_location_scores(user_locations, csv_path)
+        if total_positives is not None:
+            components["message"] = np.minimum(10, np.asarray(total_positives, dtype=float) + 0.5 * np.asarray(total_coded, dtype=float))
+        return components
+
+    def score_from_components(self, components):
+        # Same scale as total_score without the network signal; works on scalars or columns
+        return (sum(components[name] for name in COMPONENTS) * 100) / 20
 
+    @metrics.timed_function("function_seconds", function="total_scores")
+    def total_scores(self, post_counts, flagged_word_counts, user_locations, csv_path, total_positives, total_coded):
+        # Vectorized total_score over NumPy columns, one entry per user
+        return self.score_from_components(self.component_scores(
+            post_counts, flagged_word_counts, user_locations, csv_path, total_positives, total_coded
+        ))
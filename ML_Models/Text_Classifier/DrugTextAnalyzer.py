@@ -1,10 +1,21 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from typing import List, Dict, Any
-from langchain_core.prompts import PromptTemplate
-from langchain.output_parsers import StructuredOutputParser, ResponseSchema
-from langchain_ollama import ChatOllama
 from dotenv import load_dotenv
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from typing import Optional
+from ML_Models.Text_Classifier.result_cache import ResultCache
+from ML_Models.Text_Classifier.prefilter import LexiconPrefilter
+from ML_Models.Text_Classifier.tolerant_parser import RESULT_SCHEMA, normalize_label, parse_classification
+import metrics
+
+_FENCED_JSON = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
 
 @dataclass
 class AnalysisResult:
@@ -18,30 +29,83 @@ class DrugTextAnalyzer:
     Uses LangChain with Groq LLM for processing.
     """
 
-    def __init__(self, model_name: str = "wizardlm2", temperature: float = 0):
+    def __init__(
+        self,
+        model_name: str = "wizardlm2",
+        temperature: float = 0,
+        max_concurrency: int = 4,
+        call_timeout: float = 120,
+        llm: Optional[Any] = None,
+        cache: Optional[ResultCache] = None,
+        prefilter: Optional[LexiconPrefilter] = None,
+        max_batch_size: int = 8,
+        batch_token_budget: int = 1500,
+        output_mode: str = "structured",
+        parse_retries: int = 1
+    ):
         """
         Initialize the DrugTextAnalyzer with specified model parameters.
+
+        max_concurrency bounds how many LLM calls the concurrent methods keep
+        in flight, and call_timeout (seconds) applies to every single call.
+        Pass llm to swap ChatOllama for a stand-in such as FakeChatOllama.
+        Results are cached in memory unless a ResultCache (e.g. one backed by
+        SQLite) is passed in. With a prefilter, sentences matching no lexicon
+        term are classified negative without calling the LLM.
+        The batched methods pack up to max_batch_size sentences, and at most
+        batch_token_budget estimated input tokens, into one prompt.
+        output_mode="json" swaps the StructuredOutputParser format instructions
+        for a compact prompt and asks Ollama for schema-constrained JSON. In
+        either mode malformed answers are salvaged where possible, and an
+        answer with no usable label is re-requested up to parse_retries times.
         """
+        if output_mode not in ("structured", "json"):
+            raise ValueError(f"Unknown output_mode: {output_mode}")
         # Load environment variables
         load_dotenv()
 
-        # Initialize LLM
-        self.llm = ChatOllama(
-            model=model_name,
-            temperature=temperature,
-            max_tokens=None,
-            timeout=120,
-            max_retries=3
-        )
+        self.model_name = model_name
+        self.temperature = temperature
+        self.max_concurrency = max(1, max_concurrency)
+        self.call_timeout = call_timeout
+        self._executor = None
+        self.cache = cache if cache is not None else ResultCache()
+        self.prefilter = prefilter
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_token_budget = batch_token_budget
+        self.batch_size = self.max_batch_size
+        self._batch_size_lock = threading.Lock()
+        self.output_mode = output_mode
+        self.parse_retries = max(0, parse_retries)
+
+        # Initialize LLM; in json mode Ollama constrains decoding to the result schema
+        batch_llm = llm
+        if llm is None:
+            from langchain_ollama import ChatOllama
+            options = dict(model=model_name, temperature=temperature, max_tokens=None, timeout=call_timeout, max_retries=3)
+            if output_mode == "json":
+                llm = ChatOllama(format=RESULT_SCHEMA, **options)
+                batch_schema = {"type": "array", "items": {
+                    **RESULT_SCHEMA,
+                    "properties": {"index": {"type": "integer"}, **RESULT_SCHEMA["properties"]},
+                    "required": ["index"] + RESULT_SCHEMA["required"],
+                }}
+                batch_llm = ChatOllama(format=batch_schema, **options)
+            else:
+                llm = batch_llm = ChatOllama(**options)
+        self.llm = llm
+        self.batch_llm = batch_llm
 
         # Define response schemas
         self._setup_schemas()
         
-        # Create prompt template
+        # Create prompt templates
         self._setup_prompt_template()
+        self._setup_batch_prompt_template()
 
     def _setup_schemas(self) -> None:
         """Set up the response schemas for structured output parsing."""
+        from langchain.output_parsers import StructuredOutputParser, ResponseSchema
         self.response_schemas = [
             ResponseSchema(
                 name="classification",
@@ -60,6 +124,21 @@ class DrugTextAnalyzer:
 
     def _setup_prompt_template(self) -> None:
         """Set up the prompt template for text analysis."""
+        from langchain_core.prompts import PromptTemplate
+        if self.output_mode == "json":
+            # The schema travels in Ollama's format option, so the prompt only states the task
+            self.prompt = PromptTemplate(
+                input_variables=["user_input", "hints"],
+                template=(
+                    'Classify the text for drug-related content as "positive" (explicit drugs, paraphernalia, '
+                    'pricing or delivery), "negative" (unrelated) or "coded" (slang, emojis or cryptic references). '
+                    "Reply in JSON with classification, identified_slang (list) and decoded_terms (slang to meaning).\n"
+                    "Input text: {user_input}\n{hints}"
+                )
+            )
+            self._refresh_cache_fingerprint()
+            return
+
         template = """
         Analyze the following text for potential drug-related content. 
         
@@ -74,15 +153,154 @@ class DrugTextAnalyzer:
         - Coded: Uses slang, emojis, or cryptic language for potential drug references
         
         Input text: {user_input}
-        
+        {hints}
         {format_instructions}
         """
         
         self.prompt = PromptTemplate(
-            input_variables=["user_input"],
+            input_variables=["user_input", "hints"],
             partial_variables={"format_instructions": self.output_parser.get_format_instructions()},
             template=template
         )
+        self._refresh_cache_fingerprint()
+
+    def _setup_batch_prompt_template(self) -> None:
+        """Set up the prompt template that classifies several numbered texts at once."""
+        from langchain_core.prompts import PromptTemplate
+        fields = "\n".join(
+            f'        "{schema.name}": {schema.description}' for schema in self.response_schemas
+        )
+        template = """
+        Analyze each of the numbered texts below for potential drug-related content.
+        
+        Guidelines:
+        - Classify each text as one of: "positive" (explicit drug references), "negative" (unrelated to drugs), or "coded" (uses slang/cryptic language)
+        - Identify any drug-related slang terms, abbreviations, or emojis
+        - Provide decoded meanings for identified terms
+        - Judge every text on its own
+        
+        Classification criteria:
+        - Positive: Explicit references to drugs, paraphernalia, pricing, or delivery
+        - Negative: No drug-related content
+        - Coded: Uses slang, emojis, or cryptic language for potential drug references
+        
+        Texts:
+        {numbered_inputs}
+        
+        Return a markdown code snippet with a JSON array holding exactly one object per text, in the same order.
+        Each object has these keys:
+        "index": the number of the text in square brackets
+""" + fields.replace("{", "{{").replace("}", "}}") + """
+        """
+
+        self.batch_prompt = PromptTemplate(
+            input_variables=["numbered_inputs"],
+            template=template
+        )
+
+    def _refresh_cache_fingerprint(self) -> None:
+        """Invalidate cached results whenever the model, prompt or schemas change."""
+        parts = [self.model_name, str(self.temperature), self.output_mode, self.prompt.template]
+        parts += [f"{schema.name}:{schema.description}" for schema in self.response_schemas]
+        parts.append(self.output_parser.get_format_instructions())
+        if self.prefilter is not None:
+            parts.append(self.prefilter.version)
+        fingerprint = hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+        self.cache.set_fingerprint(fingerprint)
+
+    def _prefilter_hints(self, text: str) -> Optional[List[str]]:
+        """
+        Return lexicon terms found in text, or None when the prefilter rules
+        the text out. Without a prefilter every text is a candidate.
+        """
+        if self.prefilter is None:
+            return []
+        with metrics.timed("classifier_stage_seconds", stage="prefilter"):
+            hints = self.prefilter.match(text)
+        metrics.inc("classifier_prefilter_total", outcome="candidate" if hints else "filtered")
+        return hints if hints else None
+
+    def _format_prompt(self, text: str, hints: List[str]) -> str:
+        """Format the prompt, attaching prefilter matches as hints."""
+        hint_line = f"Lexicon matches (possible slang): {', '.join(hints)}" if hints else ""
+        with metrics.timed("classifier_stage_seconds", stage="prompt_format"):
+            return self.prompt.format(user_input=text, hints=hint_line)
+
+    def _cached(self, text: str) -> Optional[AnalysisResult]:
+        """Return a cached analysis for text, if there is one."""
+        with metrics.timed("classifier_stage_seconds", stage="cache_lookup"):
+            cached = self.cache.get(text)
+        metrics.inc("classifier_cache_total", outcome="miss" if cached is None else "hit")
+        return AnalysisResult(**cached) if cached is not None else None
+
+    def _strict_parse(self, content: str) -> Optional[Dict[str, Any]]:
+        """
+        The answer as complete JSON, fenced or bare, if it is well formed and
+        uses one of the three labels. StructuredOutputParser.parse is not used
+        here because it quietly closes truncated JSON.
+        """
+        fenced = _FENCED_JSON.search(content)
+        try:
+            parsed = json.loads(fenced.group(1) if fenced else content)
+        except ValueError:
+            return None
+        if (not isinstance(parsed, dict)
+                or parsed.get("classification") not in ("positive", "negative", "coded")
+                or not isinstance(parsed.get("identified_slang"), list)
+                or not isinstance(parsed.get("decoded_terms"), dict)):
+            return None
+        return parsed
+
+    def _to_result(self, content: str) -> Optional[AnalysisResult]:
+        """
+        Parse raw LLM output into an AnalysisResult. Output the strict parser
+        rejects goes through the tolerant parser; None means no usable label.
+        """
+        with metrics.timed("classifier_stage_seconds", stage="parse"):
+            parsed = self._strict_parse(content)
+            outcome = "strict"
+            if parsed is None:
+                parsed = parse_classification(content)
+                outcome = "tolerant" if parsed is not None else "unusable"
+        metrics.inc("classifier_parse_total", outcome=outcome, mode=self.output_mode)
+        if parsed is None:
+            metrics.inc("classifier_errors_total", stage="parse")
+            return None
+        return AnalysisResult(
+            classification=parsed["classification"],
+            identified_slang=parsed["identified_slang"],
+            decoded_terms=parsed["decoded_terms"]
+        )
+
+    def _call_llm(self, prompt: str, mode: str = "single"):
+        """Invoke the LLM, recording call latency, token counts and failures."""
+        llm = self.batch_llm if mode == "batch" else self.llm
+        try:
+            with metrics.timed("classifier_stage_seconds", stage=f"llm_{mode}"):
+                output = llm.invoke(prompt)
+        except Exception:
+            metrics.inc("classifier_errors_total", stage="llm")
+            raise
+        self._record_tokens(output, mode)
+        return output
+
+    @staticmethod
+    def _record_tokens(output, mode: str) -> None:
+        """Count prompt and completion tokens as reported by Ollama."""
+        metrics.inc("classifier_llm_calls_total", mode=mode)
+        metadata = getattr(output, "response_metadata", None) or {}
+        usage = getattr(output, "usage_metadata", None) or {}
+        prompt_tokens = metadata.get("prompt_eval_count", usage.get("input_tokens"))
+        completion_tokens = metadata.get("eval_count", usage.get("output_tokens"))
+        if prompt_tokens:
+            metrics.inc("classifier_llm_tokens_total", prompt_tokens, kind="prompt", mode=mode)
+        if completion_tokens:
+            metrics.inc("classifier_llm_tokens_total", completion_tokens, kind="completion", mode=mode)
+
+    @staticmethod
+    def _split_sentences(text: str) -> List[str]:
+        """Split text into sentences and filter empty ones."""
+        return [s.strip() for s in text.split('.') if s.strip()]
 
     def process_single_input(self, text: str) -> Optional[AnalysisResult]:
         """
@@ -91,23 +309,217 @@ class DrugTextAnalyzer:
         if not text or not text.strip():
             raise ValueError("Input text cannot be empty")
             
+        hints = self._prefilter_hints(text)
+        if hints is None:
+            return AnalysisResult(classification="negative", identified_slang=[], decoded_terms={})
+
+        cached = self._cached(text)
+        if cached is not None:
+            return cached
+
+        return self._invoke_single(text, hints)
+
+    def _invoke_single(self, text: str, hints: List[str]) -> Optional[AnalysisResult]:
+        """
+        Classify one text with its own LLM call and cache the result. The call
+        is repeated only when the answer has no usable label.
+        """
         try:
             # Format the prompt with the input text
-            formatted_prompt = self.prompt.format(user_input=text)
-            
-            # Get response from LLM
-            output = self.llm.invoke(formatted_prompt)
-            
-            # Parse the response
-            parsed = self.output_parser.parse(output.content)
-            
-            # Convert to AnalysisResult
-            return AnalysisResult(
-                classification=parsed["classification"],
-                identified_slang=parsed["identified_slang"],
-                decoded_terms=parsed["decoded_terms"]
+            formatted_prompt = self._format_prompt(text, hints)
+
+            for attempt in range(self.parse_retries + 1):
+                if attempt:
+                    metrics.inc("classifier_parse_retries_total", mode=self.output_mode)
+                # Get response from LLM, then parse it into an AnalysisResult
+                output = self._call_llm(formatted_prompt)
+                result = self._to_result(output.content)
+                if result is not None:
+                    self.cache.put(text, asdict(result))
+                    return result
+            print("Error processing text: no usable classification in the LLM output")
+            return None
+
+        except Exception as e:
+            print(f"Error processing text: {str(e)}")
+            return None
+
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """Rough token estimate (about four characters per token)."""
+        return len(text) // 4 + 1
+
+    def _pack_batches(self, items: List[tuple]) -> List[List[tuple]]:
+        """Group (index, text, hints) items into batches bounded by size and token budget."""
+        batches, current, tokens = [], [], 0
+        batch_size = self.batch_size
+        for item in items:
+            cost = self._estimate_tokens(item[1]) + 8
+            if current and (len(current) >= batch_size or tokens + cost > self.batch_token_budget):
+                batches.append(current)
+                current, tokens = [], 0
+            current.append(item)
+            tokens += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    def _parse_batch(self, content: str, count: int) -> List[Optional[AnalysisResult]]:
+        """
+        Parse a batched answer into one result per text. Items that are missing
+        or fail schema validation come back as None.
+        """
+        match = re.search(r"\[.*\]", content, re.DOTALL)
+        if not match:
+            raise ValueError("No JSON array in batched response")
+        items = json.loads(match.group(0))
+
+        results: List[Optional[AnalysisResult]] = [None] * count
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            try:
+                index = int(item.get("index", position + 1)) - 1
+            except (TypeError, ValueError):
+                continue
+            if not 0 <= index < count or results[index] is not None:
+                continue
+            label = normalize_label(item.get("classification"))
+            if label is None:
+                continue
+            slang = item.get("identified_slang", [])
+            decoded = item.get("decoded_terms", {})
+            if not isinstance(slang, list) or not isinstance(decoded, dict):
+                continue
+            results[index] = AnalysisResult(
+                classification=label,
+                identified_slang=slang,
+                decoded_terms=decoded
             )
-            
+        return results
+
+    def _adapt_batch_size(self, grow: bool) -> None:
+        # Batches run on several worker threads; the read-modify-write must not interleave
+        with self._batch_size_lock:
+            if grow:
+                self.batch_size = min(self.max_batch_size, self.batch_size + 1)
+            else:
+                self.batch_size = max(1, self.batch_size // 2)
+
+    def _process_prompt_batch(self, batch: List[tuple]) -> List[Optional[AnalysisResult]]:
+        """
+        Classify one packed batch with a single LLM call. The batch size adapts:
+        it grows after a clean answer and halves after an unusable one. Items
+        the batched answer does not cover fall back to per-sentence calls.
+        """
+        results: List[Optional[AnalysisResult]] = [None] * len(batch)
+        if len(batch) > 1:
+            numbered = "\n".join(
+                f"[{position + 1}] {text}" + (f" (lexicon matches: {', '.join(hints)})" if hints else "")
+                for position, (_, text, hints) in enumerate(batch)
+            )
+            try:
+                output = self._call_llm(self.batch_prompt.format(numbered_inputs=numbered), mode="batch")
+                with metrics.timed("classifier_stage_seconds", stage="batch_parse"):
+                    results = self._parse_batch(output.content, len(batch))
+                if all(results):
+                    self._adapt_batch_size(grow=True)
+            except Exception as e:
+                print(f"Error processing batch, falling back to single calls: {str(e)}")
+                metrics.inc("classifier_errors_total", stage="batch")
+                self._adapt_batch_size(grow=False)
+
+        retried = sum(1 for result in results if result is None)
+        if len(batch) > 1 and retried:
+            metrics.inc("classifier_batch_retries_total", retried)
+
+        for position, (_, text, hints) in enumerate(batch):
+            if results[position] is None:
+                results[position] = self._invoke_single(text, hints)
+            else:
+                self.cache.put(text, asdict(results[position]))
+        return results
+
+    def classify_batched(self, texts: List[str]) -> List[Optional[AnalysisResult]]:
+        """
+        Classify texts by packing them into shared prompts, so the instructions
+        are sent once per batch instead of once per text. Returns one entry per
+        input text, None where classification failed.
+        """
+        results: List[Optional[AnalysisResult]] = [None] * len(texts)
+        pending = []
+        for index, text in enumerate(texts):
+            if not text or not text.strip():
+                continue
+            hints = self._prefilter_hints(text)
+            if hints is None:
+                results[index] = AnalysisResult(classification="negative", identified_slang=[], decoded_terms={})
+                continue
+            cached = self._cached(text)
+            if cached is not None:
+                results[index] = cached
+                continue
+            pending.append((index, text, hints))
+
+        batches = self._pack_batches(pending)
+        for batch, batch_results in zip(batches, self._get_executor().map(self._process_prompt_batch, batches)):
+            for (index, _, _), result in zip(batch, batch_results):
+                results[index] = result
+        return results
+
+    def batch_process_batched(self, texts: List[str]) -> List[AnalysisResult]:
+        """
+        Batched-prompt variant of batch_process. Results keep the input order;
+        failed items are dropped.
+        """
+        return [result for result in self.classify_batched(texts) if result]
+
+    def process_input_batched(self, text: str) -> List[AnalysisResult]:
+        """
+        Batched-prompt variant of process_input.
+        """
+        if not text or not text.strip():
+            return []
+        return self.batch_process_batched(self._split_sentences(text))
+
+    async def aprocess_single_input(self, text: str) -> Optional[AnalysisResult]:
+        """
+        Async counterpart of process_single_input, bounded by call_timeout.
+        """
+        if not text or not text.strip():
+            raise ValueError("Input text cannot be empty")
+
+        hints = self._prefilter_hints(text)
+        if hints is None:
+            return AnalysisResult(classification="negative", identified_slang=[], decoded_terms={})
+
+        # The cache may be SQLite (a commit per put), so it is used from a worker thread, not the event loop
+        cached = await asyncio.to_thread(self._cached, text)
+        if cached is not None:
+            return cached
+
+        try:
+            formatted_prompt = self._format_prompt(text, hints)
+            for attempt in range(self.parse_retries + 1):
+                if attempt:
+                    metrics.inc("classifier_parse_retries_total", mode=self.output_mode)
+                with metrics.timed("classifier_stage_seconds", stage="llm_async"):
+                    output = await asyncio.wait_for(
+                        self.llm.ainvoke(formatted_prompt),
+                        timeout=self.call_timeout
+                    )
+                self._record_tokens(output, "async")
+                result = self._to_result(output.content)
+                if result is not None:
+                    await asyncio.to_thread(self.cache.put, text, asdict(result))
+                    return result
+            print("Error processing text: no usable classification in the LLM output")
+            return None
+
+        except asyncio.TimeoutError:
+            metrics.inc("classifier_errors_total", stage="timeout")
+            print(f"Error processing text: timed out after {self.call_timeout}s")
+            return None
         except Exception as e:
             print(f"Error processing text: {str(e)}")
             return None
@@ -119,8 +531,7 @@ class DrugTextAnalyzer:
         if not text or not text.strip():
             return []
             
-        # Split text into sentences and filter empty ones
-        sentences = [s.strip() for s in text.split('.') if s.strip()]
+        sentences = self._split_sentences(text)
         
         results = []
         for sentence in sentences:
@@ -139,4 +550,93 @@ class DrugTextAnalyzer:
             result = self.process_single_input(text)
             if result:
                 results.append(result)
-        return results
\ No newline at end of file
+        return results
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Lazily create the worker pool shared by the threaded methods."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency,
+                thread_name_prefix="drug-text-analyzer"
+            )
+        return self._executor
+
+    def _safe_process(self, text: str) -> Optional[AnalysisResult]:
+        """Run process_single_input so that one bad item cannot fail the batch."""
+        try:
+            return self.process_single_input(text)
+        except Exception as e:
+            print(f"Error processing text: {str(e)}")
+            return None
+
+    def batch_process_threaded(self, texts: List[str]) -> List[AnalysisResult]:
+        """
+        Process multiple texts on a thread pool of max_concurrency workers.
+        Results keep the input order; failed items, and items not finished
+        within call_timeout of the previous one, are dropped.
+        """
+        # Each task runs in a copy of the caller's context, so a sampled request trace sees its stages
+        executor = self._get_executor()
+        futures = [executor.submit(contextvars.copy_context().run, self._safe_process, text) for text in texts]
+        results = [self._result_or_none(future) for future in futures]
+        return [result for result in results if result]
+
+    def _result_or_none(self, future) -> Optional[AnalysisResult]:
+        try:
+            return future.result(timeout=self.call_timeout)
+        except FutureTimeoutError:
+            # A call already running keeps its worker until the LLM client gives up; a queued one is dropped
+            future.cancel()
+            print(f"Error processing text: timed out after {self.call_timeout}s")
+            return None
+
+    def process_input_threaded(self, text: str) -> List[AnalysisResult]:
+        """
+        Thread-pool variant of process_input.
+        """
+        if not text or not text.strip():
+            return []
+        return self.batch_process_threaded(self._split_sentences(text))
+
+    async def abatch_process(self, texts: List[str]) -> List[AnalysisResult]:
+        """
+        Process multiple texts concurrently, with at most max_concurrency
+        LLM calls in flight. Results keep the input order; failed items are dropped.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(text: str) -> Optional[AnalysisResult]:
+            async with semaphore:
+                try:
+                    return await self.aprocess_single_input(text)
+                except Exception as e:
+                    print(f"Error processing text: {str(e)}")
+                    return None
+
+        results = await asyncio.gather(*(run(text) for text in texts))
+        return [result for result in results if result]
+
+    async def aprocess_input(self, text: str) -> List[AnalysisResult]:
+        """
+        Async variant of process_input.
+        """
+        if not text or not text.strip():
+            return []
+        return await self.abatch_process(self._split_sentences(text))
+
+    def warmup(self, probe: str = "hello") -> Dict[str, float]:
+        """
+        Prime the analyzer before real traffic: format both prompts and send
+        one probe to the LLM so Ollama loads the model weights. The probe
+        bypasses the cache and prefilter. Returns the time of each step in seconds.
+        """
+        timings = {}
+        start = time.perf_counter()
+        self._format_prompt(probe, [])
+        self.batch_prompt.format(numbered_inputs=f"[1] {probe}")
+        timings["prompt_format"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        self._call_llm(self._format_prompt(probe, []), mode="warmup")
+        timings["llm_first_call"] = time.perf_counter() - start
+        return timings
@@ -0,0 +1,318 @@
+"""
+Offline classification of the messages backlog, so a lexicon or model change
+can be applied to chat that is already stored.
+
+Messages are streamed in _id order with a projection and a batched cursor,
+decrypted like the backend does (see message_crypto), and classified in
+chunks with DrugTextAnalyzer.classify_batched across its worker pool. Each
+message counts like a live one in the message controller: its first result
+adds the decoded terms to the sender's flaggedWords and bumps positiveCount
+(positive) or negativeCount (coded). A chunk's counts are written to flags
+with one bulk_write, the senders' updatedAt is bumped with one more (the
+risk scorer's poller finds flag changes through it), then the job's
+checkpoint in backlog_checkpoints moves to the chunk's last _id.
+
+A job covers the messages that existed when it started; newer ones are
+classified live. Flag updates and the checkpoint's counts carry the job's
+last applied _id, so a replayed chunk is never counted twice. --reset-flags
+empties flaggedWords and the counts before a new job starts, which makes a
+full run replace the live counts instead of adding to them (meant for
+reclassifying after a model change). The keyword monitor's all-time counters
+are rebuilt from flags after a reset and when a run ends, since these writes
+bypass KeywordMonitor.record().
+
+    python -m ML_Models.Text_Classifier.backlog_classifier --job relabel-v2 --reset-flags --workers 8
+    python -m ML_Models.Text_Classifier.backlog_classifier --dry-run --limit 2000
+"""
+import argparse
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from Dashboard.Keyword_Monitoring.keywords import KeywordMonitor
+from ML_Models.Text_Classifier.message_crypto import decrypt_text
+
+CHECKPOINTS = "backlog_checkpoints"
+KEYWORD_COUNTS = "keyword_counts"
+
+
+def _empty_tally():
+    return {"words": [], "positive": 0, "coded": 0}
+
+
+class BacklogClassifier:
+    """
+    Resumable classification job over the messages collection. Progress is
+    kept per job name, so rerunning with the same name resumes and a new
+    name starts over. With dry_run nothing is written, not even the checkpoint.
+    """
+
+    def __init__(self, db, analyzer, job: str = "backlog", chunk_size: int = 500,
+                 reset_flags: bool = False, dry_run: bool = False,
+                 keyword_monitor: Optional[KeywordMonitor] = None):
+        self.db = db
+        self.analyzer = analyzer
+        self.job = job
+        self.chunk_size = chunk_size
+        self.reset_flags = reset_flags
+        self.dry_run = dry_run
+        self.messages = db["messages"]
+        self.users = db["users"]
+        self.flags = db["flags"]
+        self.checkpoints = db[CHECKPOINTS]
+        self.keyword_monitor = keyword_monitor or KeywordMonitor(self.flags, db[KEYWORD_COUNTS])
+
+    def _start(self) -> Dict[str, Any]:
+        """Load the job's checkpoint, or create one bounded by the newest message now."""
+        state = self.checkpoints.find_one({"_id": self.job})
+        if state is not None:
+            # Replays after a crash must cut the same chunks for the per-flag markers to line up
+            self.chunk_size = state.get("chunkSize", self.chunk_size)
+            return state
+        if self.reset_flags and not self.dry_run:
+            self.flags.update_many({}, {"$set": {"flaggedWords": [], "positiveCount": 0, "negativeCount": 0}})
+            self.users.update_many({"flagged": {"$ne": None}}, {"$set": {"updatedAt": datetime.utcnow()}})
+            self.keyword_monitor.reseed()
+        # Bounded after the reset, so messages classified live before it are not left out of both counts
+        newest = self.messages.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        state = {
+            "_id": self.job,
+            "lastId": None,
+            "endId": newest["_id"] if newest else None,
+            "chunkSize": self.chunk_size,
+            "processed": 0,
+            "positive": 0,
+            "coded": 0,
+            "startedAt": datetime.utcnow(),
+            "finishedAt": None,
+        }
+        if not self.dry_run:
+            self.checkpoints.insert_one(state)
+        return state
+
+    def _query(self, state) -> Dict[str, Any]:
+        bounds = {}
+        if state["lastId"] is not None:
+            bounds["$gt"] = state["lastId"]
+        if state["endId"] is not None:
+            bounds["$lte"] = state["endId"]
+        return {"_id": bounds} if bounds else {}
+
+    def classify_chunk(self, messages: List[Dict[str, Any]]) -> Dict[Any, Dict[str, Any]]:
+        """Per-sender tally of one chunk: decoded terms, positive and coded message counts."""
+        sentences, owners = [], []
+        for position, message in enumerate(messages):
+            text = decrypt_text(message.get("message"))
+            if not isinstance(text, str):
+                continue
+            for sentence in self.analyzer._split_sentences(text):
+                sentences.append(sentence)
+                owners.append(position)
+
+        # The first usable result of each message stands for it, as in the message controller
+        first = {}
+        for owner, result in zip(owners, self.analyzer.classify_batched(sentences)):
+            if result is not None and owner not in first:
+                first[owner] = result
+
+        tallies = defaultdict(_empty_tally)
+        for position, result in first.items():
+            sender = messages[position].get("senderId")
+            if sender is None:
+                continue
+            tally = tallies[sender]
+            tally["words"].extend(result.decoded_terms.keys())
+            if result.classification == "positive":
+                tally["positive"] += 1
+            elif result.classification == "coded":
+                tally["coded"] += 1
+        return {sender: tally for sender, tally in tallies.items() if tally["words"] or tally["positive"] or tally["coded"]}
+
+    def write_flags(self, tallies: Dict[Any, Dict[str, Any]], chunk_last_id: ObjectId) -> int:
+        """Add one chunk's tallies to flags. Returns the number of flags documents written."""
+        if not tallies:
+            return 0
+        marker = "backlogApplied." + self.job.replace(".", "_").replace("$", "_")
+        linked = {user["_id"]: user.get("flagged") for user in self.users.find({"_id": {"$in": list(tallies)}}, {"flagged": 1})}
+
+        updated_at = datetime.utcnow()
+        flag_requests, user_requests = [], []
+        for sender, tally in tallies.items():
+            if sender not in linked:
+                continue
+            flag_id = linked[sender]
+            if flag_id is None:
+                # First flag for this user, created and linked the way the backend does it
+                flag_id = ObjectId()
+                flag_requests.append(UpdateOne({"_id": flag_id}, {"$setOnInsert": {
+                    "flaggedWords": tally["words"],
+                    "positiveCount": tally["positive"],
+                    "negativeCount": tally["coded"],
+                    marker: chunk_last_id,
+                }}, upsert=True))
+                user_requests.append(UpdateOne({"_id": sender, "flagged": None}, {"$set": {"flagged": flag_id}}))
+                user_requests.append(UpdateOne({"_id": sender}, {"$set": {"updatedAt": updated_at}}))
+                continue
+            flag_requests.append(UpdateOne(
+                # Skipped when this chunk was already applied before a crash
+                {"_id": flag_id, "$or": [{marker: {"$exists": False}}, {marker: {"$lt": chunk_last_id}}]},
+                {
+                    "$push": {"flaggedWords": {"$each": tally["words"]}},
+                    "$inc": {"positiveCount": tally["positive"], "negativeCount": tally["coded"]},
+                    "$set": {marker: chunk_last_id},
+                }
+            ))
+            user_requests.append(UpdateOne({"_id": sender}, {"$set": {"updatedAt": updated_at}}))
+        if flag_requests:
+            self.flags.bulk_write(flag_requests, ordered=False)
+        if user_requests:
+            self.users.bulk_write(user_requests, ordered=False)
+        return len(flag_requests)
+
+    def run(self, limit: Optional[int] = None, report_interval: float = 10.0,
+            stop: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """
+        Classify messages from the checkpoint to the job's end, at most limit
+        of them. Prints progress every report_interval seconds and returns the final stats.
+        """
+        state = self._start()
+        query = self._query(state)
+        remaining = self.messages.count_documents(query)
+        total = min(remaining, limit) if limit else remaining
+        cursor = self.messages.find(query, {"senderId": 1, "message": 1}).sort("_id", 1).batch_size(self.chunk_size)
+        if limit:
+            cursor = cursor.limit(limit)
+
+        start = last_report = time.perf_counter()
+        done = flags_written = 0
+        chunk = []
+
+        def process(chunk):
+            nonlocal done, flags_written
+            tallies = self.classify_chunk(chunk)
+            last_id = chunk[-1]["_id"]
+            counts = {
+                "processed": len(chunk),
+                "positive": sum(tally["positive"] for tally in tallies.values()),
+                "coded": sum(tally["coded"] for tally in tallies.values()),
+            }
+            done += len(chunk)
+            if self.dry_run:
+                state["lastId"] = last_id
+                for name, count in counts.items():
+                    state[name] += count
+                return
+            flags_written += self.write_flags(tallies, last_id)
+            # Guarded by lastId like the flag markers, so a chunk already counted is not counted again
+            updated = self.checkpoints.find_one_and_update(
+                {"_id": self.job, "$or": [{"lastId": None}, {"lastId": {"$lt": last_id}}]},
+                {"$inc": counts, "$set": {"lastId": last_id, "updatedAt": datetime.utcnow()}},
+                return_document=ReturnDocument.AFTER
+            )
+            state.update(updated or self.checkpoints.find_one({"_id": self.job}))
+
+        for message in cursor:
+            chunk.append(message)
+            if len(chunk) >= self.chunk_size:
+                process(chunk)
+                chunk = []
+                if time.perf_counter() - last_report >= report_interval:
+                    last_report = time.perf_counter()
+                    self._report(done, total, last_report - start, state)
+                if stop is not None and stop.is_set():
+                    break
+        else:
+            if chunk:
+                process(chunk)
+            if not self.dry_run and not limit:
+                self.checkpoints.update_one({"_id": self.job}, {"$set": {"finishedAt": datetime.utcnow()}})
+        if flags_written:
+            self.keyword_monitor.reseed()
+
+        elapsed = time.perf_counter() - start
+        self._report(done, total, elapsed, state)
+        return {
+            "job": self.job,
+            "processed": done,
+            "total_processed": state["processed"],
+            "positive": state["positive"],
+            "coded": state["coded"],
+            "flags_written": flags_written,
+            "elapsed_seconds": elapsed,
+            "messages_per_second": done / elapsed if elapsed else 0.0,
+            "dry_run": self.dry_run,
+        }
+
+    def _report(self, done, total, elapsed, state):
+        rate = done / elapsed if elapsed else 0.0
+        eta = f"{(total - done) / rate:.0f}s" if rate else ("0s" if done >= total else "unknown")
+        print(f"[{self.job}] {done}/{total} messages ({rate:.1f}/s, ETA {eta}), "
+              f"{state['positive']} positive, {state['coded']} coded so far")
+
+
+def build_analyzer(workers: int, batch_size: int, dry_run: bool, fake_latency: float, db=None):
+    """A DrugTextAnalyzer configured from the same environment variables as the service."""
+    from ML_Models.Text_Classifier.DrugTextAnalyzer import DrugTextAnalyzer
+    from ML_Models.Text_Classifier.prefilter import LexiconPrefilter
+    from ML_Models.Text_Classifier.result_cache import ResultCache
+
+    output_mode = os.getenv("CLASSIFIER_OUTPUT_MODE", "structured")
+    llm = None
+    if dry_run or os.getenv("CLASSIFIER_LLM") == "fake":
+        from ML_Models.Text_Classifier.fake_llm import FakeChatOllama
+        from ML_Models.Text_Classifier.tolerant_parser import RESULT_SCHEMA
+        llm = FakeChatOllama(latency=fake_latency, format=RESULT_SCHEMA if output_mode == "json" else None)
+
+    prefilter = None
+    if os.getenv("CLASSIFIER_PREFILTER", "1") == "1":
+        prefilter = LexiconPrefilter.from_file()
+        if db is not None:
+            prefilter.seed_from_flags(db["flags"])
+
+    return DrugTextAnalyzer(
+        max_concurrency=workers,
+        llm=llm,
+        # Fake answers stay in memory so they never reach the shared on-disk cache
+        cache=ResultCache() if llm is not None else ResultCache(path=os.getenv("CLASSIFIER_CACHE_PATH", "ML_Models/Text_Classifier/Data/result_cache.sqlite3")),
+        prefilter=prefilter,
+        max_batch_size=batch_size,
+        output_mode=output_mode
+    )
+
+
+def main():
+    from database import get_db
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--job", default="backlog", help="checkpoint name; reuse it to resume")
+    parser.add_argument("--workers", type=int, default=4, help="LLM calls in flight")
+    parser.add_argument("--batch-size", type=int, default=8, help="sentences per LLM prompt (1 disables packing)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="messages per checkpoint")
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many messages")
+    parser.add_argument("--reset-flags", action="store_true", help="clear flag words and counts before a new job")
+    parser.add_argument("--dry-run", action="store_true", help="use the fake LLM and write nothing")
+    parser.add_argument("--fake-latency", type=float, default=0.05)
+    parser.add_argument("--report-interval", type=float, default=10.0)
+    args = parser.parse_args()
+
+    db = get_db()
+    analyzer = build_analyzer(args.workers, args.batch_size, args.dry_run, args.fake_latency, db)
+    job = BacklogClassifier(db, analyzer, args.job, args.chunk_size, args.reset_flags, args.dry_run)
+    try:
+        stats = job.run(limit=args.limit, report_interval=args.report_interval)
+    except KeyboardInterrupt:
+        print(f"Interrupted; rerun with --job {args.job} to resume from the last checkpoint")
+        return
+    print(f"Classified {stats['processed']} messages in {stats['elapsed_seconds']:.1f}s "
+          f"({stats['messages_per_second']:.1f}/s): {stats['positive']} positive, {stats['coded']} coded, "
+          f"{stats['flags_written']} flags updated{' (dry run)' if stats['dry_run'] else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+# Terms the fake model "recognises", mapped to their decoded meaning
+FAKE_LEXICON = {
+    "weed": "cannabis",
+    "420": "cannabis",
+    "snow": "cocaine",
+    "molly": "MDMA",
+    "ice": "methamphetamine",
+    "plug": "drug dealer",
+    "🍃": "cannabis",
+    "❄️": "cocaine",
+    "💊": "pills",
+}
+
+# Words that make the fake model answer "positive" instead of "coded"
+EXPLICIT_TERMS = ("cocaine", "heroin", "meth", "mdma", "cannabis", "drugs")
+
+
+@dataclass
+class FakeMessage:
+    content: str
+    response_metadata: Dict[str, int] = field(default_factory=dict)
+
+
+class FakeChatOllama:
+    """
+    Deterministic offline stand-in for ChatOllama.
+    Answers in the fenced JSON format expected by StructuredOutputParser after
+    sleeping for a configurable latency, so throughput can be measured without Ollama.
+
+    With format set (like ChatOllama's format option) it answers in bare JSON.
+    prompt_token_latency and token_latency add time per prompt and output
+    token, as Ollama's prompt evaluation and generation do. malformed_rate is
+    the share of free-form answers cut off partway through; schema-constrained
+    answers are always complete.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        jitter: float = 0.0,
+        seed: int = 0,
+        timeout: Optional[float] = None,
+        format: Optional[Any] = None,
+        prompt_token_latency: float = 0.0,
+        token_latency: float = 0.0,
+        malformed_rate: float = 0.0
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.timeout = timeout
+        self.format = format
+        self.prompt_token_latency = prompt_token_latency
+        self.token_latency = token_latency
+        self.malformed_rate = malformed_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    def _delay(self, message: Optional[FakeMessage] = None) -> float:
+        delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        if message is not None:
+            delay += (message.response_metadata["prompt_eval_count"] * self.prompt_token_latency
+                      + message.response_metadata["eval_count"] * self.token_latency)
+        return max(0.0, delay)
+
+    @staticmethod
+    def _extract_input(prompt: str) -> str:
+        match = re.search(r"Input text:(.*)", str(prompt))
+        return match.group(1).strip() if match else str(prompt)
+
+    @staticmethod
+    def _classify(text: str) -> Dict:
+        lowered = text.lower()
+
+        decoded = {term: meaning for term, meaning in FAKE_LEXICON.items() if term in lowered}
+        if any(term in lowered for term in EXPLICIT_TERMS):
+            classification = "positive"
+        elif decoded:
+            classification = "coded"
+        else:
+            classification = "negative"
+
+        return {
+            "classification": classification,
+            "identified_slang": list(decoded),
+            "decoded_terms": decoded,
+        }
+
+    def _answer(self, prompt: str) -> FakeMessage:
+        self.calls += 1
+        prompt = str(prompt)
+        numbered = re.findall(r"^\s*\[(\d+)\] (.*)$", prompt, re.MULTILINE)
+        if "Texts:" in prompt and numbered:
+            # Batched prompt: one object per numbered text
+            payload = [{"index": int(index), **self._classify(text)} for index, text in numbered]
+        else:
+            payload = self._classify(self._extract_input(prompt))
+        content = json.dumps(payload, ensure_ascii=False)
+        if self.format is None:
+            content = f"```json\n{content}\n```"
+            if self._random.random() < self.malformed_rate:
+                content = content[:self._random.randint(len(content) // 4, len(content) - 1)]
+        return FakeMessage(
+            content=content,
+            response_metadata={
+                "prompt_eval_count": len(str(prompt)) // 4,
+                "eval_count": len(content) // 4,
+            },
+        )
+
+    def invoke(self, prompt) -> FakeMessage:
+        message = self._answer(prompt)
+        delay = self._delay(message)
+        if self.timeout is not None and delay > self.timeout:
+            time.sleep(self.timeout)
+            raise TimeoutError(f"Fake LLM call exceeded {self.timeout}s")
+        time.sleep(delay)
+        return message
+
+    async def ainvoke(self, prompt) -> FakeMessage:
+        message = self._answer(prompt)
+        await asyncio.sleep(self._delay(message))
+        return message
@@ -0,0 +1,164 @@
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+class QueueFullError(Exception):
+    """Raised when the queue is at max_depth and a job has to be shed."""
+
+
+@dataclass
+class ClassificationJob:
+    id: str
+    text: str
+    status: str = "queued"  # queued, running, done, failed
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[List[Any]] = None
+    error: Optional[str] = None
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"job_id": self.id, "status": self.status}
+        if self.status == "done":
+            data["classification"] = self.result
+        if self.error:
+            data["error"] = self.error
+        if self.started_at is not None:
+            data["queue_wait"] = self.started_at - self.submitted_at
+        if self.finished_at is not None:
+            data["service_time"] = self.finished_at - self.started_at
+        return data
+
+
+def _summary(samples) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0, "avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "avg": sum(ordered) / len(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+    }
+
+
+class ClassificationQueue:
+    """
+    In-process job queue in front of DrugTextAnalyzer. A fixed pool of worker
+    threads drains a bounded queue, so a burst of messages cannot tie up the
+    web server; once max_depth jobs are waiting, submit() sheds load.
+    With a MicroBatcher, sentences from jobs running at the same time share
+    batched prompts. on_result, if given, is called with each finished job.
+    """
+
+    def __init__(self, analyzer, workers: int = 2, max_depth: int = 100, result_ttl: float = 600, batcher=None, on_result=None):
+        self.analyzer = analyzer
+        self.batcher = batcher
+        self.on_result = on_result
+        self.max_depth = max_depth
+        self.result_ttl = result_ttl
+
+        self._queue = queue.Queue(maxsize=max_depth)
+        self._jobs: Dict[str, ClassificationJob] = {}
+        self._lock = threading.Lock()
+        self._wait_times = deque(maxlen=1000)
+        self._service_times = deque(maxlen=1000)
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+        self._workers = [
+            threading.Thread(target=self._work, name=f"classifier-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, text: str) -> ClassificationJob:
+        """Queue text for classification and return its job immediately."""
+        job = ClassificationJob(id=uuid.uuid4().hex, text=text)
+        self._expire_finished()
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+                self.rejected += 1
+            raise QueueFullError(f"Classification queue is full ({self.max_depth} jobs waiting)")
+        with self._lock:
+            self.submitted += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[ClassificationJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: float) -> Optional[ClassificationJob]:
+        """Long-poll: block up to timeout seconds for the job to finish."""
+        job = self.get(job_id)
+        if job is not None and timeout > 0:
+            job.done.wait(timeout)
+        return job
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            job.started_at = time.time()
+            job.status = "running"
+            try:
+                if self.batcher is not None:
+                    job.result = self.batcher.process_input(job.text)
+                else:
+                    job.result = self.analyzer.process_input_threaded(job.text)
+                job.status = "done"
+                if self.on_result is not None:
+                    self.on_result(job)
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+            job.finished_at = time.time()
+
+            with self._lock:
+                self._wait_times.append(job.started_at - job.submitted_at)
+                self._service_times.append(job.finished_at - job.started_at)
+                if job.status == "done":
+                    self.completed += 1
+                else:
+                    self.failed += 1
+            job.done.set()
+            self._queue.task_done()
+
+    def _expire_finished(self) -> None:
+        """Forget finished jobs nobody collected within result_ttl."""
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_depth": self.max_depth,
+                "workers": len(self._workers),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "queue_wait_seconds": _summary(self._wait_times),
+                "service_time_seconds": _summary(self._service_times),
+            }
@@ -0,0 +1,64 @@
+"""
+Python side of Social_Media_App/backend/utils/encryption.js. The backend
+stores messages as "ENC:" + CryptoJS.AES.encrypt(text, passphrase), which is
+OpenSSL's salted format: base64("Salted__" + 8-byte salt + ciphertext), with
+the AES-256-CBC key and IV derived from the passphrase by EVP_BytesToKey
+(one MD5 round) and PKCS#7 padding.
+
+Needs the cryptography package (pip install cryptography), imported on first use.
+"""
+import base64
+import hashlib
+import os
+
+ENCRYPTION_PREFIX = "ENC:"
+# Same default as encryption.js; set MESSAGE_ENCRYPTION_KEY when the backend's key changes
+ENCRYPTION_KEY = os.getenv("MESSAGE_ENCRYPTION_KEY", "8d855edef453ed6d7ee03d096de91d88345c604347da8f7fd81ed6d4b7b0009b")
+_SALTED = b"Salted__"
+
+
+def _derive(passphrase: bytes, salt: bytes):
+    """EVP_BytesToKey with MD5: a 32-byte key and a 16-byte IV."""
+    derived, block = b"", b""
+    while len(derived) < 48:
+        block = hashlib.md5(block + passphrase + salt).digest()
+        derived += block
+    return derived[:32], derived[32:48]
+
+
+def _cipher(passphrase: str, salt: bytes):
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    key, iv = _derive(passphrase.encode("utf-8"), salt)
+    return Cipher(algorithms.AES(key), modes.CBC(iv))
+
+
+def encrypt_text(text: str, passphrase: str = ENCRYPTION_KEY) -> str:
+    """encryptText(): the "ENC:"-prefixed form the backend stores."""
+    from cryptography.hazmat.primitives import padding
+    salt = os.urandom(8)
+    padder = padding.PKCS7(128).padder()
+    padded = padder.update(text.encode("utf-8")) + padder.finalize()
+    encryptor = _cipher(passphrase, salt).encryptor()
+    payload = _SALTED + salt + encryptor.update(padded) + encryptor.finalize()
+    return ENCRYPTION_PREFIX + base64.b64encode(payload).decode("ascii")
+
+
+def decrypt_text(text, passphrase: str = ENCRYPTION_KEY):
+    """
+    decryptText(): plain text and anything that does not decrypt to valid
+    UTF-8 come back unchanged, as they do in the backend.
+    """
+    if not isinstance(text, str) or not text.startswith(ENCRYPTION_PREFIX):
+        return text
+    from cryptography.hazmat.primitives import padding
+    try:
+        payload = base64.b64decode(text[len(ENCRYPTION_PREFIX):], validate=True)
+        if not payload.startswith(_SALTED) or len(payload) < 32 or (len(payload) - 16) % 16:
+            return text
+        decryptor = _cipher(passphrase, payload[8:16]).decryptor()
+        padded = decryptor.update(payload[16:]) + decryptor.finalize()
+        unpadder = padding.PKCS7(128).unpadder()
+        decrypted = (unpadder.update(padded) + unpadder.finalize()).decode("utf-8")
+    except ValueError:
+        return text
+    return decrypted or text
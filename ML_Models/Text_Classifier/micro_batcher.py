@@ -0,0 +1,86 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List
+
+
+class MicroBatcher:
+    """
+    Coalesces sentences from concurrent callers into shared batched prompts.
+    A collector thread waits up to max_wait seconds for more sentences after
+    the first one arrives, then hands everything gathered to one of
+    max_flushes flush workers, which classifies it with
+    DrugTextAnalyzer.classify_batched and resolves each caller's future.
+    While every flush worker is busy the collector waits, so sentences
+    queue up and the next flush coalesces more of them.
+    """
+
+    def __init__(self, analyzer, max_wait: float = 0.02, max_items: int = 64, max_flushes: int = None):
+        self.analyzer = analyzer
+        self.max_wait = max_wait
+        self.max_items = max_items
+        self.max_flushes = max_flushes or analyzer.max_concurrency
+        self.flushes = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        # Separate from the analyzer's pool, which classify_batched itself fans out on
+        self._flush_slots = threading.Semaphore(self.max_flushes)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_flushes, thread_name_prefix="classifier-flush")
+        self._thread = threading.Thread(target=self._run, name="classifier-micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, sentence: str) -> Future:
+        future = Future()
+        self._queue.put((sentence, future))
+        return future
+
+    def process_input(self, text: str) -> List:
+        """Drop-in for DrugTextAnalyzer.process_input that shares prompts across callers."""
+        if not text or not text.strip():
+            return []
+        futures = [self.submit(sentence) for sentence in self.analyzer._split_sentences(text)]
+        results = [future.result() for future in futures]
+        return [result for result in results if result]
+
+    def _collect(self) -> list:
+        pending = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(pending) < self.max_items:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return pending
+
+    def _run(self) -> None:
+        while True:
+            self._flush_slots.acquire()
+            pending = self._collect()
+            self._pool.submit(self._flush, pending)
+
+    def _flush(self, pending: list) -> None:
+        try:
+            results = self.analyzer.classify_batched([sentence for sentence, _ in pending])
+        except Exception as e:
+            print(f"Error processing batch: {str(e)}")
+            results = [None] * len(pending)
+        finally:
+            self._flush_slots.release()
+        with self._stats_lock:
+            self.flushes += 1
+            self.items += len(pending)
+        for (_, future), result in zip(pending, results):
+            future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "flushes": self.flushes,
+            "items": self.items,
+            "avg_items_per_flush": self.items / self.flushes if self.flushes else 0.0,
+            "batch_size": self.analyzer.batch_size,
+        }
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_LEXICON_PATH = "ML_Models/Text_Classifier/Data/lexicon.json"
+
+
+def normalize_for_matching(text: str) -> str:
+    """Casefold text and drop emoji variation selectors so "❄" and "❄️" match alike."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return text.replace("\ufe0f", "")
+
+
+def _normalize_terms(terms: Iterable[str]) -> set:
+    return {normalize_for_matching(term).strip() for term in terms if term and term.strip()}
+
+
+class AhoCorasick:
+    """
+    Multi-pattern matcher: finds every lexicon term in a single pass over the
+    text, regardless of how many terms the lexicon holds.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[str]] = [[]]
+        for pattern in patterns:
+            if pattern:
+                self._add(pattern)
+        self._build()
+
+    def _add(self, pattern: str) -> None:
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(pattern)
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0) if state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text: str):
+        """Yield (end_index, pattern) for every occurrence in text."""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                for pattern in output[state]:
+                    yield index, pattern
+
+
+class LexiconPrefilter:
+    """
+    Cheap first stage in front of the LLM. Sentences that contain no term from
+    the slang/emoji lexicon are treated as negative outright; the others go to
+    the LLM together with the matched terms as hints.
+
+    Context terms are everyday words that are also slang ("white", "line",
+    "deal", 🔥). On their own they would match most chat, so a sentence
+    needs one specific term, or two different context terms, to go to the LLM.
+    """
+
+    def __init__(self, terms: Iterable[str], version: str = "custom", context_terms: Iterable[str] = ()):
+        self.context_terms = sorted(_normalize_terms(context_terms))
+        self.terms = sorted(_normalize_terms(terms) - set(self.context_terms))
+        self.base_version = version
+        self.checked = 0
+        self.candidates = 0
+        self._stats_lock = threading.Lock()
+        self._matcher = AhoCorasick(self.terms + self.context_terms)
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_LEXICON_PATH) -> "LexiconPrefilter":
+        with open(path, encoding="utf-8") as lexicon_file:
+            lexicon = json.load(lexicon_file)
+        return cls(lexicon["terms"], version=str(lexicon.get("version", "unversioned")),
+                   context_terms=lexicon.get("context_terms", ()))
+
+    @property
+    def version(self) -> str:
+        """Lexicon version plus a digest of the terms actually compiled in."""
+        compiled = self.terms + ["\x00"] + self.context_terms
+        digest = hashlib.sha256("\n".join(compiled).encode("utf-8")).hexdigest()[:12]
+        return f"{self.base_version}+{digest}"
+
+    def extend(self, terms: Iterable[str]) -> int:
+        """Add specific terms and recompile the matcher. Returns how many were new."""
+        new_terms = _normalize_terms(terms) - set(self.terms) - set(self.context_terms)
+        if new_terms:
+            self.terms = sorted(set(self.terms) | new_terms)
+            self._matcher = AhoCorasick(self.terms + self.context_terms)
+        return len(new_terms)
+
+    def seed_from_flags(self, flags_collection, min_length: int = 3) -> int:
+        """
+        Add the words the classifier already flagged in the flags collection.
+        Short alphanumeric words are skipped since they would match almost everything.
+        """
+        words = flags_collection.distinct("flaggedWords")
+        words = [
+            word for word in words
+            if isinstance(word, str) and (len(word.strip()) >= min_length or not word.strip().isalnum())
+        ]
+        return self.extend(words)
+
+    def match(self, text: str) -> List[str]:
+        """Return the lexicon terms found in text, in order of first appearance."""
+        normalized = normalize_for_matching(text)
+        found = []
+        for end, term in self._matcher.iter_matches(normalized):
+            if term in found:
+                continue
+            start = end - len(term) + 1
+            # Word-like terms must not match inside a longer word ("ice" in "price")
+            if term[0].isalnum() and start > 0 and normalized[start - 1].isalnum():
+                continue
+            if term[-1].isalnum() and end + 1 < len(normalized) and normalized[end + 1].isalnum():
+                continue
+            found.append(term)
+
+        context = set(self.context_terms)
+        if all(term in context for term in found) and len(found) < 2:
+            found = []
+        # match() runs on the classifier's pool threads
+        with self._stats_lock:
+            self.checked += 1
+            if found:
+                self.candidates += 1
+        return found
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            checked, candidates = self.checked, self.candidates
+        filtered = checked - candidates
+        return {
+            "version": self.version,
+            "terms": len(self.terms),
+            "context_terms": len(self.context_terms),
+            "checked": checked,
+            "candidates": candidates,
+            "filtered": filtered,
+            "filter_rate": filtered / checked if checked else 0.0,
+        }
+
+
+def benchmark(prefilter: LexiconPrefilter, sentences: List[str], repeat: int = 5) -> Optional[float]:
+    """Return matcher throughput in sentences/sec over the given sentences."""
+    if not sentences:
+        return None
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for sentence in sentences:
+            prefilter.match(sentence)
+    return (len(sentences) * repeat) / (time.perf_counter() - start)
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a sentence so trivially different copies share a cache entry."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class ResultCache:
+    """
+    Two-tier cache for classification results: an in-process LRU in front of
+    an optional SQLite store. Entries are keyed on the normalized text plus a
+    fingerprint of everything that shapes the LLM answer (model, temperature,
+    prompt template, response schemas). Entries stored under other
+    fingerprints stay on disk, since processes with different settings may
+    share the file, and age out through the TTL and size pruning.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: int = 10000,
+        max_disk_entries: int = 200000,
+        ttl: Optional[float] = 7 * 24 * 3600
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.fingerprint = ""
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        self._conn = None
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_created_at ON results (created_at)")
+            self._conn.commit()
+
+    def set_fingerprint(self, fingerprint: str) -> None:
+        """Switch to a new fingerprint; entries stored under any other are no longer looked up."""
+        with self._lock:
+            if fingerprint == self.fingerprint:
+                return
+            self.fingerprint = fingerprint
+            self._memory.clear()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.fingerprint}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def get(self, text: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for text, or None on a miss."""
+        key = self._key(text)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if not self._expired(created_at):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, created_at FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, text: str, value: Dict[str, Any]) -> None:
+        """Store a result in both tiers."""
+        key = self._key(text)
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, value)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO results (key, fingerprint, value, created_at) VALUES (?, ?, ?, ?)",
+                    (key, self.fingerprint, json.dumps(value), created_at)
+                )
+                self._conn.commit()
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= 1000:
+                    self._prune_disk()
+
+    def _remember(self, key: str, created_at: float, value: Dict[str, Any]) -> None:
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _prune_disk(self) -> None:
+        """Drop expired rows and trim the store to max_disk_entries, oldest first."""
+        self._writes_since_prune = 0
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM results WHERE created_at < ?", (time.time() - self.ttl,))
+        self._conn.execute(
+            """
+            DELETE FROM results WHERE key IN (
+                SELECT key FROM results ORDER BY created_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_disk_entries,)
+        )
+        self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM results")
+                self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
@@ -0,0 +1,136 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+LABELS = ("positive", "negative", "coded")
+
+# Words models use instead of the three labels, mapped onto them
+LABEL_SYNONYMS = {
+    "positive": "positive", "pos": "positive", "explicit": "positive", "drug": "positive",
+    "drugs": "positive", "drug-related": "positive", "yes": "positive", "true": "positive",
+    "coded": "coded", "code": "coded", "slang": "coded", "cryptic": "coded", "encoded": "coded",
+    "suspicious": "coded", "ambiguous": "coded",
+    "negative": "negative", "neg": "negative", "none": "negative", "unrelated": "negative",
+    "benign": "negative", "clean": "negative", "no": "negative", "false": "negative", "neutral": "negative",
+}
+
+# JSON schema handed to Ollama's `format` option; the model can only emit matching JSON
+RESULT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "classification": {"type": "string", "enum": list(LABELS)},
+        "identified_slang": {"type": "array", "items": {"type": "string"}},
+        "decoded_terms": {"type": "object", "additionalProperties": {"type": "string"}},
+    },
+    "required": ["classification", "identified_slang", "decoded_terms"],
+}
+
+_CLASSIFICATION_FIELD = re.compile(r'"?classification"?\s*[:=]\s*"?([A-Za-z-]+)', re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def normalize_label(value: Any) -> Optional[str]:
+    """Map a model's label onto positive/negative/coded, or None if it cannot be read as one."""
+    if not isinstance(value, str):
+        return None
+    word = value.strip().strip('."\'').lower()
+    if word in LABEL_SYNONYMS:
+        return LABEL_SYNONYMS[word]
+    first = re.split(r"[\s,(/]", word, maxsplit=1)[0]
+    return LABEL_SYNONYMS.get(first)
+
+
+def _repair(fragment: str) -> str:
+    """
+    Close unfinished arrays and objects and drop trailing commas, in one scan.
+    A string cut off mid-way is dropped rather than closed, so a truncated
+    term or label never passes for a whole one.
+    """
+    closers: List[str] = []
+    in_string = escaped = False
+    string_start = 0
+    for position, char in enumerate(fragment):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+            string_start = position
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+        elif char in "}]" and closers:
+            closers.pop()
+    repaired = (fragment[:string_start] if in_string else fragment).rstrip().rstrip(",")
+    if repaired.endswith(":"):
+        repaired += "null"
+    repaired += "".join(reversed(closers))
+    return _TRAILING_COMMA.sub(r"\1", repaired)
+
+
+def _load_object(content: str) -> Optional[Dict[str, Any]]:
+    start = content.find("{")
+    if start < 0:
+        return None
+    end = content.rfind("}")
+    candidates = [content[start:end + 1]] if end > start else []
+    candidates.append(_repair(content[start:end + 1] if end > start else content[start:]))
+    candidates.append(_repair(content[start:]))
+    for candidate in candidates:
+        try:
+            loaded = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(loaded, dict):
+            return loaded
+    return None
+
+
+def _as_slang(value: Any) -> List[str]:
+    if isinstance(value, list):
+        return [str(item) for item in value if isinstance(item, (str, int, float)) and str(item).strip()]
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(",") if part.strip()]
+    return []
+
+
+def _as_terms(value: Any) -> Dict[str, str]:
+    if isinstance(value, dict):
+        return {str(key): str(meaning) for key, meaning in value.items() if meaning is not None}
+    if isinstance(value, list):
+        # [{"term": ..., "meaning": ...}] or [[term, meaning]]
+        terms = {}
+        for item in value:
+            if isinstance(item, dict) and len(item) >= 2:
+                key, meaning = list(item.values())[:2]
+                terms[str(key)] = str(meaning)
+            elif isinstance(item, (list, tuple)) and len(item) == 2:
+                terms[str(item[0])] = str(item[1])
+        return terms
+    return {}
+
+
+def parse_classification(content: str) -> Optional[Dict[str, Any]]:
+    """
+    Salvage a classification from raw model output: fenced or bare JSON, JSON
+    cut off mid-answer, trailing commas, off-list labels. Returns a dict with
+    classification, identified_slang and decoded_terms, or None when no usable
+    label can be found.
+    """
+    data = _load_object(content) or {}
+    label = normalize_label(data.get("classification"))
+    if label is None:
+        match = _CLASSIFICATION_FIELD.search(content)
+        label = normalize_label(match.group(1)) if match else None
+    if label is None:
+        return None
+
+    slang = _as_slang(data.get("identified_slang"))
+    terms = _as_terms(data.get("decoded_terms"))
+    for term in terms:
+        if term not in slang:
+            slang.append(term)
+    return {"classification": label, "identified_slang": slang, "decoded_terms": terms}
@@ -0,0 +1,178 @@
+"""
+Frames/sec benchmark for the local detector backends. Without --model it
+uses StubDetector, which exercises the letterbox, batching, decode and NMS
+path without a model file. With --model it also times ONNX Runtime and
+OpenCV DNN on that export.
+
+Before timing, the detectors are checked against a tiny stub ONNX model
+(built with the onnx package) whose output holds known boxes: coordinates
+mapped back to the frame, class ids named in model order (from metadata,
+an explicit map or alphabetical classes.txt), class-aware NMS, and clear
+errors for a missing model or a model_path given to a hosted backend. The
+run exits non-zero if a check fails.
+
+    python -m benchmarks.bench_detector --frames 256 --batch-sizes 1,8,32
+    python -m benchmarks.bench_detector --model ML_Models/Image_Classifier/Models/drug-detection.onnx
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from ML_Models.Image_Classifier.detectors import create_detector, default_model_classes
+
+STUB_INPUT_SIZE = 320
+# Letterbox coordinates (cx, cy, w, h), class id and score of the stub model's candidates
+STUB_BOXES = [
+    ((160, 160, 40, 40), 1, 0.9),
+    ((162, 161, 40, 40), 1, 0.8),  # overlaps the first, same class: removed by NMS
+    ((162, 161, 40, 40), 6, 0.7),  # same place, other class: kept
+    ((40, 100, 20, 20), 0, 0.2),   # under the confidence threshold
+]
+
+
+def write_stub_model(path, num_classes, names=None):
+    """A YOLOv8-layout ONNX model that returns STUB_BOXES for every image in the batch."""
+    import onnx
+    from onnx import TensorProto, helper
+
+    output = np.zeros((1, 4 + num_classes, len(STUB_BOXES)), dtype=np.float32)
+    for candidate, (box, class_id, score) in enumerate(STUB_BOXES):
+        output[0, :4, candidate] = box
+        output[0, 4 + class_id, candidate] = score
+    nodes = [
+        helper.make_node("Constant", [], ["boxes"], value=helper.make_tensor("boxes", TensorProto.FLOAT, output.shape, output.flatten())),
+        helper.make_node("Shape", ["images"], ["image_shape"]),
+        helper.make_node("Constant", [], ["zero"], value=helper.make_tensor("zero", TensorProto.INT64, [1], [0])),
+        helper.make_node("Gather", ["image_shape", "zero"], ["batch"]),
+        helper.make_node("Constant", [], ["rest"], value=helper.make_tensor("rest", TensorProto.INT64, [2], list(output.shape[1:]))),
+        helper.make_node("Concat", ["batch", "rest"], ["output_shape"], axis=0),
+        helper.make_node("Expand", ["boxes", "output_shape"], ["output0"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "stub",
+        [helper.make_tensor_value_info("images", TensorProto.FLOAT, ["batch", 3, STUB_INPUT_SIZE, STUB_INPUT_SIZE])],
+        [helper.make_tensor_value_info("output0", TensorProto.FLOAT, ["batch", 4 + num_classes, len(STUB_BOXES)])],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    if names is not None:
+        helper.set_model_props(model, {"names": repr(dict(enumerate(names)))})
+    onnx.save(model, path)
+
+
+def check_detectors():
+    """Behaviour checks on the stub model; returns a list of failure messages."""
+    failures = []
+
+    def expect(condition, message):
+        if not condition:
+            failures.append(message)
+
+    classes = default_model_classes()
+    expect(classes[1] == "Liquid", f"class id 1 should be Liquid in model order, got {classes[1]}")
+
+    # 1280x720 letterboxed to 320: scale 0.25, 70 px of padding above and below
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+    directory = tempfile.mkdtemp()
+    plain_path = os.path.join(directory, "stub.onnx")
+    named_path = os.path.join(directory, "stub_named.onnx")
+    metadata_names = [f"name_{class_id}" for class_id in range(len(classes))]
+    try:
+        write_stub_model(plain_path, len(classes))
+        write_stub_model(named_path, len(classes), metadata_names)
+    except ImportError:
+        print("onnx is not installed; skipping the stub model checks")
+        return failures
+
+    for backend in ("onnx", "opencv"):
+        try:
+            detector = create_detector(backend, model_path=plain_path, input_size=STUB_INPUT_SIZE)
+        except ImportError as e:
+            print(f"skipping {backend} checks: {e}")
+            continue
+        predictions = sorted(detector.detect_batch([frame, frame])[1], key=lambda p: p["class_id"])
+        expect([p["class_id"] for p in predictions] == [1, 6],
+               f"{backend}: expected classes 1 and 6 after NMS, got {[p['class_id'] for p in predictions]}")
+        if predictions:
+            first = predictions[0]
+            expect(first["class"] == "Liquid", f"{backend}: class id 1 decoded as {first['class']}")
+            expect(np.allclose([first["x"], first["y"], first["width"], first["height"]], [640, 360, 160, 160]),
+                   f"{backend}: box not mapped back to the frame: {first}")
+            expect(abs(first["confidence"] - 0.9) < 1e-6, f"{backend}: confidence {first['confidence']}")
+
+        named = create_detector(backend, model_path=named_path, input_size=STUB_INPUT_SIZE)
+        expect(named.classes == metadata_names, f"{backend}: metadata names not used: {named.classes[:3]}")
+        reversed_map = {str(class_id): name for class_id, name in enumerate(reversed(classes))}
+        explicit = create_detector(backend, model_path=named_path, input_size=STUB_INPUT_SIZE, classes=reversed_map)
+        labels = sorted(p["class"] for p in explicit.detect(frame))
+        expect(labels == sorted([reversed_map["1"], reversed_map["6"]]), f"{backend}: explicit class map not used: {labels}")
+
+    for backend, options, error in (
+        ("onnx", {"model_path": os.path.join(directory, "missing.onnx")}, FileNotFoundError),
+        ("roboflow", {"model_path": plain_path}, ValueError),
+    ):
+        try:
+            create_detector(backend, **options)
+            failures.append(f"{backend}: expected {error.__name__}")
+        except error:
+            pass
+    return failures
+
+
+def make_frames(count, width=1280, height=720, seed=0):
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 256, size=(height // 80, width // 80, 3), dtype=np.uint8)
+    # Blocky noise shifted a little per frame, so consecutive frames differ like video does
+    frames = []
+    for i in range(count):
+        frame = np.kron(np.roll(base, i, axis=1), np.ones((80, 80, 1), dtype=np.uint8))
+        frames.append(frame)
+    return frames
+
+
+def run(detector, frames, repeat):
+    detector.detect_batch(frames[:detector.batch_size])  # warm up
+    best = float("inf")
+    detections = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = detector.detect_batch(frames)
+        best = min(best, time.perf_counter() - start)
+        detections = sum(len(predictions) for predictions in results)
+    return len(frames) / best, detections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=128)
+    parser.add_argument("--batch-sizes", default="1,8,32")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--model", default=None, help="YOLO ONNX export to time with the onnx and opencv backends")
+    parser.add_argument("--input-size", type=int, default=640, help="input size of the export")
+    args = parser.parse_args()
+
+    failures = check_detectors()
+    for failure in failures:
+        print(f"check failed: {failure}")
+    if failures:
+        raise SystemExit(1)
+    print("detector checks passed")
+
+    frames = make_frames(args.frames)
+    backends = ["stub"] + (["onnx", "opencv"] if args.model else [])
+    for backend in backends:
+        for batch_size in (int(size) for size in args.batch_sizes.split(",")):
+            options = {"batch_size": batch_size}
+            if backend != "stub":
+                options["model_path"] = args.model
+                options["input_size"] = args.input_size
+            detector = create_detector(backend, **options)
+            fps, detections = run(detector, frames, args.repeat)
+            print(f"{backend:<7} batch {batch_size:>3}  {fps:8.1f} frames/sec  ({detections} detections)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Latency, throughput and peak-memory benchmark for the Flask endpoints,
+against synthetic data in mongomock (or a disposable real database) and the
+fake LLM, so neither MongoDB nor Ollama is needed.
+
+    python -m benchmarks.bench_endpoints --scale 1k --requests 200 --concurrency 8
+    python -m benchmarks.bench_endpoints --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_endpoints --compare benchmarks/baseline.json --tolerance 0.25
+
+--compare exits with status 1 when any endpoint's p95 latency or throughput
+is worse than the baseline by more than the tolerance, or when an endpoint
+in the baseline was not measured. Pass --mongo-uri (or set BENCH_MONGO_URI)
+to run against a real server; the data goes to the database named by --db,
+which is dropped and re-seeded. mongomock has no $dateTrunc, so
+/dashboard/activity is skipped there unless named in --endpoints, and it is
+not fully thread-safe, so some concurrent listing requests fail. Failures
+are counted per endpoint, with the first response body kept in the report.
+Each endpoint is first called once on its own; one that answers that call
+with a server error, or fails every timed request, is broken: it fails the
+run and is never saved as a baseline. (Under load a broken refresh can hide
+behind requests served from stored data, so the error count alone is not
+enough.)
+
+The heatmap writes hotspots.csv and heatmap.html relative to
+the working directory, so the run switches to a temporary directory with a
+copy of the lexicon and leaves the repository's files alone.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CLASSIFY_TEXTS = [
+    "See you at the game tonight",
+    "Got some snow if you need it",
+    "The weather is lovely today",
+    "Hit up my plug for 🍃",
+    "Selling cocaine near the station",
+    "Can you send me the notes from class",
+]
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+# Endpoints that cannot work on mongomock, with the reason
+MONGOMOCK_UNSUPPORTED = {"activity": "mongomock has no $dateTrunc"}
+
+
+def make_scenarios(user_ids, rng):
+    """Endpoint name -> (method, path factory, json body factory)."""
+    def classify_body():
+        # Mostly fresh text, so the result cache does not hide the LLM latency
+        return {"user": f"{rng.choice(CLASSIFY_TEXTS)} {rng.randrange(10 ** 9)}"}
+
+    return {
+        "classify": ("POST", lambda: "/classify/text-predict", classify_body),
+        "profile_score": ("GET", lambda: f"/profile-score/{rng.choice(user_ids)}", None),
+        "heatmap": ("GET", lambda: "/dashboard/heatmap", None),
+        "activity": ("GET", lambda: "/dashboard/activity?granularity=day", None),
+        "keyword_monitor": ("GET", lambda: "/dashboard/keyword-monitor?k=5", None),
+        "users_page": ("GET", lambda: "/database/users?limit=50", None),
+        "users_full": ("GET", lambda: "/database/users", None),
+    }
+
+
+def _request(client, method, path, body):
+    start = time.perf_counter()
+    response = client.open(path, method=method, json=body)
+    data = response.get_data()  # drain streamed bodies
+    return time.perf_counter() - start, response.status_code, data
+
+
+def run_scenario(app, scenario, requests, concurrency):
+    method, make_path, make_body = scenario
+    clients = threading.local()
+
+    def one(_):
+        if not hasattr(clients, "client"):
+            clients.client = app.test_client()
+        return _request(clients.client, method, make_path(), make_body() if make_body else None)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for latency, status, _ in results if status < 400]
+    failures = [(status, body) for _, status, body in results if status >= 400]
+
+    # Peak memory comes from a short separate pass, as tracemalloc slows everything it traces
+    tracemalloc.start()
+    client = app.test_client()
+    for _ in range(min(5, requests)):
+        _request(client, method, make_path(), make_body() if make_body else None)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "requests": requests,
+        "errors": len(failures),
+        "first_error": f"{failures[0][0]} {failures[0][1][:200].decode('utf-8', 'replace')}" if failures else None,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "peak_memory_kb": peak / 1024,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print the change against a baseline and return the endpoints that regressed."""
+    regressions = []
+    for name in baseline.get("endpoints", {}):
+        if name not in results:
+            regressions.append(name)
+            print(f"{name:<16} NOT MEASURED")
+    for name, result in results.items():
+        reference = baseline.get("endpoints", {}).get(name)
+        if not reference:
+            continue
+        p95_change = result["p95_ms"] / reference["p95_ms"] - 1 if reference["p95_ms"] else 0.0
+        rps_change = result["throughput_rps"] / reference["throughput_rps"] - 1 if reference["throughput_rps"] else 0.0
+        regressed = p95_change > tolerance or rps_change < -tolerance
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<16} p95 {p95_change:+7.1%}  throughput {rps_change:+7.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", default="1k", help="1k, 100k or 1m users")
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="fake LLM latency per call in seconds")
+    parser.add_argument("--endpoints", default=None, help="comma-separated subset of endpoints to run")
+    parser.add_argument("--mongo-uri", default=os.getenv("BENCH_MONGO_URI", "mongomock://"))
+    parser.add_argument("--db", default="bench_endpoints")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", default=None)
+    parser.add_argument("--compare", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    save_path = os.path.abspath(args.save_baseline) if args.save_baseline else None
+
+    # Configure the service before it is imported
+    os.environ.update({
+        "MONGO_URI": args.mongo_uri,
+        "MONGO_DB": args.db,
+        "CLASSIFIER_LLM": "fake",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "CLASSIFIER_CACHE_PATH": "",
+        "WARMUP_ON_START": "0",
+    })
+    sys.path.insert(0, REPO_ROOT)
+    workdir = tempfile.TemporaryDirectory()
+    os.chdir(workdir.name)
+    os.makedirs("Dashboard/Heatmap/Data")
+    os.makedirs("templates")
+    os.makedirs("ML_Models/Text_Classifier/Data")
+    shutil.copy(os.path.join(REPO_ROOT, "ML_Models/Text_Classifier/Data/lexicon.json"), "ML_Models/Text_Classifier/Data")
+
+    from benchmarks.synthetic_data import SCALES, generate, write_hotspots_csv
+    from database import get_db
+    import endpoints
+
+    write_hotspots_csv("Dashboard/Heatmap/Data/hotspots.csv")
+    start = time.perf_counter()
+    user_ids = generate(get_db(), SCALES[args.scale.lower()], seed=args.seed)
+    print(f"seeded {len(user_ids)} users in {time.perf_counter() - start:.1f}s ({args.mongo_uri})")
+    endpoints.warmup()
+
+    scenarios = make_scenarios(user_ids, random.Random(args.seed))
+    skipped = {}
+    if args.endpoints:
+        scenarios = {name: scenarios[name] for name in args.endpoints.split(",")}
+    elif args.mongo_uri.startswith("mongomock://"):
+        skipped = {name: reason for name, reason in MONGOMOCK_UNSUPPORTED.items() if name in scenarios}
+        scenarios = {name: scenario for name, scenario in scenarios.items() if name not in skipped}
+    for name, reason in skipped.items():
+        print(f"skipping {name}: {reason}; pass --mongo-uri to measure it")
+
+    # One request at a time first, so a broken endpoint cannot hide behind concurrent callers
+    broken = {}
+    client = endpoints.app.test_client()
+    for name, (method, make_path, make_body) in scenarios.items():
+        _, status, body = _request(client, method, make_path(), make_body() if make_body else None)
+        if status >= 500:
+            broken[name] = f"{status} {body[:200].decode('utf-8', 'replace')}"
+    scenarios = {name: scenario for name, scenario in scenarios.items() if name not in broken}
+
+    results = {}
+    print(f"{'endpoint':<16} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'peak KB':>9} {'errors':>7}")
+    for name, scenario in scenarios.items():
+        result = run_scenario(endpoints.app, scenario, args.requests, args.concurrency)
+        results[name] = result
+        print(f"{name:<16} {result['p50_ms']:9.1f} {result['p95_ms']:9.1f} {result['p99_ms']:9.1f} "
+              f"{result['throughput_rps']:9.1f} {result['peak_memory_kb']:9.0f} {result['errors']:>7}")
+
+    report = {
+        "scale": args.scale,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "llm_latency": args.llm_latency,
+        "mongo": "mongomock" if args.mongo_uri.startswith("mongomock://") else "mongodb",
+        "endpoints": results,
+        "skipped": skipped,
+    }
+    os.chdir(REPO_ROOT)
+    workdir.cleanup()
+
+    # An endpoint that never answered has no latency to report; that is a failure, not a fast result
+    for name, result in results.items():
+        if result["requests"] and result["errors"] == result["requests"]:
+            broken[name] = f"all {result['requests']} requests failed: {result['first_error']}"
+    for name, error in broken.items():
+        print(f"{name}: {error}")
+    if broken:
+        print(f"failed endpoints: {', '.join(broken)}" + ("; baseline not saved" if save_path else ""))
+        sys.exit(1)
+    if save_path:
+        with open(save_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"saved baseline to {save_path}")
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Load-throughput comparison: decoding the JPEG frame tree on every pass
+versus reading the packed, memory-mapped shards.
+
+    python -m benchmarks.bench_frame_dataset --frames-folder "ML_Models/Image_Classifier/Data/Video Frames"
+
+Without --frames-folder, a synthetic tree of --synthetic JPEGs is generated first.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from ML_Models.Image_Classifier.frame_dataset import FrameDataset, pack_frames, _list_frames
+
+
+def make_synthetic_tree(folder, count, videos=4, seed=0):
+    rng = np.random.default_rng(seed)
+    for number in range(count):
+        video_dir = os.path.join(folder, f"video_{number % videos}")
+        os.makedirs(video_dir, exist_ok=True)
+        image = cv2.resize(rng.integers(0, 256, size=(45, 80, 3), dtype=np.uint8), (1280, 720))
+        cv2.imwrite(os.path.join(video_dir, f"frame_{number}.jpg"), image)
+
+
+def jpeg_pass(folder, image_size):
+    height, width = image_size
+    count = 0
+    for video in sorted(os.listdir(folder)):
+        video_dir = os.path.join(folder, video)
+        if not os.path.isdir(video_dir):
+            continue
+        for name, _ in _list_frames(video_dir):
+            image = cv2.imread(os.path.join(video_dir, name))
+            if image is not None:
+                cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+                count += 1
+    return count
+
+
+def shard_pass(dataset, batch_size, shuffle):
+    count = 0
+    checksum = 0
+    for images, _ in dataset.batches(batch_size, shuffle=shuffle, seed=0):
+        checksum += int(images[:, 0, 0, 0].sum())  # touch the pixels so the pages are really read
+        count += len(images)
+    return count
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    count = function(*args)
+    elapsed = time.perf_counter() - start
+    return count, count / elapsed if elapsed else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames-folder", default=None)
+    parser.add_argument("--synthetic", type=int, default=500, help="frames to generate when no folder is given")
+    parser.add_argument("--size", type=int, default=224)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        frames_folder = args.frames_folder
+        if frames_folder is None:
+            frames_folder = os.path.join(workdir, "frames")
+            make_synthetic_tree(frames_folder, args.synthetic)
+        dataset_dir = os.path.join(workdir, "dataset")
+        image_size = (args.size, args.size)
+
+        start = time.perf_counter()
+        stats = pack_frames(frames_folder, dataset_dir, image_size, shard_size=256)
+        print(f"packed {stats['total_frames']} frames in {time.perf_counter() - start:.2f}s")
+        dataset = FrameDataset(dataset_dir)
+
+        count, rate = timed(jpeg_pass, frames_folder, image_size)
+        print(f"jpeg tree          {rate:10.0f} frames/sec ({count} frames)")
+        for shuffle in (False, True):
+            count, rate = timed(shard_pass, dataset, args.batch_size, shuffle)
+            label = "shards shuffled" if shuffle else "shards in order"
+            print(f"{label:<18} {rate:10.0f} frames/sec ({count} frames)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark MessageGraph on synthetic messaging graphs.
+
+    python -m benchmarks.bench_graph --edges 10000 100000 1000000 --samples 16
+"""
+import argparse
+import time
+
+import numpy as np
+
+from Dashboard.Network_Graph.graph_analytics import MessageGraph
+
+
+def synthetic_edges(edge_count, seed=0):
+    """Heavy-tailed sender/receiver pairs: a few chatty users, many quiet ones."""
+    rng = np.random.default_rng(seed)
+    nodes = max(10, edge_count // 10)
+    chatty = (rng.pareto(1.5, edge_count) * 10).astype(np.int64) % nodes
+    src = np.where(rng.random(edge_count) < 0.5, chatty, rng.integers(0, nodes, edge_count))
+    dst = rng.integers(0, nodes, edge_count)
+    return src, dst
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--edges", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--samples", type=int, default=16, help="betweenness source samples")
+    args = parser.parse_args()
+
+    print(f"{'edges':>9} {'nodes':>8} {'build':>8} {'update':>8} {'degree':>8} {'pagerank':>9} {'between':>9} {'communit':>9}")
+    for edge_count in args.edges:
+        src, dst = synthetic_edges(edge_count)
+        graph = MessageGraph()
+        graph.add_edge_arrays(src, dst)
+        build = timed(lambda: graph.edge_count)
+
+        # Incremental update: 1% new messages, then a full metric refresh
+        extra_src, extra_dst = synthetic_edges(max(1, edge_count // 100), seed=1)
+        graph.add_edge_arrays(extra_src, extra_dst)
+        update = timed(lambda: graph.edge_count)
+
+        degree = timed(graph.degrees)
+        pagerank = timed(graph.pagerank)
+        betweenness = timed(lambda: graph.betweenness(samples=args.samples))
+        communities = timed(graph.communities)
+        print(f"{edge_count:>9} {graph.node_count:>8} {build:>7.3f}s {update:>7.3f}s {degree:>7.3f}s "
+              f"{pagerank:>8.3f}s {betweenness:>8.3f}s {communities:>8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark HotspotEngine on synthetic flagged activity: dense clusters around
+known centres on top of uniform noise. Times the full build and clustering,
+incremental updates, and checks every seeded centre is recovered.
+
+    python -m benchmarks.bench_hotspots --points 10000 100000 1000000 --clusters 20
+"""
+import argparse
+import time
+
+import numpy as np
+
+from ML_Models.Profile_Score.hotspot_engine import HotspotEngine
+from ML_Models.Profile_Score.hotspot_index import haversine_km
+
+
+def synthetic_points(point_count, cluster_count, noise_share=0.5, seed=0):
+    """Clusters of roughly 300 m spread around random centres in India, plus noise over the same area."""
+    rng = np.random.default_rng(seed)
+    centres = np.column_stack([rng.uniform(10, 30, cluster_count), rng.uniform(72, 88, cluster_count)])
+    clustered = int(point_count * (1 - noise_share))
+    owner = rng.integers(0, cluster_count, clustered)
+    spread = rng.normal(0, 0.3 / 111.32, (clustered, 2))
+    latitudes = np.concatenate([centres[owner, 0] + spread[:, 0], rng.uniform(10, 30, point_count - clustered)])
+    longitudes = np.concatenate([centres[owner, 1] + spread[:, 1] / np.cos(np.radians(centres[owner, 0])),
+                                 rng.uniform(72, 88, point_count - clustered)])
+    weights = rng.choice([1.0, 1.5, 2.0, 3.0], point_count)
+    return centres, latitudes, longitudes, weights
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--clusters", type=int, default=20)
+    parser.add_argument("--eps-km", type=float, default=1.0)
+    parser.add_argument("--updates", type=int, default=1000, help="points changed per incremental update")
+    args = parser.parse_args()
+
+    print(f"{'points':>9} {'cells':>8} {'build':>8} {'cluster':>8} {'update':>8} {'hotspots':>9} {'found':>6} {'max err':>8}")
+    failed = False
+    for point_count in args.points:
+        centres, latitudes, longitudes, weights = synthetic_points(point_count, args.clusters)
+        # Core cells need well above the noise weight in an eps neighbourhood, well below a cluster's
+        min_weight = max(10.0, point_count / args.clusters / 20)
+        engine = HotspotEngine(eps_km=args.eps_km, min_weight=min_weight, max_hotspots=args.clusters * 5)
+        ids = np.arange(point_count).tolist()
+
+        build, _ = timed(lambda: engine.update_points(ids, latitudes, longitudes, weights))
+        cluster, hotspots = timed(engine.cluster)
+
+        rng = np.random.default_rng(1)
+        moved = rng.choice(point_count, args.updates, replace=False)
+        update, _ = timed(lambda: (
+            engine.update_points([ids[i] for i in moved.tolist()], rng.uniform(10, 30, args.updates),
+                                 rng.uniform(72, 88, args.updates), weights[moved]),
+            engine.cluster(),
+        ))
+
+        found = np.array([[h["latitude"], h["longitude"]] for h in engine.hotspots]).reshape(-1, 2)
+        errors = [haversine_km(lat, lon, found[:, 0], found[:, 1]).min() if len(found) else np.inf for lat, lon in centres]
+        recovered = sum(error < args.eps_km for error in errors)
+        failed |= recovered < args.clusters
+        print(f"{point_count:>9} {len(engine.keys):>8} {build:>7.2f}s {cluster:>7.2f}s {update:>7.2f}s "
+              f"{len(engine.hotspots):>9} {recovered:>3}/{args.clusters:<2} {max(errors):>6.3f}km")
+    if failed:
+        raise SystemExit("some seeded hotspots were not recovered")
+
+
+if __name__ == "__main__":
+    main()
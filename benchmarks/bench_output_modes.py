@@ -0,0 +1,116 @@
+"""
+Per-sentence cost of the classifier's output modes: the StructuredOutputParser
+prompt ("structured") against the compact prompt with schema-constrained JSON
+("json"). For each mode it reports prompt and output tokens, LLM calls,
+retries, failures and end-to-end latency per sentence.
+
+By default it runs against FakeChatOllama, which charges time per token and
+cuts off a share of free-form answers:
+
+    python -m benchmarks.bench_output_modes --sentences 60 --malformed-rate 0.1
+
+Pass --ollama to measure a local Ollama server instead:
+
+    python -m benchmarks.bench_output_modes --ollama --model wizardlm2 --sentences 20
+"""
+import argparse
+import time
+
+from ML_Models.Text_Classifier.DrugTextAnalyzer import DrugTextAnalyzer
+from ML_Models.Text_Classifier.fake_llm import FakeChatOllama
+from ML_Models.Text_Classifier.tolerant_parser import RESULT_SCHEMA
+from benchmarks.bench_endpoints import percentile
+from benchmarks.bench_text_classifier import make_sentences
+
+MODES = ("structured", "json")
+
+
+class CountingLLM:
+    """Wraps an LLM and adds up the token counts Ollama reports."""
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+
+    def _count(self, output):
+        metadata = getattr(output, "response_metadata", None) or {}
+        self.calls += 1
+        self.prompt_tokens += metadata.get("prompt_eval_count") or 0
+        self.output_tokens += metadata.get("eval_count") or 0
+        return output
+
+    def invoke(self, prompt):
+        return self._count(self.llm.invoke(prompt))
+
+    async def ainvoke(self, prompt):
+        return self._count(await self.llm.ainvoke(prompt))
+
+
+def run_mode(mode, sentences, args):
+    if args.ollama:
+        analyzer = DrugTextAnalyzer(model_name=args.model, output_mode=mode, parse_retries=args.retries)
+    else:
+        llm = FakeChatOllama(
+            latency=args.latency,
+            seed=args.seed,
+            format=RESULT_SCHEMA if mode == "json" else None,
+            prompt_token_latency=args.prompt_token_latency,
+            token_latency=args.token_latency,
+            malformed_rate=args.malformed_rate,
+        )
+        analyzer = DrugTextAnalyzer(llm=llm, output_mode=mode, parse_retries=args.retries)
+    counter = analyzer.llm = CountingLLM(analyzer.llm)
+
+    latencies, failures = [], 0
+    for sentence in sentences:
+        start = time.perf_counter()
+        result = analyzer.process_single_input(sentence)
+        latencies.append(time.perf_counter() - start)
+        failures += result is None
+
+    count = len(sentences)
+    return {
+        "calls": counter.calls,
+        "retries": counter.calls - count,
+        "failures": failures,
+        "prompt_tokens": counter.prompt_tokens / count,
+        "output_tokens": counter.output_tokens / count,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "mean_ms": sum(latencies) / count * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sentences", type=int, default=40)
+    parser.add_argument("--retries", type=int, default=1, help="re-requests allowed for unusable answers")
+    parser.add_argument("--ollama", action="store_true", help="use a local Ollama server instead of the fake LLM")
+    parser.add_argument("--model", default="wizardlm2")
+    parser.add_argument("--latency", type=float, default=0.01, help="fake LLM fixed latency per call in seconds")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0002, help="fake seconds per prompt token")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="fake seconds per output token")
+    parser.add_argument("--malformed-rate", type=float, default=0.1, help="share of free-form fake answers cut off")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sentences = make_sentences(args.sentences)
+    results = {mode: run_mode(mode, sentences, args) for mode in MODES}
+
+    print(f"{'mode':<11} {'prompt tok':>10} {'output tok':>10} {'calls':>6} {'retries':>7} {'failed':>6} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8}   (per sentence)")
+    for mode, result in results.items():
+        print(f"{mode:<11} {result['prompt_tokens']:10.1f} {result['output_tokens']:10.1f} {result['calls']:6d} "
+              f"{result['retries']:7d} {result['failures']:6d} {result['p50_ms']:8.1f} {result['p95_ms']:8.1f} "
+              f"{result['mean_ms']:8.1f}")
+
+    baseline, compact = results["structured"], results["json"]
+    for key, label in (("prompt_tokens", "prompt tokens"), ("output_tokens", "output tokens"), ("mean_ms", "mean latency")):
+        if baseline[key]:
+            print(f"json vs structured {label:<14} {compact[key] / baseline[key] - 1:+7.1%}")
+
+
+if __name__ == "__main__":
+    main()
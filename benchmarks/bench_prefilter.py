@@ -0,0 +1,77 @@
+"""
+Throughput and filter-rate benchmark for the lexicon prefilter. The filter
+rate on generated sentences depends on --candidate-share, so the prefilter is
+also run over everyday chat that uses words the lexicon treats as slang in
+context; every one of those that reaches the LLM is a wasted call.
+
+    python -m benchmarks.bench_prefilter --sentences 50000
+"""
+import argparse
+import random
+
+from ML_Models.Text_Classifier.prefilter import LexiconPrefilter, benchmark
+
+BENIGN_WORDS = (
+    "the meeting moved to friday so bring the slides and the budget numbers "
+    "we should grab lunch after class tomorrow near the library with everyone"
+).split()
+
+# Benign messages full of words that are also drug slang
+EVERYDAY = [
+    "What a deal on that white shirt",
+    "High score on the quiz today",
+    "Can you fix my bike this weekend",
+    "The line at the bank was huge",
+    "That song is fire 🔥",
+    "Got some snow on the roads this morning",
+    "Pack your bag for the trip",
+    "Speed limit is lower near the school",
+    "Grab a quarter of the pizza for me",
+    "She hit the ball over the fence",
+    "Our flight is at 6, pickup at 4?",
+    "Lit candles for the party",
+    "The acid test is on chapter four",
+    "Ice cream after the game?",
+    "Brown bread or white bread",
+    "Crystal clear water at the lake",
+    "I need to buy a new phone",
+    "Selling my old textbooks, cheap price",
+    "The horse ride was fun",
+    "Take one pill after dinner for the headache",
+]
+
+
+def make_sentences(count, candidate_share, terms, seed=0):
+    rng = random.Random(seed)
+    sentences = []
+    for _ in range(count):
+        words = rng.sample(BENIGN_WORDS, 8)
+        if rng.random() < candidate_share:
+            words.insert(rng.randrange(len(words)), rng.choice(terms))
+        sentences.append(" ".join(words))
+    return sentences
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sentences", type=int, default=20000)
+    parser.add_argument("--candidate-share", type=float, default=0.1, help="share of sentences containing a lexicon term")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    prefilter = LexiconPrefilter.from_file()
+    sentences = make_sentences(args.sentences, args.candidate_share, prefilter.terms)
+    throughput = benchmark(prefilter, sentences, repeat=args.repeat)
+    stats = prefilter.stats()
+    print(f"lexicon {stats['version']} ({stats['terms']} terms)")
+    print(f"throughput  {throughput:,.0f} sentences/sec")
+    print(f"filter rate {stats['filter_rate']:.1%} ({stats['filtered']}/{stats['checked']} skipped the LLM)")
+
+    passed = [sentence for sentence in EVERYDAY if prefilter.match(sentence)]
+    print(f"everyday    {len(EVERYDAY) - len(passed)}/{len(EVERYDAY)} benign sentences skipped the LLM")
+    for sentence in passed:
+        print(f"  sent to the LLM: {sentence} ({', '.join(prefilter.match(sentence))})")
+
+
+if __name__ == "__main__":
+    main()
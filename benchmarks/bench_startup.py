@@ -0,0 +1,76 @@
+"""
+Cold-start benchmark for the Flask service. Each run happens in a fresh
+interpreter against mongomock and the fake LLM, and reports how long
+`import endpoints` takes, which heavy libraries it pulled in, and the latency
+of the first requests. With --warmup it also waits for /readyz.
+
+    python -m benchmarks.bench_startup --runs 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("langchain_core", "langchain_ollama", "folium", "pandas", "nltk")
+
+PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+import endpoints
+report = {"import": time.perf_counter() - start}
+report["heavy_loaded"] = [name for name in HEAVY if name in sys.modules]
+client = endpoints.app.test_client()
+
+if WARMUP:
+    start = time.perf_counter()
+    while client.get("/readyz").status_code != 200:
+        if endpoints.startup["status"] == "failed":
+            raise SystemExit(endpoints.startup["error"])
+        time.sleep(0.005)
+    report["ready"] = time.perf_counter() - start
+
+for label, path in (("healthz", "/healthz"), ("first_classify", None), ("second_classify", None)):
+    start = time.perf_counter()
+    if path:
+        response = client.get(path)
+    else:
+        response = client.post("/classify/text-predict", json={"user": "got some snow for the weekend"})
+    assert response.status_code == 200, response.status_code
+    report[label] = time.perf_counter() - start
+print(json.dumps(report))
+"""
+
+
+def run_once(warmup, latency):
+    env = dict(
+        os.environ,
+        MONGO_URI="mongomock://",
+        CLASSIFIER_LLM="fake",
+        FAKE_LLM_LATENCY=str(latency),
+        CLASSIFIER_CACHE_PATH="",
+        WARMUP_ON_START="1" if warmup else "0",
+    )
+    code = f"HEAVY = {HEAVY_MODULES!r}\nWARMUP = {warmup!r}\n" + PROBE
+    output = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated LLM latency in seconds")
+    parser.add_argument("--warmup", action="store_true", help="start the background warmup and wait for readiness")
+    args = parser.parse_args()
+
+    reports = [run_once(args.warmup, args.latency) for _ in range(args.runs)]
+    print(f"heavy modules after import: {', '.join(reports[0]['heavy_loaded']) or 'none'}")
+    for key in ("import", "ready", "healthz", "first_classify", "second_classify"):
+        if key in reports[0]:
+            samples = [report[key] for report in reports]
+            print(f"{key:<16} median {statistics.median(samples) * 1000:8.1f} ms   max {max(samples) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Throughput benchmark for DrugTextAnalyzer execution modes.
+
+Runs against FakeChatOllama so no Ollama server is needed:
+
+    python -m benchmarks.bench_text_classifier --sentences 40 --latency 0.2 --concurrency 8
+"""
+import argparse
+import asyncio
+import time
+
+from ML_Models.Text_Classifier.DrugTextAnalyzer import DrugTextAnalyzer
+from ML_Models.Text_Classifier.fake_llm import FakeChatOllama
+
+SAMPLE_SENTENCES = [
+    "See you at the game tonight",
+    "Got some snow if you need it",
+    "The weather is lovely today",
+    "Hit up my plug for 🍃",
+    "Selling cocaine near the station",
+    "Can you send me the notes from class",
+]
+
+
+def make_sentences(count):
+    return [f"{SAMPLE_SENTENCES[i % len(SAMPLE_SENTENCES)]} {i}" for i in range(count)]
+
+
+def timed(label, func, count):
+    start = time.perf_counter()
+    results = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {len(results):>4}/{count} results  {elapsed:7.3f}s  {count / elapsed:8.2f} sentences/sec")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sentences", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM latency per call in seconds")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    sentences = make_sentences(args.sentences)
+    analyzer = DrugTextAnalyzer(
+        max_concurrency=args.concurrency,
+        max_batch_size=args.batch_size,
+        llm=FakeChatOllama(latency=args.latency)
+    )
+
+    serial = timed("serial", lambda: analyzer.batch_process(sentences), len(sentences))
+    timed("cached", lambda: analyzer.batch_process(sentences), len(sentences))
+    analyzer.cache.clear()
+    threaded = timed("threaded", lambda: analyzer.batch_process_threaded(sentences), len(sentences))
+    analyzer.cache.clear()
+    asynced = timed("async", lambda: asyncio.run(analyzer.abatch_process(sentences)), len(sentences))
+    analyzer.cache.clear()
+    calls_before = analyzer.llm.calls
+    batched = timed("batched", lambda: analyzer.batch_process_batched(sentences), len(sentences))
+    print(f"batched    {analyzer.llm.calls - calls_before} LLM calls for {len(sentences)} sentences")
+    print(f"speedup    threaded x{serial / threaded:.1f}  async x{serial / asynced:.1f}  batched x{serial / batched:.1f}")
+
+
+if __name__ == "__main__":
+    main()
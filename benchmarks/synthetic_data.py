@@ -0,0 +1,140 @@
+"""
+Synthetic users, flags and messages shaped like the Node backend's documents
+(see Social_Media_App/backend/models), for benchmarks and local runs.
+
+    python -m benchmarks.synthetic_data --scale 1k          # into $MONGO_URI / $MONGO_DB
+    MONGO_URI=mongomock:// python -m benchmarks.synthetic_data --scale 100k
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+# Users per scale preset; each user sends about MESSAGES_PER_USER messages
+SCALES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+MESSAGES_PER_USER = 5
+FLAGGED_SHARE = 0.2
+BATCH_SIZE = 10_000
+
+# Cities the users log in from; a few of them are also the hotspots
+CITIES = [
+    (28.7041, 77.1025), (19.0760, 72.8777), (12.9716, 77.5946), (22.5726, 88.3639),
+    (13.0827, 80.2707), (21.2514, 81.6296), (17.3850, 78.4867), (26.9124, 75.7873),
+]
+HOTSPOTS = CITIES[:3]
+
+FLAGGED_WORDS = ["weed", "snow", "molly", "ice", "plug", "420", "🍃", "❄️", "💊", "gas", "candy", "blow"]
+MESSAGE_TEXTS = [
+    "See you at the game tonight",
+    "Got some snow if you need it",
+    "The weather is lovely today",
+    "Hit up my plug for 🍃",
+    "Can you send me the notes from class",
+    "Party at mine, bring molly",
+]
+
+
+def _location(rng):
+    lat, lon = rng.choice(CITIES)
+    return {"latitude": f"{lat + rng.gauss(0, 0.05):.5f}", "longitude": f"{lon + rng.gauss(0, 0.05):.5f}", "place": ""}
+
+
+def _insert_batches(collection, documents):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= BATCH_SIZE:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+
+def generate(db, users=1_000, messages_per_user=MESSAGES_PER_USER, seed=0, drop=True):
+    """
+    Fill db with users (about FLAGGED_SHARE of them with a flags document),
+    their messages and login locations around a handful of cities. Receivers
+    are drawn with a long-tailed skew, so a few users act as hubs. Returns the
+    generated user ids.
+    """
+    rng = random.Random(seed)
+    if drop:
+        for name in ("users", "flags", "messages", "activity", "activity_watermarks", "keyword_counts"):
+            db[name].drop()
+
+    now = datetime.utcnow()
+    user_ids = [ObjectId() for _ in range(users)]
+
+    def user_documents():
+        flags = []
+        for user_id in user_ids:
+            created = now - timedelta(days=rng.uniform(0, 90))
+            user = {
+                "_id": user_id,
+                "name": f"User {user_id}",
+                "username": f"user_{user_id}",
+                "email": f"{user_id}@example.com",
+                "posts": [ObjectId() for _ in range(rng.randint(0, 8))],
+                "lastLoginLocation": _location(rng),
+                "isFlag": False,
+                "createdAt": created,
+                "updatedAt": min(now, created + timedelta(hours=rng.uniform(0, 48))),
+                "lastActive": now - timedelta(minutes=rng.uniform(0, 60 * 24 * 30)),
+            }
+            if rng.random() < FLAGGED_SHARE:
+                flag_id = ObjectId()
+                flags.append({
+                    "_id": flag_id,
+                    "flaggedWords": rng.sample(FLAGGED_WORDS, rng.randint(1, 6)),
+                    "positiveCount": rng.randint(0, 10),
+                    "negativeCount": rng.randint(0, 20),
+                })
+                user["flagged"] = flag_id
+                user["isFlag"] = rng.random() < 0.5
+                user["riskScore"] = round(rng.uniform(0, 100), 2)
+            if len(flags) >= BATCH_SIZE:
+                db["flags"].insert_many(flags, ordered=False)
+                flags = []
+            yield user
+        if flags:
+            db["flags"].insert_many(flags, ordered=False)
+
+    _insert_batches(db["users"], user_documents())
+
+    def message_documents():
+        for _ in range(users * messages_per_user):
+            # paretovariate gives a long tail of heavily messaged users
+            sender = user_ids[rng.randrange(users)]
+            receiver = user_ids[min(users - 1, int(rng.paretovariate(1.2)) - 1)]
+            yield {"senderId": sender, "receiverId": receiver, "message": rng.choice(MESSAGE_TEXTS)}
+
+    _insert_batches(db["messages"], message_documents())
+    return user_ids
+
+
+def write_hotspots_csv(path):
+    with open(path, "w") as f:
+        f.write("latitude,longitude\n")
+        for lat, lon in HOTSPOTS:
+            f.write(f"{lat},{lon}\n")
+
+
+def main():
+    from database import get_db
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="1k")
+    parser.add_argument("--messages-per-user", type=int, default=MESSAGES_PER_USER)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    user_ids = generate(get_db(), SCALES[args.scale], args.messages_per_user, args.seed)
+    print(f"Generated {len(user_ids)} users and {len(user_ids) * args.messages_per_user} messages "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
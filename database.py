@@ -0,0 +1,111 @@
+"""
+Shared MongoDB access for the Flask service, the dashboard modules and the
+scoring jobs. One pooled client is created lazily on first use and reused
+by every module.
+
+Set MONGO_URI=mongomock:// to run against the in-memory mongomock stand-in
+(pip install mongomock), or call set_client() with any pymongo-compatible client.
+Clients created here report every command's latency to metrics.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+DB_NAME = os.getenv("MONGO_DB", "test")
+
+_client = None
+_client_lock = threading.Lock()
+_io_pool = None
+
+
+def _command_listener():
+    """pymongo CommandListener feeding per-command latencies into metrics."""
+    from pymongo import monitoring
+
+    class CommandTimings(monitoring.CommandListener):
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            metrics.observe("mongo_command_seconds", event.duration_micros / 1e6, command=event.command_name)
+
+        def failed(self, event):
+            metrics.observe("mongo_command_seconds", event.duration_micros / 1e6, command=event.command_name)
+            metrics.inc("mongo_command_failures_total", command=event.command_name)
+
+    return CommandTimings()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                mongo_uri = os.getenv("MONGO_URI")
+                if mongo_uri and mongo_uri.startswith("mongomock://"):
+                    import mongomock
+                    _client = mongomock.MongoClient()
+                else:
+                    from pymongo import MongoClient
+                    _client = MongoClient(
+                        mongo_uri,
+                        event_listeners=[_command_listener()] if metrics.ENABLED else [],
+                        maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+                        minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+                        serverSelectionTimeoutMS=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+                    )
+    return _client
+
+
+def set_client(client):
+    """Use the given client (e.g. mongomock.MongoClient()) instead of connecting to MONGO_URI."""
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def get_db():
+    return get_client()[DB_NAME]
+
+
+def get_collection(name):
+    return get_db()[name]
+
+
+class LazyCollection:
+    """
+    Stand-in for a collection that resolves it on first use, so importing a
+    module never opens a connection.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attribute):
+        return getattr(get_collection(self.name), attribute)
+
+    def __repr__(self):
+        return f"LazyCollection({self.name!r})"
+
+
+def collection(name):
+    return LazyCollection(name)
+
+
+def io_pool():
+    """Thread pool for overlapping independent blocking lookups."""
+    global _io_pool
+    if _io_pool is None:
+        with _client_lock:
+            if _io_pool is None:
+                _io_pool = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("IO_POOL_SIZE", "16")),
+                    thread_name_prefix="db-io"
+                )
+    return _io_pool
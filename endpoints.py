@@ -1,125 +1,582 @@
 from datetime import datetime
 import os
+import threading
+import time
 from dotenv import load_dotenv
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request, stream_with_context, g
 from flask_cors import CORS
-from pymongo import MongoClient
 from bson.objectid import ObjectId
-from ML_Models.Text_Classifier.DrugTextAnalyzer import DrugTextAnalyzer
-from ML_Models.Profile_Score.user_profile_score import UserProfileScore
+from database import collection, get_client, io_pool
+import metrics
+from ML_Models.Text_Classifier.job_queue import QueueFullError
+from ML_Models.Profile_Score.user_profile_score import UserProfileScore, FLAG_THRESHOLD
+from ML_Models.Profile_Score.bulk_rescore import bulk_rescore
+from ML_Models.Profile_Score.hotspot_index import load_hotspot_index, hotspot_version, HOTSPOTS_CSV_PATH
+from ML_Models.Profile_Score.hotspot_engine import get_hotspot_engine, refresh_hotspots, REFRESH_INTERVAL as HOTSPOT_REFRESH_INTERVAL
 from Dashboard.Heatmap.heatmap_generation import heatmap_generation
-from Dashboard.Activity_Graph.update_activity import update_activity_monitor
-from Dashboard.Keyword_Monitoring.keywords import get_flagged_words_count
+from Dashboard.Activity_Graph.update_activity import update_activity_monitor, get_activity_series, GRANULARITIES
+from Dashboard.Keyword_Monitoring.keywords import KeywordMonitor, WINDOWS
+from networkX import build_network_geojson, UserPoints
+from Dashboard.Network_Graph.graph_analytics import MessageGraph
+from Dashboard.User_Listing.user_listing import ensure_user_indexes, find_flagged_users, to_listing, encode_cursor, SORT_FIELDS
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
-model = DrugTextAnalyzer()
 ps = UserProfileScore()
 
-# MongoDB connection
-mongo_uri = os.getenv("MONGO_URI")
-client = MongoClient(mongo_uri)
-db = client['test']  # Database name
-users_collection = db['users']
-activity_collection = db['activity']
-flags_collection = db['flags'] 
+# MongoDB collections, sharing one lazily created, pooled client
+users_collection = collection('users')
+activity_collection = collection('activity')
+flags_collection = collection('flags')
+messages_collection = collection('messages')
+keyword_counts_collection = collection('keyword_counts')
+
+# Messaging graph, updated incrementally from new messages
+message_graph = MessageGraph()
+GRAPH_REFRESH_INTERVAL = float(os.getenv("GRAPH_REFRESH_INTERVAL", "60"))
+
+message_graph_stop = threading.Event()
+
+def refresh_message_graph():
+    message_graph.refresh(messages_collection, min_interval=GRAPH_REFRESH_INTERVAL)
+    return message_graph
+
+def start_message_graph():
+    # Refreshes the graph and precomputes its metrics off the request path
+    thread = threading.Thread(
+        target=message_graph.run,
+        args=(messages_collection, message_graph_stop, GRAPH_REFRESH_INTERVAL),
+        name="message-graph",
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+def analyzed_message_graph():
+    # Until the background thread publishes its first analysis, the first caller computes it
+    if message_graph.analysis is None:
+        refresh_message_graph()
+        message_graph.analyze()
+    return message_graph.analysis
+
+# Indexed numeric copies of login locations for bounding-box lookups, kept in their own collection
+# and synced from updatedAt in the background; bbox requests scan users until the first sync is done
+user_points = UserPoints(collection('user_points'))
+user_points_stop = threading.Event()
+
+def start_user_points():
+    thread = threading.Thread(
+        target=user_points.run,
+        args=(users_collection, user_points_stop, GRAPH_REFRESH_INTERVAL),
+        name="user-points",
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+# Hotspots derived from flagged activity, rewritten to HOTSPOTS_CSV_PATH when they change
+def refreshed_hotspot_index():
+    refresh_hotspots(users_collection, min_interval=HOTSPOT_REFRESH_INTERVAL)
+    return load_hotspot_index(HOTSPOTS_CSV_PATH)
+
+keyword_monitor = KeywordMonitor(
+    flags_collection,
+    keyword_counts_collection,
+    sketch_capacity=int(os.getenv("KEYWORD_SKETCH_CAPACITY", "0")) or None,
+    # Flag writes that bypass record() are folded back in by a periodic reseed
+    reseed_interval=float(os.getenv("KEYWORD_RESEED_INTERVAL", "3600")) or None
+)
+
+def record_flagged_words(result):
+    # The message controller appends the first result's decoded terms to the sender's flags
+    if result:
+        try:
+            keyword_monitor.record(list(result[0].decoded_terms.keys()))
+        except Exception as e:
+            print(f"Error recording flagged words: {str(e)}")
+
+# The classifier (langchain, Ollama client, prefilter seeded from Mongo) is
+# built on first use or by the background warmup, not at import time.
+_classifier_lock = threading.Lock()
+_classifier = {}
+
+def _build_classifier():
+    from ML_Models.Text_Classifier.DrugTextAnalyzer import DrugTextAnalyzer
+    from ML_Models.Text_Classifier.result_cache import ResultCache
+    from ML_Models.Text_Classifier.prefilter import LexiconPrefilter
+    from ML_Models.Text_Classifier.job_queue import ClassificationQueue
+    from ML_Models.Text_Classifier.micro_batcher import MicroBatcher
+
+    # Lexicon prefilter, seeded with the words already flagged by the classifier
+    prefilter = None
+    if os.getenv("CLASSIFIER_PREFILTER", "1") == "1":
+        prefilter = LexiconPrefilter.from_file()
+        try:
+            prefilter.seed_from_flags(flags_collection)
+        except Exception as e:
+            print(f"Could not seed lexicon from flags: {str(e)}")
+
+    # CLASSIFIER_LLM=fake swaps Ollama for the offline stand-in (benchmarks, dry runs)
+    # CLASSIFIER_OUTPUT_MODE=json uses the compact prompt with schema-constrained output
+    output_mode = os.getenv("CLASSIFIER_OUTPUT_MODE", "structured")
+    llm = None
+    if os.getenv("CLASSIFIER_LLM") == "fake":
+        from ML_Models.Text_Classifier.fake_llm import FakeChatOllama
+        from ML_Models.Text_Classifier.tolerant_parser import RESULT_SCHEMA
+        llm = FakeChatOllama(latency=float(os.getenv("FAKE_LLM_LATENCY", "0.2")),
+                             format=RESULT_SCHEMA if output_mode == "json" else None)
+
+    model = DrugTextAnalyzer(
+        max_concurrency=int(os.getenv("CLASSIFIER_MAX_CONCURRENCY", "4")),
+        llm=llm,
+        cache=ResultCache(path=os.getenv("CLASSIFIER_CACHE_PATH", "ML_Models/Text_Classifier/Data/result_cache.sqlite3")),
+        prefilter=prefilter,
+        max_batch_size=int(os.getenv("CLASSIFIER_MAX_BATCH_SIZE", "8")),
+        output_mode=output_mode
+    )
+    # Pack sentences from concurrent requests into shared prompts
+    batcher = MicroBatcher(model) if os.getenv("CLASSIFIER_BATCHING", "0") == "1" else None
+    job_queue = ClassificationQueue(
+        model,
+        workers=int(os.getenv("CLASSIFIER_WORKERS", "2")),
+        max_depth=int(os.getenv("CLASSIFIER_QUEUE_DEPTH", "100")),
+        batcher=batcher,
+        on_result=lambda job: record_flagged_words(job.result)
+    )
+    return {"model": model, "batcher": batcher, "job_queue": job_queue}
+
+def get_classifier():
+    if not _classifier:
+        with _classifier_lock:
+            if not _classifier:
+                _classifier.update(_build_classifier())
+    return _classifier
+
+def get_model():
+    return get_classifier()["model"]
+
+def get_batcher():
+    return get_classifier()["batcher"]
+
+def get_job_queue():
+    return get_classifier()["job_queue"]
+
+# Startup state reported by /readyz
+startup = {"status": "starting", "started_at": time.time(), "ready_at": None, "checks": {}, "error": None}
+
+def warmup():
+    """Connect to Mongo, create indexes and prime the classifier before traffic arrives."""
+    try:
+        check_start = time.perf_counter()
+        get_client().admin.command("ping")
+        startup["checks"]["mongo"] = time.perf_counter() - check_start
+
+        check_start = time.perf_counter()
+        ensure_user_indexes(users_collection)
+        startup["checks"]["indexes"] = time.perf_counter() - check_start
+
+        check_start = time.perf_counter()
+        model = get_model()
+        startup["checks"]["classifier_build"] = time.perf_counter() - check_start
+
+        startup["checks"].update(model.warmup())
+        startup["status"] = "ready"
+        startup["ready_at"] = time.time()
+    except Exception as e:
+        startup["status"] = "failed"
+        startup["error"] = str(e)
+        print(f"Warmup failed: {str(e)}")
+
+def start_warmup():
+    thread = threading.Thread(target=warmup, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+if os.getenv("WARMUP_ON_START", "1") == "1":
+    start_warmup()
+    start_user_points()
+    start_message_graph()
+
+# Event-driven risk scoring (RISK_EVENTS=1): keeps riskScore/isFlag current as messages, posts and flags arrive
+risk_scorer = None
+risk_scorer_thread = None
+risk_scorer_stop = threading.Event()
+
+def start_risk_events():
+    global risk_scorer, risk_scorer_thread
+    from ML_Models.Profile_Score.risk_events import RiskEventScorer
+    from database import get_db
+    risk_scorer = RiskEventScorer(get_db(), csv_path=HOTSPOTS_CSV_PATH)
+    thread = threading.Thread(
+        target=risk_scorer.run,
+        args=(risk_scorer_stop, os.getenv("RISK_EVENTS_MODE", "auto"), float(os.getenv("RISK_EVENTS_POLL_INTERVAL", "1"))),
+        name="risk-events",
+        daemon=True
+    )
+    thread.start()
+    risk_scorer_thread = thread
+    return thread
+
+def stored_score_is_current(user):
+    """
+    A stored riskScore can stand in for a recompute only while the event
+    scorer is running, and only if it was written after the user's last
+    change (including the message controller's own isFlag writes) and against
+    the current hotspots. The message graph is not checked: with
+    USE_NETWORK_SCORE=1 scores are always recomputed.
+    """
+    if risk_scorer_thread is None or not risk_scorer_thread.is_alive() or "riskComponents" not in user:
+        return False
+    scored_at = user.get("riskUpdatedAt")
+    if scored_at is None:
+        return False
+    updated_at = user.get("updatedAt")
+    if updated_at is not None and scored_at <= updated_at:
+        return False
+    return user.get("hotspotVersion") == hotspot_version(HOTSPOTS_CSV_PATH)
+
+if os.getenv("RISK_EVENTS", "0") == "1":
+    start_risk_events()
+
+def _classifier_gauges():
+    # Reported only once the classifier exists; scraping must not build it
+    if not _classifier:
+        return None
+    model, job_queue = _classifier["model"], _classifier["job_queue"]
+    samples = [({"source": "cache"}, model.cache.stats()["hit_rate"])]
+    if model.prefilter is not None:
+        samples.append(({"source": "prefilter_filter"}, model.prefilter.stats()["filter_rate"]))
+    return samples
+
+def _queue_gauges():
+    if not _classifier:
+        return None
+    queue_metrics = _classifier["job_queue"].metrics()
+    return [({"state": "depth"}, queue_metrics["queue_depth"]), ({"state": "max_depth"}, queue_metrics["max_depth"])]
+
+metrics.register_gauge("classifier_hit_rate", _classifier_gauges)
+metrics.register_gauge("classifier_queue", _queue_gauges)
+
+# Request timing, plus a sampled trace of every timed stage the request passes through
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.trace_token = metrics.start_trace(request.path)
+
+@app.after_request
+def record_request_time(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.observe("http_request_seconds", time.perf_counter() - started,
+                        endpoint=endpoint, method=request.method, status=response.status_code)
+    metrics.finish_trace(g.pop("trace_token", None), status=response.status_code)
+    return response
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/metrics/traces')
+def sampled_traces():
+    return jsonify(metrics.recent_traces())
+
+# Health endpoints
+@app.route('/healthz')
+def liveness():
+    return jsonify({"status": "alive"})
+
+@app.route('/readyz')
+def readiness():
+    body = dict(startup)
+    return jsonify(body), 200 if startup["status"] == "ready" else 503
 
 # Dashboard endpoints
 @app.route('/dashboard/heatmap')
 def heatmap():
-    heatmap_generation("Dashboard/Heatmap/Data/location.csv", users_collection)
+    heatmap_generation(users_collection)
     return render_template('heatmap.html')  # Serve the HTML heatmap
 
+@app.route('/dashboard/hotspots', methods=['GET'])
+def hotspots():
+    # Hotspots derived from flagged activity; refreshed incrementally at most every HOTSPOT_REFRESH_INTERVAL seconds
+    refresh_hotspots(users_collection, min_interval=HOTSPOT_REFRESH_INTERVAL)
+    engine = get_hotspot_engine()
+    return jsonify({
+        "hotspots": engine.hotspots,
+        "eps_km": engine.eps_km,
+        "min_weight": engine.min_weight,
+        "min_points": engine.min_points,
+        "points": len(engine),
+    })
+
 @app.route('/dashboard/activity', methods=['GET'])
 def activity_graph():
-    update_activity_monitor(users_collection, activity_collection)
+    # ?granularity=hour|day|week&start=2024-01-01&end=2024-02-01 (ISO dates, end exclusive)
+    granularity = request.args.get("granularity", "day")
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": f"granularity must be one of {', '.join(GRANULARITIES)}"}), 400
+    try:
+        start = datetime.fromisoformat(request.args["start"]) if "start" in request.args else None
+        end = datetime.fromisoformat(request.args["end"]) if "end" in request.args else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
-        counts = []
-        for activity in activity_collection.find():
-            counts.append({str(activity["date"].date()): activity["userCount"]})
+        # Only users created since the last watermark are counted, at most once per interval
+        update_activity_monitor(
+            users_collection,
+            activity_collection,
+            granularity=granularity,
+            min_interval=float(os.getenv("ACTIVITY_REFRESH_INTERVAL", "30"))
+        )
+        counts = get_activity_series(activity_collection, granularity, start, end)
         return jsonify(counts)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/dashboard/keyword-monitor')
 def keyword_monitoring():
-    keyword_dict = get_flagged_words_count(flags_collection)
-    return jsonify(keyword_dict)
+    # ?k=5&window=hour|day|week&approximate=1
+    window = request.args.get("window")
+    if window is not None and window not in WINDOWS:
+        return jsonify({"error": f"window must be one of {', '.join(WINDOWS)}"}), 400
+    try:
+        keyword_dict = keyword_monitor.top(
+            k=int(request.args.get("k", 5)),
+            window=window,
+            approximate=request.args.get("approximate") == "1"
+        )
+        return jsonify(keyword_dict)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 @app.route('/dashboard/network')
 def networkx():
     return render_template('networkX.html')
 
+@app.route('/dashboard/network/geojson')
+def network_geojson():
+    # ?bbox=min_lon,min_lat,max_lon,max_lat&min_weight=2
+    try:
+        bbox = None
+        if "bbox" in request.args:
+            bbox = tuple(float(value) for value in request.args["bbox"].split(","))
+            if len(bbox) != 4:
+                raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+        min_weight = int(request.args.get("min_weight", 1))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        # Edges come from the incrementally refreshed message graph; a bbox only loads the users it touches
+        return jsonify(build_network_geojson(
+            users_collection,
+            messages_collection,
+            bbox=bbox,
+            min_weight=min_weight,
+            graph=refresh_message_graph(),
+            points=user_points
+        ))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/dashboard/network/analytics')
+def network_analytics():
+    try:
+        return jsonify(analyzed_message_graph().summary(k=int(request.args.get("k", 10))))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/dashboard/network/analytics/<user_id>')
+def network_user_analytics(user_id):
+    try:
+        user_metrics = analyzed_message_graph().node_metrics(ObjectId(user_id))
+        if user_metrics is None:
+            return jsonify({"error": "User has no messages"}), 404
+        return jsonify(user_metrics)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.post("/classify/text-predict")
 def drugClassification():
     data = request.json
     postText = data["user"]
-    result = model.process_input(str(postText))
+
+    # Async mode: queue the text and hand back a job id straight away
+    if request.args.get("mode") == "async" or data.get("async"):
+        try:
+            job = get_job_queue().submit(str(postText))
+        except QueueFullError as e:
+            response = jsonify({"error": str(e)})
+            response.headers["Retry-After"] = "1"
+            return response, 429
+        return jsonify({
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/classify/jobs/{job.id}"
+        }), 202
+
+    batcher = get_batcher()
+    if batcher is not None:
+        result = batcher.process_input(str(postText))
+    else:
+        result = get_model().process_input_threaded(str(postText))
+    record_flagged_words(result)
     return jsonify({
         "classification": result
     })
 
+@app.route('/classify/jobs/metrics')
+def classification_job_metrics():
+    return jsonify(get_job_queue().metrics())
+
+@app.route('/classify/jobs/<job_id>')
+def classification_job(job_id):
+    # ?wait=<seconds> long-polls until the job finishes or the wait runs out
+    wait = min(float(request.args.get("wait", 0)), 60)
+    job = get_job_queue().wait(job_id, wait)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/classify/cache-stats')
+def classifier_cache_stats():
+    return jsonify(get_model().cache.stats())
+
+@app.route('/classify/prefilter-stats')
+def classifier_prefilter_stats():
+    prefilter = get_model().prefilter
+    if prefilter is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **prefilter.stats()})
+
 @app.route('/database/users', methods=['GET'])
 def get_users():
+    # ?sort=riskScore|lastActive&order=desc|asc&limit=50&cursor=<next_cursor>
+    # Without limit the full list streams as a JSON array; with limit the
+    # response is {"users": [...], "next_cursor": ...} for keyset pagination.
+    sort_field = request.args.get("sort", "riskScore")
+    if sort_field not in SORT_FIELDS:
+        return jsonify({"error": f"sort must be one of {', '.join(SORT_FIELDS)}"}), 400
+    descending = request.args.get("order", "desc") != "asc"
     try:
-        users = []
-        for user in users_collection.find():
-            if user["isFlag"] == False:
-                continue
-            users.append({
-                "id": str(user["_id"]),  # Convert MongoDB ObjectId to string
-                "name": user["name"],
-                "username": user.get("username", ""),
-                "email": user.get("email", ""),
-                "riskScore": user.get("riskScore", 0),
-                "lastActive": user.get("lastActive"),
-                "location": user.get("location", "Unknown"),
-                "behaviors": user.get("behaviors", []),
-                "riskFactors": user.get("riskFactors", []),
-            })
-        return jsonify(users)
+        limit = int(request.args["limit"]) if "limit" in request.args else None
+        if limit is not None and limit <= 0:
+            raise ValueError("limit must be positive")
+        # Fetch one extra document to know whether another page exists
+        users = find_flagged_users(
+            users_collection,
+            sort_field=sort_field,
+            descending=descending,
+            limit=limit + 1 if limit is not None else None,
+            cursor=request.args.get("cursor")
+        )
+        first = next(users, None)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return jsonify({"error": str(e)}), 400 if isinstance(e, ValueError) else 500
+
+    def generate():
+        yield "[" if limit is None else '{"users": ['
+        user, count, last = first, 0, None
+        while user is not None and (limit is None or count < limit):
+            yield ("," if count else "") + app.json.dumps(to_listing(user))
+            count, last = count + 1, user
+            user = next(users, None)
+        if limit is None:
+            yield "]"
+        else:
+            next_cursor = encode_cursor(last, sort_field) if user is not None else None
+            yield '], "next_cursor": ' + app.json.dumps(next_cursor) + "}"
+        users.close()
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+def find_user_with_flags(user_id):
+    # The user and their flags document in one round trip, without the posts array
+    pipeline = [
+        {"$match": {"_id": ObjectId(user_id)}},
+        {"$project": {
+            "postCount": {"$size": {"$ifNull": ["$posts", []]}},
+            "flagged": 1,
+            "lastLoginLocation": 1,
+        }},
+        {"$lookup": {"from": "flags", "localField": "flagged", "foreignField": "_id", "as": "flags"}},
+    ]
+    user = next(iter(users_collection.aggregate(pipeline)), None)
+    if user is not None:
+        user["flags"] = user["flags"][0] if user["flags"] else {}
+    return user
 
 @app.route('/profile-score/<user_id>', methods=['GET'])
 def profile_score(user_id):
     try:
-        # Convert string ID to MongoDB ObjectId
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
+        use_network_score = os.getenv("USE_NETWORK_SCORE", "0") == "1"
+
+        # Scores kept current by the event-driven scorer are one _id lookup away; ?recompute=1,
+        # the network signal, or a score older than the user or the hotspots falls through to the full calculation
+        if not use_network_score and request.args.get("recompute") != "1":
+            stored = users_collection.find_one(
+                {"_id": ObjectId(user_id)},
+                {"riskScore": 1, "riskComponents": 1, "riskUpdatedAt": 1, "hotspotVersion": 1, "updatedAt": 1}
+            )
+            if stored is None:
+                return jsonify({"error": "User not found"}), 404
+            if stored_score_is_current(stored):
+                return jsonify({
+                    "user_id": user_id,
+                    "profile_score": stored["riskScore"]
+                })
+
+        # Independent lookups run concurrently: user + flags, hotspot index, message graph
+        pool = io_pool()
+        user_future = pool.submit(find_user_with_flags, user_id)
+        hotspots_future = pool.submit(refreshed_hotspot_index)
+        graph_future = pool.submit(refresh_message_graph) if use_network_score else None
+
+        user = user_future.result()
         if not user:
             return jsonify({"error": "User not found"}), 404
 
         # Fetch necessary fields for the profile score calculation
-        post_count = len(user["posts"])
-        flags_data = flags_collection.find_one({"_id": ObjectId(user["flagged"])})
-        flagged_words = flags_data.get("flaggedWords", []) if flags_data else []
+        post_count = user["postCount"]
+        flags_data = user["flags"]
+        flagged_words = flags_data.get("flaggedWords", [])
         total_positives = flags_data.get("positiveCount", 0)
         total_coded = flags_data.get("negativeCount", 0)
         
         user_location_lat = user["lastLoginLocation"]["latitude"]
         user_location_lon = user["lastLoginLocation"]["longitude"]
         user_location = [user_location_lat, user_location_lon]
-        csv_path = "Dashboard/Heatmap/Data/location.csv"
+        hotspots_future.result()
+
+        # Centrality signal from the messaging graph, when USE_NETWORK_SCORE=1
+        centrality_percentile = None
+        if graph_future is not None:
+            graph = graph_future.result()
+            centrality_percentile = graph.percentile(graph.pagerank(), ObjectId(user_id))
 
         # Calculate the profile score
         final_score = ps.total_score(
             post_count=post_count, 
             flagged_words=flagged_words, 
             user_location=user_location, 
-            csv_path=csv_path, 
+            csv_path=HOTSPOTS_CSV_PATH, 
             total_positives=total_positives, 
-            total_coded=total_coded
+            total_coded=total_coded,
+            centrality_percentile=centrality_percentile
         )
         
         # Determine if the user should be flagged
-        isFlag = True if final_score >= 30 else False
+        isFlag = True if final_score >= FLAG_THRESHOLD else False
 
-        # Update the isFlag field in the user's document
+        # Update the isFlag field in the user's document; riskScore only on the scale the scorers share
+        update = {"isFlag": isFlag} if use_network_score else {"isFlag": isFlag, "riskScore": final_score}
         result = users_collection.update_one(
             {"_id": ObjectId(user_id)},  # Convert user_id to ObjectId
-            {"$set": {"isFlag": isFlag}}  # Update the isFlag field
+            {"$set": update}  # Update the isFlag field
         )
 
         # Check if the update was successful
@@ -135,15 +592,30 @@ def profile_score(user_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/profile-score/bulk', methods=['POST'])
+def profile_score_bulk():
+    try:
+        data = request.get_json(silent=True) or {}
+        refresh_hotspots(users_collection, min_interval=HOTSPOT_REFRESH_INTERVAL)
+        stats = bulk_rescore(
+            users_collection,
+            csv_path=HOTSPOTS_CSV_PATH,
+            batch_size=int(data.get("batch_size", 1000)),
+            threshold=float(data.get("threshold", FLAG_THRESHOLD)),
+            dry_run=bool(data.get("dry_run", False))
+        )
+        return jsonify(stats)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/flaggedWords/<user_id>', methods=['GET'])
 def flagged_words(user_id):
     try:
-        # Convert string ID to MongoDB ObjectId using PyMongo's native method
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
+        user = find_user_with_flags(user_id)
         if not user:
             return jsonify({"error": "User not found"}), 404
-        flags_data = flags_collection.find_one({"_id": ObjectId(user["flagged"])})
-        flagged_words = flags_data.get("flaggedWords", []) if flags_data else []
+        flags_data = user["flags"]
+        flagged_words = flags_data.get("flaggedWords", [])
         total_positives = flags_data.get("positiveCount", 0)
         total_coded = flags_data.get("negativeCount", 0)
 
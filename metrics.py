@@ -0,0 +1,210 @@
+"""
+In-process metrics for the Flask service, the classifier, the scorer and the
+dashboard modules, rendered in the Prometheus text format by /metrics.
+
+Counters and histograms are kept in one registry under a single lock, and
+each observation is a bisect plus a few additions, cheap enough to leave on
+under load. METRICS_ENABLED=0 turns recording off.
+
+Request tracing is sampled: with TRACE_SAMPLE_RATE=0.01 about one request in
+a hundred records every timed() stage it passes through. The most recent
+traces are kept for /metrics/traces.
+"""
+import contextvars
+import os
+import random
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+
+# HELP text for the metrics recorded across the service
+HELP = {
+    "http_request_seconds": "Flask request latency by endpoint, method and status",
+    "function_seconds": "Time spent in dashboard and scoring functions",
+    "mongo_command_seconds": "MongoDB command latency by command name",
+    "mongo_command_failures_total": "MongoDB commands that failed",
+    "classifier_stage_seconds": "Time per DrugTextAnalyzer stage",
+    "classifier_prefilter_total": "Lexicon prefilter decisions",
+    "classifier_cache_total": "Result cache lookups by outcome",
+    "classifier_llm_calls_total": "LLM calls by mode",
+    "classifier_llm_tokens_total": "LLM tokens reported by Ollama",
+    "classifier_errors_total": "Classifier failures by stage",
+    "classifier_batch_retries_total": "Batched items re-sent as single LLM calls",
+    "classifier_parse_total": "LLM answers by parser outcome (strict, tolerant, unusable) and output mode",
+    "classifier_parse_retries_total": "LLM calls repeated because the answer had no usable label",
+    "classifier_hit_rate": "Share of texts answered by the result cache or ruled out by the prefilter",
+    "classifier_queue": "Classification job queue depth and capacity",
+    "risk_events_total": "Scoring events by source collection",
+    "risk_event_lag_seconds": "Time from a database write to the rescore it triggered",
+    "risk_users_rescored_total": "Users rescored by the event-driven scorer",
+}
+
+# Seconds; spans sub-millisecond cache hits up to multi-second LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_lock = threading.Lock()
+_types = {}
+_counters = {}
+_histograms = {}
+_gauges = {}
+_current_trace = contextvars.ContextVar("trace", default=None)
+_traces = deque(maxlen=int(os.getenv("TRACE_KEEP", "100")))
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _declare(name, kind):
+    if name not in _types:
+        _types[name] = kind
+
+
+def inc(name, amount=1, **labels):
+    """Add amount to a counter."""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _declare(name, "counter")
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    """Record one value in a histogram."""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    position = bisect_left(buckets, value)
+    with _lock:
+        _declare(name, "histogram")
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [buckets, [0] * len(buckets), 0.0, 0]
+        if position < len(buckets):
+            histogram[1][position] += 1
+        histogram[2] += value
+        histogram[3] += 1
+
+
+def register_gauge(name, callback):
+    """Report callback()'s value at scrape time: a number, or a list of (labels, number)."""
+    with _lock:
+        _declare(name, "gauge")
+        _gauges[name] = callback
+
+
+@contextmanager
+def timed(name, **labels):
+    """Time the block into histogram name, and into the current trace if one is being sampled."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe(name, elapsed, **labels)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace["spans"].append({"name": name, **labels, "start": start - trace["t0"], "seconds": elapsed})
+
+
+def timed_function(name, **labels):
+    """Decorator form of timed()."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed(name, **labels):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_trace(name, sample_rate=None):
+    """Begin a trace for the current context if it is sampled. Returns a token for finish_trace()."""
+    rate = TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+    if not ENABLED or rate <= 0 or random.random() >= rate:
+        return None
+    trace = {"id": uuid.uuid4().hex, "name": name, "started_at": time.time(), "t0": time.perf_counter(), "spans": []}
+    return _current_trace.set(trace)
+
+
+def finish_trace(token, **attributes):
+    if token is None:
+        return
+    trace = _current_trace.get()
+    _current_trace.reset(token)
+    if trace is not None:
+        trace["seconds"] = time.perf_counter() - trace.pop("t0")
+        trace.update(attributes)
+        _traces.append(trace)
+
+
+def recent_traces():
+    return list(_traces)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: (value[0], list(value[1]), value[2], value[3]) for key, value in _histograms.items()}
+        gauges = dict(_gauges)
+        types = dict(_types)
+
+    lines = []
+    by_name = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), (buckets, counts, total, count) in histograms.items():
+        series = by_name.setdefault(name, [])
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            series.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        series.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+        series.append(f"{name}_sum{_format_labels(labels)} {total}")
+        series.append(f"{name}_count{_format_labels(labels)} {count}")
+    for name, callback in gauges.items():
+        try:
+            value = callback()
+        except Exception:
+            continue
+        if value is None:
+            continue
+        samples = value if isinstance(value, list) else [({}, value)]
+        by_name[name] = [f"{name}{_format_labels(sorted(labels.items()))} {number}" for labels, number in samples]
+
+    for name in sorted(by_name):
+        if name in HELP:
+            lines.append(f"# HELP {name} {HELP[name]}")
+        lines.append(f"# TYPE {name} {types[name]}")
+        lines.extend(by_name[name])
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Forget every counter, histogram, gauge and trace."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _gauges.clear()
+        _types.clear()
+        _traces.clear()
@@ -1,79 +1,234 @@
-import json
-import folium
-from pymongo import MongoClient
-import os
-from geopy.distance import geodesic
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-# Connect to MongoDB
-mongo_uri = os.getenv("MONGO_URI")
-client = MongoClient(mongo_uri)
-db = client['test']  # Database name
-messages_collection = db['messages']
-users_collection = db['users']
-
-# Fetch users and messages data
-users = {user["_id"]: user for user in users_collection.find()}
-messages = messages_collection.find()
-
-# Calculate average coordinates for map centering
-user_coords = [
-    (float(user["lastLoginLocation"]["latitude"]), float(user["lastLoginLocation"]["longitude"]))
-    for user in users.values()
-    if user["lastLoginLocation"]["latitude"] != "0" and user["lastLoginLocation"]["longitude"] != "0"
-]
-if user_coords:
-    avg_lat = sum(coord[0] for coord in user_coords) / len(user_coords)
-    avg_lon = sum(coord[1] for coord in user_coords) / len(user_coords)
-else:
-    avg_lat, avg_lon = 0, 0  # Default center if no valid coordinates are found
-
-# Initialize the map
-m = folium.Map(location=[avg_lat, avg_lon], zoom_start=12)
-
-# Plot each user on the map
-for user_id, user in users.items():
-    user_location = (float(user["lastLoginLocation"]["latitude"]), float(user["lastLoginLocation"]["longitude"]))
-    if user_location == (0, 0):
-        continue  # Skip users with no location data
-
-    user_popup = folium.Popup(f'User: {user["username"]}', parse_html=True)
-    folium.Marker(
-        user_location,
-        popup=user_popup,
-        icon=folium.Icon(color='blue', icon='user')
-    ).add_to(m)
-
-# Draw connections between senders and receivers
-for message in messages:
-    sender_id = message["senderId"]
-    receiver_id = message["receiverId"]
-    
-    if sender_id in users and receiver_id in users:
-        sender_location = (float(users[sender_id]["lastLoginLocation"]["latitude"]), 
-                           float(users[sender_id]["lastLoginLocation"]["longitude"]))
-        receiver_location = (float(users[receiver_id]["lastLoginLocation"]["latitude"]), 
-                             float(users[receiver_id]["lastLoginLocation"]["longitude"]))
-
-        # Skip if either sender or receiver has no location data
-        if sender_location == (0, 0) or receiver_location == (0, 0):
+import math
+import threading
+import time
+import uuid
+from datetime import timedelta
+from pymongo import DeleteOne, UpdateOne
+from database import get_db
+import metrics
+
+# Re-read users updated this long before the newest updatedAt seen, so writes stamped out of order are not missed
+SYNC_OVERLAP = timedelta(seconds=5)
+
+def _coordinates(location):
+    # (lat, lon) as floats, or None for missing, unparsable, out-of-range or (0, 0) locations
+    try:
+        lat, lon = float(location["latitude"]), float(location["longitude"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if (lat, lon) == (0, 0) or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+def load_user_locations(users_collection):
+    # Map user id -> username and coordinates, skipping users with no location data
+    users = {}
+    projection = {"username": 1, "lastLoginLocation.latitude": 1, "lastLoginLocation.longitude": 1}
+    for user in users_collection.find({}, projection):
+        coordinates = _coordinates(user.get("lastLoginLocation") or {})
+        if coordinates is None:
+            continue
+        users[user["_id"]] = {"username": user.get("username", ""), "lat": coordinates[0], "lon": coordinates[1]}
+    return users
+
+class UserPoints:
+    """
+    Numeric copies of each user's lastLoginLocation, kept in a collection of
+    their own (the users documents belong to the Node backend) under a
+    (lat, lon) index, so bounding-box lookups are an indexed query instead of
+    a scan of every user. The first sync covers all users and drops points of
+    users that are gone; later ones only users updated since the last one.
+    ready stays False until the first sync finishes, which run() does in the
+    background; until then callers scan users instead.
+    """
+
+    def __init__(self, points_collection):
+        self.points_collection = points_collection
+        self.watermark = None
+        self.refreshed_at = 0.0
+        self.ready = False
+        self._lock = threading.Lock()
+
+    @metrics.timed_function("function_seconds", function="user_points_sync")
+    def sync(self, users_collection, min_interval=0, batch_size=1000):
+        """Returns the number of points written or removed."""
+        with self._lock:
+            if time.time() - self.refreshed_at < min_interval:
+                return 0
+            self.refreshed_at = time.time()
+            generation = None
+            if self.watermark is None:
+                self.points_collection.create_index([("lat", 1), ("lon", 1)])
+                users_collection.create_index("updatedAt")
+                # Points this full pass does not write belong to users that no longer exist
+                generation = uuid.uuid4().hex
+                query = {}
+            else:
+                query = {"updatedAt": {"$gte": self.watermark - SYNC_OVERLAP}}
+
+            projection = {"username": 1, "lastLoginLocation.latitude": 1, "lastLoginLocation.longitude": 1, "updatedAt": 1}
+            operations, written, latest = [], 0, self.watermark
+            for user in users_collection.find(query, projection):
+                coordinates = _coordinates(user.get("lastLoginLocation") or {})
+                if coordinates is None:
+                    operations.append(DeleteOne({"_id": user["_id"]}))
+                else:
+                    point = {"username": user.get("username", ""), "lat": coordinates[0], "lon": coordinates[1]}
+                    if generation is not None:
+                        point["syncGeneration"] = generation
+                    operations.append(UpdateOne({"_id": user["_id"]}, {"$set": point}, upsert=True))
+                if user.get("updatedAt") is not None and (latest is None or user["updatedAt"] > latest):
+                    latest = user["updatedAt"]
+                if len(operations) >= batch_size:
+                    written += self._write(operations)
+                    operations = []
+            if operations:
+                written += self._write(operations)
+            if generation is not None:
+                written += self.points_collection.delete_many({"syncGeneration": {"$ne": generation}}).deleted_count
+            self.watermark = latest
+            self.ready = True
+            return written
+
+    def _write(self, operations):
+        result = self.points_collection.bulk_write(operations, ordered=False)
+        return result.matched_count + result.upserted_count + result.deleted_count
+
+    def run(self, users_collection, stop, interval=30.0):
+        """Sync every interval seconds until stop is set."""
+        while not stop.is_set():
+            try:
+                self.sync(users_collection)
+            except Exception as e:
+                print(f"Error syncing user points: {str(e)}")
+            stop.wait(interval)
+
+    def _users(self, query):
+        return {
+            point["_id"]: {"username": point.get("username", ""), "lat": point["lat"], "lon": point["lon"]}
+            for point in self.points_collection.find(query, {"username": 1, "lat": 1, "lon": 1})
+        }
+
+    def in_bbox(self, bbox):
+        min_lon, min_lat, max_lon, max_lat = bbox
+        return self._users({"lat": {"$gte": min_lat, "$lte": max_lat}, "lon": {"$gte": min_lon, "$lte": max_lon}})
+
+    def find(self, user_ids):
+        return self._users({"_id": {"$in": list(user_ids)}})
+
+def aggregate_edges(messages_collection, min_weight=1):
+    # Collapse messages into weighted directed edges on the server
+    pipeline = [
+        {"$group": {"_id": {"sender": "$senderId", "receiver": "$receiverId"}, "weight": {"$sum": 1}}},
+        {"$match": {"weight": {"$gte": min_weight}}},
+    ]
+    return [
+        {"sender": doc["_id"]["sender"], "receiver": doc["_id"]["receiver"], "weight": doc["weight"]}
+        for doc in messages_collection.aggregate(pipeline, allowDiskUse=True)
+    ]
+
+def _in_bbox(user, bbox):
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return min_lat <= user["lat"] <= max_lat and min_lon <= user["lon"] <= max_lon
+
+@metrics.timed_function("function_seconds", function="build_network_geojson")
+def build_network_geojson(users_collection, messages_collection, bbox=None, min_weight=1, graph=None, points=None):
+    """
+    Sender/receiver network as a GeoJSON FeatureCollection: one Point per user
+    and one LineString per (sender, receiver) pair carrying the message count.
+    With bbox = (min_lon, min_lat, max_lon, max_lat), only edges with an end
+    inside the box, and the users they touch, are returned.
+
+    With graph, a MessageGraph the caller keeps refreshed, edges come from it
+    instead of regrouping every message. With graph, bbox and a ready
+    UserPoints, only the users inside the box and the other ends of their
+    edges are loaded, from the indexed points.
+    """
+    if graph is not None and bbox is not None and points is not None and points.ready:
+        boxed = points.in_bbox(bbox)
+        edges = graph.edges(min_weight, touching=boxed)
+        others = {end for edge in edges for end in (edge["sender"], edge["receiver"])} - boxed.keys()
+        users = {**points.find(others), **boxed} if others else boxed
+    else:
+        users = load_user_locations(users_collection)
+        edges = graph.edges(min_weight) if graph is not None else aggregate_edges(messages_collection, min_weight)
+    features = []
+    visible_users = set()
+
+    for edge in edges:
+        sender = users.get(edge["sender"])
+        receiver = users.get(edge["receiver"])
+        if sender is None or receiver is None:
+            continue
+        if bbox is not None and not (_in_bbox(sender, bbox) or _in_bbox(receiver, bbox)):
             continue
+        visible_users.update((edge["sender"], edge["receiver"]))
+        features.append({
+            "type": "Feature",
+            "geometry": {
+                "type": "LineString",
+                "coordinates": [[sender["lon"], sender["lat"]], [receiver["lon"], receiver["lat"]]],
+            },
+            "properties": {
+                "sender": str(edge["sender"]),
+                "receiver": str(edge["receiver"]),
+                "weight": edge["weight"],
+            },
+        })
 
-        # Add sender marker
+    for user_id, user in users.items():
+        if user_id in visible_users or (bbox is not None and _in_bbox(user, bbox)):
+            features.append({
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [user["lon"], user["lat"]]},
+                "properties": {"id": str(user_id), "username": user["username"]},
+            })
+
+    return {"type": "FeatureCollection", "features": features}
+
+def render_network_map(users_collection, messages_collection, output_path="sender_receiver_network_map.html", min_weight=1):
+    import folium
+
+    users = load_user_locations(users_collection)
+    edges = [
+        edge for edge in aggregate_edges(messages_collection, min_weight)
+        if edge["sender"] in users and edge["receiver"] in users
+    ]
+
+    # Calculate average coordinates for map centering
+    if users:
+        avg_lat = sum(user["lat"] for user in users.values()) / len(users)
+        avg_lon = sum(user["lon"] for user in users.values()) / len(users)
+    else:
+        avg_lat, avg_lon = 0, 0  # Default center if no valid coordinates are found
+
+    # Initialize the map
+    m = folium.Map(location=[avg_lat, avg_lon], zoom_start=12)
+
+    # One marker per user; senders blue, receivers that never send orange
+    senders = {edge["sender"] for edge in edges}
+    receivers = {edge["receiver"] for edge in edges}
+    for user_id, user in users.items():
+        is_receiver_only = user_id in receivers and user_id not in senders
         folium.Marker(
-            sender_location,
-            popup=folium.Popup(f'Sender: {users[sender_id]["username"]}', parse_html=True),
-            icon=folium.Icon(color='blue', icon='user')
+            (user["lat"], user["lon"]),
+            popup=folium.Popup(f'User: {user["username"]}', parse_html=True),
+            icon=folium.Icon(color='orange', icon='info-sign') if is_receiver_only else folium.Icon(color='blue', icon='user')
         ).add_to(m)
-        
-        # Add receiver marker with an orange icon
-        folium.Marker(
-            receiver_location,
-            popup=folium.Popup(f'Receiver: {users[receiver_id]["username"]}', parse_html=True),
-            icon=folium.Icon(color='orange', icon='info-sign')
+
+    # One line and arrow per sender/receiver pair, thicker for chattier pairs
+    for edge in edges:
+        sender = users[edge["sender"]]
+        receiver = users[edge["receiver"]]
+        sender_location = (sender["lat"], sender["lon"])
+        receiver_location = (receiver["lat"], receiver["lon"])
+
+        folium.PolyLine(
+            [sender_location, receiver_location],
+            color='black',
+            weight=2 + math.log2(edge["weight"]),
+            opacity=0.8,
+            tooltip=f'{sender["username"]} → {receiver["username"]}: {edge["weight"]} messages'
         ).add_to(m)
 
         # Calculate midpoint for arrow marker
@@ -81,20 +236,14 @@ for message in messages:
             (sender_location[0] + receiver_location[0]) / 2,
             (sender_location[1] + receiver_location[1]) / 2
         )
-        
-        # Draw line from sender to receiver
-        folium.PolyLine(
-            [sender_location, receiver_location],
-            color='black',
-            weight=2,
-            opacity=0.8
-        ).add_to(m)
-
-        # Add an arrow marker at the midpoint
         folium.Marker(
             location=midpoint,
             icon=folium.DivIcon(html="""<div style="font-size: 20px; transform: rotate(45deg);">&#10140;</div>""")
         ).add_to(m)
 
-# Save the map to an HTML file
-m.save("sender_receiver_network_map.html")
+    # Save the map to an HTML file
+    m.save(output_path)
+
+if __name__ == "__main__":
+    db = get_db()
+    render_network_map(db['users'], db['messages'])